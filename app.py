@@ -1,6 +1,8 @@
 import streamlit as st
+import os
 import json
 import requests
+import weakref
 from typing import List, Dict, Any, Tuple, Optional, Set
 from dotenv import load_dotenv
 from collections import deque
@@ -10,48 +12,256 @@ load_dotenv()
 
 # Components
 from search_utils import GraphSearcher
-from data import NODES, EDGES
+from shard_utils import ShardedSearcher
+from search_service import SearchClient
+from metrics_utils import REGISTRY as METRICS, start_metrics_server
+from profiling_utils import ProfileReport, profile_call
+from memory_utils import (
+    MemoryReport, SessionSizeTracker, add_searcher_components, add_topology_components, deep_sizeof, rss_bytes,
+)
+from graph_utils import build_index, collapse_subtree, build_graph_payload
+from reload_utils import GraphVersion, HotReloader
+from registry_utils import GraphRegistry
+from related_utils import RelatedIndex, load_related
+from querylog_utils import QueryLog, load_precomputed
+import data
 from slack_integration import send_slack_review_request
-from streamlit_agraph import agraph, Node, Edge, Config
+from streamlit_agraph import agraph, Config
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # ---------------------------
 # Initialization
 # ---------------------------
+def _load_or_build(options: Dict) -> GraphSearcher:
+    # Optional on-disk snapshot (KG_INDEX_PATH): mmap it if it matches the
+    # current data/model fingerprint, otherwise rebuild and rewrite it
+    path = os.getenv("KG_INDEX_PATH")
+    if path and os.path.exists(path):
+        try:
+            return GraphSearcher.load(path, data.NODES, data.EDGES, **options)
+        except ValueError as e:
+            print(f"Ignoring stale index snapshot {path}: {e}")
+    local = GraphSearcher(nodes=data.NODES, edges=data.EDGES, **options)
+    if path:
+        local.save(path)
+    return local
+
+def _search_options() -> Dict:
+    # Optional two-stage retrieval: top-M fused candidates, then cross-encoder rerank
+    return dict(
+        candidate_pool=int(os.getenv("SEARCH_CANDIDATE_POOL", "0")) or None,
+        rerank_model=os.getenv("SEARCH_RERANK_MODEL") or None,
+        rerank_batch_size=int(os.getenv("SEARCH_RERANK_BATCH_SIZE", "32")),
+        rerank_t_high=float(os.getenv("SEARCH_RERANK_T_HIGH", "0.5")),
+    )
+
+def _attach_or_publish(name: str, options: Dict) -> GraphSearcher:
+    try:
+        return GraphSearcher.from_shared(name, data.NODES, data.EDGES, **options)
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        # Stale (other data/model) or never completed: serve from a private index
+        print(f"Ignoring shared index {name}: {e}")
+        return _load_or_build(options)
+    local = _load_or_build(options)
+    try:
+        local._shared_segment = local.publish_shared(name)
+    except FileExistsError:
+        # Another process published first; use its copy if it matches
+        try:
+            return GraphSearcher.from_shared(name, data.NODES, data.EDGES, **options)
+        except ValueError as e:
+            print(f"Ignoring shared index {name}: {e}")
+    return local
+
 @st.cache_resource
 def get_searcher():
-    return GraphSearcher(nodes=NODES, edges=EDGES)
+    # Optional shared search service (KG_SEARCH_URL): no local index or model
+    if os.getenv("KG_SEARCH_URL"):
+        return SearchClient(os.getenv("KG_SEARCH_URL"))
+    options = _search_options()
+    # Optional shared-memory index (KG_SHARED_INDEX=<segment name>): the first
+    # process builds and publishes it, later processes attach read-only
+    shared_name = os.getenv("KG_SHARED_INDEX")
+    local = _attach_or_publish(shared_name, options) if shared_name else _load_or_build(options)
+    # Optional precomputed answers for the most frequent queries (querylog_utils.py)
+    load_precomputed(local, os.getenv("KG_PRECOMPUTED"))
+    # Optional scatter-gather over worker processes (SEARCH_SHARDS > 1)
+    shards = int(os.getenv("SEARCH_SHARDS", "0"))
+    result = ShardedSearcher(local, n_shards=shards) if shards > 1 else local
+    RELATED_INDEXES[result] = _build_related(result)
+    return result
+
+def _rebuild_searcher(previous, nodes: List[Dict], edges: List[Dict]):
+    # Runs on the reloader thread; `previous` keeps serving until the swap.
+    # Only nodes whose indexed text changed are re-encoded.
+    if isinstance(previous, SearchClient):
+        return previous  # the service reloads its own index (search_service.py --watch)
+    previous_local = getattr(previous, "_searcher", previous)
+    local = previous_local.updated(nodes, edges)
+    if os.getenv("KG_INDEX_PATH"):
+        local.save(os.getenv("KG_INDEX_PATH"))
+    segment = getattr(previous_local, "_shared_segment", None)
+    if segment is not None:
+        # This process published the old index: replace it so processes that
+        # attach from now on get the new one (attached ones keep their mapping
+        # and reload on their own)
+        segment.unlink()
+        try:
+            local._shared_segment = local.publish_shared(segment.name)
+        except FileExistsError:
+            pass  # another process republished first
+    load_precomputed(local, os.getenv("KG_PRECOMPUTED"))  # only if still valid for the new graph
+    shards = int(os.getenv("SEARCH_SHARDS", "0"))
+    result = ShardedSearcher(local, n_shards=shards) if shards > 1 else local
+    RELATED_INDEXES[result] = _build_related(result)  # before the swap, not in a page request
+    return result
 
-searcher = get_searcher()
+@st.cache_resource
+def _related_indexes() -> "weakref.WeakKeyDictionary":
+    # searcher -> its RelatedIndex; an entry goes away with its searcher
+    return weakref.WeakKeyDictionary()
+
+RELATED_INDEXES = _related_indexes()
+
+def _build_related(searcher) -> Optional[RelatedIndex]:
+    # Precomputed top-k related nodes (related_utils.py), built where a searcher
+    # is built (startup, the reloader thread): KG_RELATED_PATH if it matches
+    # the searcher's fingerprint, otherwise one blocked pass over its
+    # embeddings, saved back to KG_RELATED_PATH
+    path = os.getenv("KG_RELATED_PATH")
+    local = getattr(searcher, "_searcher", searcher)
+    if isinstance(local, SearchClient):
+        # The embeddings live in the search service: only a file it matches is used
+        if not (path and os.path.exists(path)):
+            return None
+        try:
+            return RelatedIndex.load(path, expected_fingerprint=local.health()["fingerprint"])
+        except ValueError as e:
+            print(f"Ignoring stale related index {path}: {e}")
+            return None
+    return load_related(path, local, k=int(os.getenv("KG_RELATED_K", "10")))
+
+def _retire_searcher(old):
+    # After the swap: stop the old shard workers (waits for an in-flight search)
+    if isinstance(old, ShardedSearcher):
+        old.close()
+
+@st.cache_resource
+def get_graph() -> HotReloader:
+    # Optional hot reload: KG_HOT_RELOAD=1 watches data.py, or set it to a
+    # .py/.json graph source. Each rerun reads one GraphVersion (atomic swap).
+    data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data.py")
+    source = os.getenv("KG_HOT_RELOAD", "")
+    path = data_path if source.lower() in ("1", "true", "yes") else source
+    initial = GraphVersion(0, data.NODES, data.EDGES, get_searcher(), build_index(data.NODES, data.EDGES))
+    reloader = HotReloader(path, initial, _rebuild_searcher, in_sync=(path == data_path),
+                           retire=_retire_searcher)
+    if path:
+        reloader.check_now()  # a non-data.py source is loaded before the first render
+        reloader.start()
+    return reloader
 
-# ---------------------------
-# Graph indices (roots, children, parents) + end_user options
-# ---------------------------
 @st.cache_resource
-def _build_index(nodes: List[Dict], edges: List[Dict]):
-    node_map = {n["id"]: n for n in nodes}
-    children_map: Dict[str, List[str]] = {}
-    parents_map: Dict[str, List[str]] = {}
+def get_registry() -> Optional[GraphRegistry]:
+    # Optional per-country/program graphs (KG_GRAPHS=<graphs.json>, see
+    # registry_utils.py): loaded on first use, LRU-evicted above
+    # KG_GRAPH_MEMORY_MB, one shared encoder. These graphs are not hot-reloaded.
+    return GraphRegistry.from_env(**_search_options())
+
+GRAPH_REGISTRY = get_registry()
+if GRAPH_REGISTRY is not None:
+    GRAPH_NAME = st.query_params.get("graph")
+    if GRAPH_NAME not in GRAPH_REGISTRY.specs:
+        GRAPH_NAME = GRAPH_REGISTRY.names[0]
+    GRAPH = GRAPH_REGISTRY.get(GRAPH_NAME)
+else:
+    GRAPH_NAME = None
+    GRAPH = get_graph().current
+# This run's graph: data.py only seeds the first version; reloads and registry graphs replace it
+NODES, EDGES, searcher = GRAPH.nodes, GRAPH.edges, GRAPH.searcher
 
-    indegree: Dict[str, int] = {n["id"]: 0 for n in nodes}
-    for e in edges:
-        src, tgt = e["source"], e["target"]
-        children_map.setdefault(src, []).append(tgt)
-        parents_map.setdefault(tgt, []).append(src)
-        indegree[tgt] = indegree.get(tgt, 0) + 1
-        indegree.setdefault(src, indegree.get(src, 0))
+@st.cache_resource
+def _start_metrics_endpoint():
+    # One /metrics endpoint per server process (Prometheus text format)
+    port = os.getenv("KG_METRICS_PORT")
+    return start_metrics_server(int(port)) if port else None
 
-    roots = [nid for nid, d in indegree.items() if d == 0]
+_start_metrics_endpoint()
 
-    # unique end_user values (strings only)
-    end_users = sorted({str(n.get("end_user")) for n in nodes if n.get("end_user") not in (None, "", [])})
-    return node_map, children_map, parents_map, roots, end_users
+@st.cache_resource
+def get_query_log() -> Optional[QueryLog]:
+    # Optional append-only query log (KG_QUERY_LOG=<path>), rotated at KG_QUERY_LOG_MAX_MB
+    path = os.getenv("KG_QUERY_LOG")
+    if not path:
+        return None
+    return QueryLog(path, max_bytes=int(float(os.getenv("KG_QUERY_LOG_MAX_MB", "10")) * 2**20))
 
-NODE_MAP, CHILDREN_MAP, PARENTS_MAP, ROOT_IDS, END_USER_OPTIONS = _build_index(NODES, EDGES)
+# Optional latency budget per graph search (ms); unset = no deadline
+SEARCH_DEADLINE_MS = float(os.getenv("SEARCH_DEADLINE_MS")) if os.getenv("SEARCH_DEADLINE_MS") else None
+
+# ---------------------------
+# Graph indices (roots, children, parents)
+# ---------------------------
+NODE_MAP, CHILDREN_MAP, PARENTS_MAP, ROOT_IDS = GRAPH.topology
+
+def get_related() -> Optional[RelatedIndex]:
+    # The current searcher's related nodes; lookups only, no model calls per node.
+    # Searchers built elsewhere (registry graphs, the search service client)
+    # get theirs on first use.
+    if searcher not in RELATED_INDEXES:
+        try:
+            RELATED_INDEXES[searcher] = _build_related(searcher)
+        except requests.RequestException as e:
+            print(f"Related nodes unavailable: {e}")  # retried on the next lookup
+            return None
+    return RELATED_INDEXES[searcher]
+
+def _related_nodes(node_id: str, k: int = 5, threshold: float = 0.5) -> List[Dict[str, Any]]:
+    related = get_related()
+    if related is None:
+        return []
+    return [
+        {"node_id": nid, "label": NODE_MAP.get(nid, {}).get("label", nid), "score": score}
+        for nid, score in related.related(node_id, k=k, threshold=threshold)
+        if nid in NODE_MAP
+    ]
+
+# end_user options + counts come from the searcher's facet index (no NODES rescan)
+@st.cache_data(ttl=60, show_spinner=False)
+def _facet_counts(_searcher, field: str, graph_name: Optional[str], version: int) -> Dict[str, int]:
+    # Keyed on the graph, not the searcher; the TTL picks up reloads done by a
+    # search service (KG_SEARCH_URL), whose version this process doesn't see.
+    # A failed call raises and so is not cached: the next rerun retries.
+    return _searcher.facet_counts(field)
+
+def _service_error(e: Exception):
+    # A search service (KG_SEARCH_URL) that is down or failing: show it, keep the page
+    st.error(f"Search service unavailable: {e}")
+
+FACET_ERROR = None
+try:
+    END_USER_COUNTS = _facet_counts(searcher, "end_user", GRAPH_NAME, GRAPH.version)
+except requests.RequestException as e:
+    END_USER_COUNTS, FACET_ERROR = {}, e
+END_USER_OPTIONS = list(END_USER_COUNTS)
 
 # ---------------------------
 # Session state
 # ---------------------------
+_GRAPH_STATE_KEYS = (
+    "visible_nodes", "visible_edges", "highlight_ids", "role_highlight_ids", "focus_node_id",
+    "last_query_text", "last_similar_nodes", "last_rag_response", "details_node_id",
+    "filter_end_users", "prev_filter_snapshot",
+)
+
 def _ensure_state():
+    if st.session_state.get("graph_name", GRAPH_NAME) != GRAPH_NAME:
+        # Switched to another registry graph: start over from its roots
+        for key in _GRAPH_STATE_KEYS:
+            st.session_state.pop(key, None)
+    st.session_state.graph_name = GRAPH_NAME
     if "visible_nodes" not in st.session_state:
         st.session_state.visible_nodes: Set[str] = set(ROOT_IDS)
     if "visible_edges" not in st.session_state:
@@ -74,6 +284,23 @@ def _ensure_state():
         st.session_state.filter_end_users: List[str] = []  # chosen end_user values
     if "prev_filter_snapshot" not in st.session_state:
         st.session_state.prev_filter_snapshot = tuple()
+    if "search_within_end_users" not in st.session_state:
+        st.session_state.search_within_end_users = False
+    if st.session_state.get("graph_version") != GRAPH.version:
+        _prune_state_to_graph()
+        st.session_state.graph_version = GRAPH.version
+
+def _prune_state_to_graph():
+    # After a hot reload, drop ids that no longer exist in the graph
+    ss = st.session_state
+    ss.visible_nodes = {nid for nid in ss.visible_nodes if nid in NODE_MAP} or set(ROOT_IDS)
+    ss.visible_edges = {(u, v) for (u, v) in ss.visible_edges if u in ss.visible_nodes and v in ss.visible_nodes}
+    ss.highlight_ids = {nid for nid in ss.highlight_ids if nid in NODE_MAP}
+    ss.role_highlight_ids = {nid for nid in ss.role_highlight_ids if nid in NODE_MAP}
+    if ss.focus_node_id not in NODE_MAP:
+        ss.focus_node_id = None
+    if ss.details_node_id not in NODE_MAP:
+        ss.details_node_id = None
 
 # ---------------------------
 # Expand/Collapse
@@ -83,37 +310,10 @@ def _expand_node(node_id: str):
         st.session_state.visible_nodes.add(child_id)
         st.session_state.visible_edges.add((node_id, child_id))
 
-def _collect_descendants(root_id: str) -> Set[str]:
-    seen: Set[str] = set()
-    q = deque(CHILDREN_MAP.get(root_id, []))
-    while q:
-        nid = q.popleft()
-        if nid in seen:
-            continue
-        seen.add(nid)
-        for c in CHILDREN_MAP.get(nid, []):
-            if c not in seen:
-                q.append(c)
-    return seen
-
 def _collapse_subtree(root_id: str):
-    descendants = _collect_descendants(root_id)
-    collapsing_starts = {root_id} | descendants
-    to_remove_edges = {(u, v) for (u, v) in st.session_state.visible_edges if u in collapsing_starts}
-    st.session_state.visible_edges.difference_update(to_remove_edges)
-
-    still_visible_edges = st.session_state.visible_edges
-    parents_of = {}
-    for (u, v) in still_visible_edges:
-        parents_of[v] = parents_of.get(v, 0) + 1
-
-    to_hide_nodes: Set[str] = set()
-    for nid in descendants:
-        if parents_of.get(nid, 0) == 0:
-            to_hide_nodes.add(nid)
-
-    st.session_state.visible_nodes.difference_update(to_hide_nodes)
-    st.session_state.visible_edges = {(u, v) for (u, v) in st.session_state.visible_edges if v not in to_hide_nodes}
+    st.session_state.visible_nodes, st.session_state.visible_edges = collapse_subtree(
+        CHILDREN_MAP, st.session_state.visible_nodes, st.session_state.visible_edges, root_id
+    )
 
 def _expand_all():
     st.session_state.visible_nodes = {n["id"] for n in NODES}
@@ -205,6 +405,16 @@ def _render_details_panel(node: Dict[str, Any]):
         if url:
             st.link_button("Open node ↗", url, use_container_width=False)
 
+        related = _related_nodes(node.get("id"))
+        if related:
+            st.markdown("**Related**")
+            for r in related:
+                if st.button(f"{r['label']} ({r['score']:.2f})", key=f"related_{r['node_id']}"):
+                    _expand_to_node(r["node_id"])
+                    st.session_state.focus_node_id = r["node_id"]
+                    st.session_state.details_node_id = r["node_id"]
+                    st.rerun()
+
 # ---------------------------
 # Graph search (GraphSearcher) with threshold
 # ---------------------------
@@ -309,73 +519,15 @@ def find_similar_nodes_with_searcher(query: str, k: int = 3, threshold: float =
 # Graph rendering (expand/collapse + highlight + focus)
 # ---------------------------
 def render_graph() -> Any:
-    # Visual priority: focus (pink) > role_highlight (orange) > search_highlight (teal) > default
-    search_high = st.session_state.highlight_ids or set()
-    role_high = st.session_state.role_highlight_ids or set()
-    focus_id = st.session_state.focus_node_id
-
-    a_nodes = []
-    for nid in st.session_state.visible_nodes:
-        n = NODE_MAP[nid]
-        base_label = n.get("label", nid)
-
-        children = CHILDREN_MAP.get(nid, [])
-        hidden_kids = any((cid not in st.session_state.visible_nodes) for cid in children)
-        label = f"+ {base_label}" if children and hidden_kids else (f"– {base_label}" if children else base_label)
-
-        # Determine color/size by priority
-        if nid == focus_id:
-            color = "#E91E63"   # pink
-            size = 34
-            font_size = 14
-        elif nid in role_high:
-            color = "#FFA500"   # orange
-            size = 28
-            font_size = 13
-        elif nid in search_high:
-            color = "#2EC4B6"   # teal
-            size = 28
-            font_size = 13
-        else:
-            color = "#324563"
-            size = 24
-            font_size = 12
-
-        a_nodes.append(
-            Node(
-                id=nid,
-                label=label,
-                size=size,
-                shape="dot",
-                color=color,
-                font={"size": font_size, "color": "#FFFFFF", "face": "Arial"},
-                borderWidth=0,
-                borderWidthSelected=3,
-            )
-        )
-
-    # Edge color logic: orange if touches role-highlight; else gold-ish if touches focus/search; else grey
-    a_edges = []
-    for (src, tgt) in st.session_state.visible_edges:
-        if src in role_high or tgt in role_high:
-            e_color = "#FFA500"  # orange
-            e_width = 1.2
-        elif src == focus_id or tgt == focus_id or src in search_high or tgt in search_high:
-            e_color = "#FF9F1C"  # gold highlight
-            e_width = 1.2
-        else:
-            e_color = "#8a8a8a"
-            e_width = 0.9
-        a_edges.append(
-            Edge(
-                source=src,
-                target=tgt,
-                type="CURVE_SMOOTH",
-                width=e_width,
-                color=e_color,
-                smooth={"type": "curvedCW", "roundness": 0.2},
-            )
-        )
+    a_nodes, a_edges = build_graph_payload(
+        NODE_MAP,
+        CHILDREN_MAP,
+        st.session_state.visible_nodes,
+        st.session_state.visible_edges,
+        focus_id=st.session_state.focus_node_id,
+        role_high=st.session_state.role_highlight_ids or set(),
+        search_high=st.session_state.highlight_ids or set(),
+    )
 
     config = Config(
         width="100%",
@@ -458,6 +610,98 @@ def query_rag_api(query: str) -> Tuple[bool, str]:
     except Exception as e:
         return False, f"Error querying RAG API: {str(e)}"
 
+# ---------------------------
+# Diagnostics (search metrics + memory)
+# ---------------------------
+@st.cache_resource
+def _session_sizes() -> SessionSizeTracker:
+    return SessionSizeTracker()
+
+def _live_session_ids() -> Optional[Set[str]]:
+    # Sessions whose state the server still holds; None if the runtime is not available
+    try:
+        from streamlit import runtime
+        if runtime.exists():
+            return {info.session.id for info in runtime.get_instance()._session_mgr.list_sessions()}
+    except Exception:
+        pass
+    return None
+
+def _record_session_size():
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        tracker = _session_sizes()
+        tracker.record(ctx.session_id, st.session_state)
+        live = _live_session_ids()
+        if live is not None:
+            tracker.forget(live | {ctx.session_id})  # ended sessions leave the average
+
+def _memory_report() -> MemoryReport:
+    report = MemoryReport(rss_bytes=rss_bytes())
+    seen: Set[int] = set()
+    if not isinstance(searcher, SearchClient):
+        add_searcher_components(report, searcher, seen)  # encoder + reranker, if loaded
+    add_topology_components(report, seen, NODE_MAP=NODE_MAP, CHILDREN_MAP=CHILDREN_MAP,
+                            PARENTS_MAP=PARENTS_MAP)
+    # Other indexes this process holds (the app builds no GraphKNN)
+    related = get_related()
+    if related is not None:
+        report.add("RelatedIndex", deep_sizeof(related, seen), f"{related.ids.shape} top-k")
+    import slack_integration
+    if slack_integration._dedup_index is not None:
+        report.add("NearDuplicateIndex", deep_sizeof(slack_integration._dedup_index, seen), "Slack approvals")
+    if GRAPH_REGISTRY is not None:
+        for row in GRAPH_REGISTRY.stats():
+            if row["graph"] != GRAPH_NAME:
+                report.add(f"graph {row['graph']}", int(row["MiB"] * 2**20), "other loaded registry graph")
+    tracker = _session_sizes()
+    avg = tracker.average()
+    if avg is not None:
+        report.add("session_state (average)", int(avg), f"over {len(tracker)} sessions")
+    return report
+
+def _render_diagnostics_panel():
+    with st.expander("Diagnostics", expanded=False):
+        if GRAPH_REGISTRY is not None:
+            budget = GRAPH_REGISTRY.memory_budget_bytes
+            st.caption(f"Graph {GRAPH_NAME}: {len(NODES)} nodes; {len(GRAPH_REGISTRY.stats())} of "
+                       f"{len(GRAPH_REGISTRY.specs)} graphs loaded, {GRAPH_REGISTRY.total_bytes / 2**20:.1f} MiB"
+                       + (f" of {budget / 2**20:.1f} MiB budget" if budget else "")
+                       + f", {GRAPH_REGISTRY.evictions} evictions")
+            st.dataframe(GRAPH_REGISTRY.stats(), use_container_width=True, hide_index=True)
+        else:
+            reloader = get_graph()
+            st.caption(f"Graph v{GRAPH.version}: {len(NODES)} nodes"
+                       + (f" (last reload {GRAPH.diff})" if GRAPH.version else ""))
+            if reloader.last_error:
+                st.warning(f"Last graph reload failed: {reloader.last_error}")
+        if hasattr(searcher, "cache_stats"):
+            cache = searcher.cache_stats()
+            st.caption(f"Result cache: {cache['size']}/{cache['maxsize']} entries, "
+                       f"{cache['hit_rate']:.0%} hit rate ({cache['hits']} hits, {cache['misses']} misses)")
+        if not METRICS.enabled:
+            st.caption("Metrics are off. Set KG_METRICS=1 or KG_METRICS_PORT to record them.")
+        else:
+            rows = METRICS.summary()
+            if rows:
+                st.dataframe(rows, use_container_width=True, hide_index=True)
+            else:
+                st.caption("No searches recorded yet.")
+            with st.popover("Prometheus text"):
+                st.code(METRICS.render_prometheus(), language="text")
+
+        if st.button("Measure memory"):
+            report = _memory_report()
+            st.dataframe(
+                [{"component": c.component, "MiB": round(c.bytes / 2**20, 3), "detail": c.detail}
+                 for c in sorted(report.components, key=lambda c: c.bytes, reverse=True)],
+                use_container_width=True,
+                hide_index=True,
+            )
+            if report.rss_bytes is not None:
+                st.caption(f"Accounted {report.total_bytes / 2**20:.1f} MiB of "
+                           f"{report.rss_bytes / 2**20:.1f} MiB process RSS")
+
 # ---------------------------
 # Main
 # ---------------------------
@@ -467,19 +711,71 @@ def main():
 
     # --- Sidebar: end_user highlighter ---
     with st.sidebar:
+        if GRAPH_REGISTRY is not None:
+            # ?graph=<name> keeps the choice in the URL; the registry loads it on first use
+            choice = st.selectbox(
+                "Knowledge graph",
+                GRAPH_REGISTRY.names,
+                index=GRAPH_REGISTRY.names.index(GRAPH_NAME),
+                format_func=lambda n: GRAPH_REGISTRY.specs[n].label or n,
+            )
+            if choice != GRAPH_NAME:
+                st.query_params["graph"] = choice
+                st.rerun()
+
         st.header("Highlight by End User")
-        selected = st.multiselect("End user", END_USER_OPTIONS, default=st.session_state.filter_end_users)
+        if FACET_ERROR is not None:
+            _service_error(FACET_ERROR)
+        selected = st.multiselect(
+            "End user",
+            END_USER_OPTIONS,
+            default=st.session_state.filter_end_users,
+            format_func=lambda v: f"{v} ({END_USER_COUNTS.get(v, 0)})",
+        )
+        st.session_state.search_within_end_users = st.checkbox(
+            "Only search selected end users",
+            value=st.session_state.search_within_end_users,
+            disabled=not selected,
+        )
         if tuple(selected) != st.session_state.prev_filter_snapshot:
             st.session_state.filter_end_users = list(selected)
             st.session_state.prev_filter_snapshot = tuple(selected)
 
             # Compute highlight set (orange) but DON'T change visibility
-            selected_set = set(selected)
-            st.session_state.role_highlight_ids = {
-                n["id"] for n in NODES if str(n.get("end_user")) in selected_set
-            }
-            # No rerun needed; but to ensure consistent updates with some Streamlit/iframe combos, we can rerun safely:
-            st.rerun()
+            try:
+                st.session_state.role_highlight_ids = set(
+                    searcher.facet_node_ids({"end_user": selected})
+                )
+            except requests.RequestException as e:
+                st.session_state.role_highlight_ids = set()
+                _service_error(e)
+            else:
+                # No rerun needed; but to ensure consistent updates with some Streamlit/iframe combos, we can rerun safely:
+                st.rerun()
+
+        # Type-ahead over labels from the prefix index (no model call)
+        st.header("Jump to Node")
+        prefix = st.text_input("Label starts with", key="jump_prefix", placeholder="e.g. camp")
+        if prefix.strip():
+            try:
+                matches = [s for s in searcher.suggest(prefix, k=12) if s.node_id in NODE_MAP][:6]
+            except requests.RequestException as e:
+                matches = None
+                _service_error(e)
+            for s in matches or []:
+                if st.button(s.text, key=f"jump_{s.node_id}", use_container_width=True):
+                    _expand_to_node(s.node_id)
+                    st.session_state.focus_node_id = s.node_id
+                    st.session_state.details_node_id = s.node_id
+                    st.rerun()
+            if matches == []:
+                st.caption("No matching nodes.")
+
+        # Hidden diagnostics panel (?diagnostics=1)
+        if st.query_params.get("diagnostics") == "1":
+            _render_diagnostics_panel()
+        if METRICS.enabled or st.query_params.get("diagnostics") == "1":
+            _record_session_size()
 
         # Quick legend
         st.caption("Legend:")
@@ -526,6 +822,13 @@ def main():
             placeholder="Type your question here...",
             help="We search the knowledge graph first. If not found, you can ask AI (RAG).",
         )
+        focus_id = st.session_state.focus_node_id
+        search_within_focus = False
+        if focus_id and CHILDREN_MAP.get(focus_id):
+            search_within_focus = st.checkbox(
+                f"Only search under “{_node_label(NODE_MAP.get(focus_id, {}), focus_id)}”",
+                value=False,
+            )
         col1, col2 = st.columns([1, 1])
         with col1:
             submit_graph_btn = st.form_submit_button("🔎 Search Graph", type="primary", use_container_width=True)
@@ -543,13 +846,40 @@ def main():
         st.toast("Cleared.", icon="🧼")
         st.rerun()
 
+    response = None
     if submit_graph_btn and query.strip():
         st.session_state.last_query_text = query.strip()
 
-        best_match, all_matches = searcher.search(st.session_state.last_query_text)
-
-        # Threshold filter ≥ 0.5
-        similar = [r for r in all_matches if getattr(r, "score", 0) >= 0.5]
+        filters = None
+        if st.session_state.search_within_end_users and st.session_state.filter_end_users:
+            filters = {"end_user": st.session_state.filter_end_users}
+        within = st.session_state.focus_node_id if search_within_focus else None
+        try:
+            response = searcher.search(
+                st.session_state.last_query_text,
+                filters=filters,
+                within=within,
+                deadline_ms=SEARCH_DEADLINE_MS,
+            )
+        except requests.RequestException as e:
+            _service_error(e)
+    if response is not None:
+        best_match, all_matches = response
+        if response.degraded:
+            st.toast("Search hit its time budget; some ranking stages were skipped.", icon="⏱️")
+
+        # Threshold filter ≥ 0.5 (on the cross-encoder score when the results were reranked)
+        similar = [r for r in all_matches
+                   if (r.rerank_score if getattr(r, "rerank_score", None) is not None else r.score) >= 0.5]
+        query_log = get_query_log()
+        if query_log is not None:
+            query_log.record(
+                st.session_state.last_query_text,
+                latency_ms=response.timings_ms.get("total"),
+                top_ids=[r.node_id for r in all_matches[:5]],
+                rag_fallthrough=None if similar else "no_graph_match",
+                event="search", filters=filters, within=within, stages=response.stages,
+            )
 
         if similar:
             _expand_all()
@@ -566,6 +896,7 @@ def main():
             st.session_state.last_rag_response = None
             st.rerun()
         else:
+            METRICS.inc("rag_fallthrough_total", reason="no_graph_match")
             with st.spinner("🤖 Asking AI (no strong graph match found)..."):
                 ok, rag = query_rag_api(st.session_state.last_query_text)
             st.session_state.last_rag_response = rag if ok else rag
@@ -592,6 +923,10 @@ def main():
 
         # Offer RAG only if user clicks
         if st.button("Not there? Ask AI (RAG) 🤖", use_container_width=True):
+            METRICS.inc("rag_fallthrough_total", reason="user_requested")
+            if get_query_log() is not None:
+                get_query_log().record(st.session_state.last_query_text, event="rag",
+                                       rag_fallthrough="user_requested")
             with st.spinner("🤖 Asking AI..."):
                 ok, rag = query_rag_api(st.session_state.last_query_text)
             st.session_state.last_rag_response = rag if ok else rag
@@ -600,6 +935,7 @@ def main():
                     query=st.session_state.last_query_text,
                     rag_response=st.session_state.last_rag_response,
                     similar_nodes=st.session_state.last_similar_nodes,
+                    related_nodes=_related_nodes(st.session_state.last_similar_nodes[0]["node_id"]),
                 )
                 st.toast("✅ Sent for review on Slack", icon="📤")
             except Exception as e:
@@ -614,5 +950,41 @@ def main():
     elif submit_graph_btn and not query.strip():
         st.warning("Please enter a query.")
 
+# ---------------------------
+# On-demand profiling (KG_PROFILE=1|sampling, or ?profile=... when KG_PROFILE_URL=1)
+# ---------------------------
+def _profiling_mode() -> Optional[str]:
+    # The URL switch writes files on the server, so it is off unless the operator allows it
+    url_mode = st.query_params.get("profile") if os.getenv("KG_PROFILE_URL") == "1" else None
+    mode = url_mode or os.getenv("KG_PROFILE")
+    if not mode or mode == "0":
+        return None
+    return "sampling" if mode == "sampling" else "deterministic"
+
+def _render_profile_panel(report: ProfileReport):
+    with st.expander(f"⏱️ Profile of this run ({report.wall_ms:.0f} ms, {report.mode})", expanded=False):
+        st.caption(f"Saved to `{report.path}` (text: `{report.text_path}`)")
+        if report.top_functions:
+            st.dataframe(report.top_functions, use_container_width=True, hide_index=True)
+        elif report.tree_text:
+            st.code(report.tree_text[:20000], language="text")
+
+def _run_profiled(mode: str):
+    ctx = get_script_run_ctx()
+    session_id = ctx.session_id if ctx else "no-session"
+
+    def _keep(report: ProfileReport):
+        st.session_state.last_profile = report
+
+    # Runs ending in st.rerun() are still written to disk; the panel shows
+    # the run that actually rendered the page.
+    profile_call(main, label=session_id, out_dir=os.getenv("KG_PROFILE_DIR", "profiles"),
+                 mode=mode, on_report=_keep, max_runs=int(os.getenv("KG_PROFILE_MAX_RUNS", "50")))
+    _render_profile_panel(st.session_state.last_profile)
+
 if __name__ == "__main__":
-    main()
+    _mode = _profiling_mode()
+    if _mode:
+        _run_profiled(_mode)
+    else:
+        main()
@@ -0,0 +1,4 @@
+# bench/
+# Benchmarks for the search and rendering hot paths.
+#   python -m bench.run --sizes 1000 10000        # writes bench/results/<commit>.json
+#   python -m bench.compare old.json new.json     # flags regressions between commits
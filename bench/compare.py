@@ -0,0 +1,49 @@
+# bench/compare.py
+# Compare two bench/run.py reports and flag latency regressions.
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+METRICS = ("p50_ms", "p99_ms", "total_ms")
+
+def compare(old: Dict, new: Dict) -> List[Tuple[str, str, str, float, float, float]]:
+    """Rows of (size, benchmark, metric, old, new, ratio) for benchmarks in both reports."""
+    rows = []
+    for size, new_res in new["results"].items():
+        old_res = old["results"].get(size, {})
+        for name, new_stats in new_res.items():
+            old_stats = old_res.get(name)
+            if not isinstance(old_stats, dict) or "n" not in new_stats:
+                continue
+            for metric in METRICS:
+                if metric in new_stats and metric in old_stats and old_stats[metric] > 0:
+                    ratio = new_stats[metric] / old_stats[metric]
+                    rows.append((size, name, metric, old_stats[metric], new_stats[metric], ratio))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative slowdown that counts as a regression (default 10%%)")
+    args = parser.parse_args(argv)
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    regressions = 0
+    for size, name, metric, o, n, ratio in compare(old, new):
+        flag = ""
+        if ratio > 1 + args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{size:>8} {name:<28} {metric:<8} {o:10.3f} -> {n:10.3f}  x{ratio:5.2f}{flag}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# bench/run.py
+# Times GraphSearcher / GraphKNN and the app's topology + render helpers on
+# synthetic graphs and writes a machine-readable JSON report.
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from bench.synthetic import generate_graph, sample_queries
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+def _summarize(samples_ms: List[float]) -> Dict[str, float]:
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "n": int(arr.size),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "max_ms": float(arr.max()),
+    }
+
+def _time_calls(fn: Callable[[Any], Any], args: List[Any]) -> Dict[str, float]:
+    samples = []
+    for a in args:
+        t0 = time.perf_counter()
+        fn(a)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return _summarize(samples)
+
+def _time_once(fn: Callable[[], Any]):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, {"n": 1, "total_ms": (time.perf_counter() - t0) * 1000.0}
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+def bench_graph(nodes, edges, repeats: int) -> Dict[str, Any]:
+    """_build_index, _collapse_subtree and render_graph payload construction."""
+    from graph_utils import build_index, collapse_subtree, build_graph_payload
+
+    out: Dict[str, Any] = {}
+    (node_map, children_map, _, _), out["build_index"] = _time_once(lambda: build_index(nodes, edges))
+
+    visible_nodes = set(node_map)
+    visible_edges = {(e["source"], e["target"]) for e in edges}
+    rng = np.random.default_rng(2)
+    parents = list(children_map)
+    picks = [parents[int(i)] for i in rng.integers(len(parents), size=repeats)] if parents else []
+    if picks:
+        out["collapse_subtree"] = _time_calls(
+            lambda nid: collapse_subtree(children_map, visible_nodes, visible_edges, nid), picks
+        )
+
+    out["render_payload_all_visible"] = _time_calls(
+        lambda _: build_graph_payload(node_map, children_map, visible_nodes, visible_edges,
+                                      focus_id=picks[0] if picks else None),
+        range(max(1, repeats // 10)),
+    )
+    return out
+
+def bench_search(nodes, edges, queries: List[str]) -> Dict[str, Any]:
+    """GraphSearcher build, search latency (result cache cleared), per-stage latency and cache hits."""
+    from search_utils import GraphSearcher
+
+    out: Dict[str, Any] = {}
+    searcher, out["searcher_build"] = _time_once(lambda: GraphSearcher(nodes=nodes, edges=edges))
+    searcher.search(queries[0])  # warm-up (first encode pays lazy init)
+
+    samples, stages = [], {}
+    for q in queries:
+        searcher.result_cache.clear()  # time the full pipeline, not a repeat served from the cache
+        t0 = time.perf_counter()
+        response = searcher.search(q)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+        for stage, ms in response.timings_ms.items():
+            stages.setdefault(stage, []).append(ms)
+    out["search"] = _summarize(samples)
+    out["search_stages"] = {stage: _summarize(ms) for stage, ms in stages.items()}
+    # The last query is still cached; fill the rest, then time the hits on their own
+    for q in queries:
+        searcher.search(q)
+    out["search_cached"] = _time_calls(searcher.search, queries)
+    return out
+
+def bench_knn(nodes, queries: List[str], k: int = 3, pq: bool = False) -> Dict[str, Any]:
+    """GraphKNN build and find_similar_nodes latency (query encode excluded)."""
+    from knn_utils import GraphKNN
+
+    out: Dict[str, Any] = {}
+    knn, out["knn_build"] = _time_once(lambda: GraphKNN(nodes))
+    query_embeddings = [knn.get_embedding(q) for q in queries]
+    out["knn_find_similar_nodes"] = _time_calls(lambda e: knn.find_similar_nodes(e, k=k), query_embeddings)
+    if pq:
+        out.update(bench_knn_pq(knn, queries))
+    return out
+
+def bench_knn_pq(knn, queries: List[str], k: int = 10, rescores=(0, 100)) -> Dict[str, Any]:
+    """PQ-compressed GraphKNN vs the exact index: build, latency, recall@k, bytes/node."""
+    from knn_utils import GraphKNN
+    from pq_utils import recall_at_k
+
+    out: Dict[str, Any] = {}
+    emb = np.asarray(knn.node_embeddings, dtype=np.float32)
+    unit = emb / np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+    query_embeddings = np.asarray([knn.get_embedding(q) for q in queries], dtype=np.float32)
+    sims = (query_embeddings / np.linalg.norm(query_embeddings, axis=1, keepdims=True)) @ unit.T
+    k = min(k, len(emb))
+    exact_ids = np.argsort(-sims, axis=1, kind="stable")[:, :k]
+    for rescore in rescores:
+        pq_knn, build = _time_once(lambda: GraphKNN(knn.nodes, node_embeddings=emb, index="pq", rescore=rescore))
+        if rescore == rescores[0]:
+            out["knn_pq_build"] = build
+        out[f"knn_pq_r{rescore}_find_similar_nodes"] = _time_calls(
+            lambda e: pq_knn.find_similar_nodes(e, k=3), list(query_embeddings))
+        approx_ids = [pq_knn._pq_candidates(q, k)[0] for q in query_embeddings]
+        code_bytes = pq_knn.pq_codes.shape[1] * pq_knn.pq_codes.itemsize
+        out[f"knn_pq_r{rescore}_quality"] = {
+            "k": k,
+            "recall_at_k": recall_at_k(exact_ids, np.asarray(approx_ids)),
+            "bytes_per_node": code_bytes + (emb.shape[1] * 4 if rescore else 0),
+            "exact_bytes_per_node": 2 * emb.shape[1] * emb.itemsize,  # embeddings + sklearn fit copy
+        }
+    return out
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark search and rendering hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="graph sizes to generate (1k .. 1M nodes)")
+    parser.add_argument("--queries", type=int, default=200, help="queries per search benchmark")
+    parser.add_argument("--repeats", type=int, default=50, help="repeats for topology benchmarks")
+    parser.add_argument("--skip-model", action="store_true",
+                        help="skip GraphSearcher/GraphKNN (no SentenceTransformer needed)")
+    parser.add_argument("--pq", action="store_true", help="also benchmark the PQ GraphKNN index (recall@k)")
+    parser.add_argument("--out", default=None, help="output JSON (default bench/results/<commit>.json)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    commit = _git_commit()
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": {},
+    }
+
+    for n in args.sizes:
+        print(f"[bench] generating {n} nodes...")
+        nodes, edges = generate_graph(n, seed=args.seed)
+        queries = sample_queries(nodes, args.queries, seed=args.seed + 1)
+        result: Dict[str, Any] = {}
+        result.update(bench_graph(nodes, edges, args.repeats))
+        if not args.skip_model:
+            result.update(bench_search(nodes, edges, queries))
+            result.update(bench_knn(nodes, queries, pq=args.pq))
+        report["results"][str(n)] = result
+        for name, stats in result.items():
+            if "p50_ms" in stats:
+                print(f"  {n:>8} {name:<28} p50 {stats['p50_ms']:9.3f} ms  p99 {stats['p99_ms']:9.3f} ms")
+            elif "total_ms" in stats:
+                print(f"  {n:>8} {name:<28} {stats['total_ms']:9.1f} ms")
+            elif "recall_at_k" in stats:
+                print(f"  {n:>8} {name:<28} recall@{stats['k']} {stats['recall_at_k']:.3f}  "
+                      f"{stats['bytes_per_node']} B/node (exact {stats['exact_bytes_per_node']})")
+
+    out_path = args.out or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[bench] wrote {out_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# bench/synthetic.py
+# Synthetic DIGIT-shaped knowledge graphs (platform -> areas -> products ->
+# modules -> pages) with label/content lengths similar to data.py.
+from typing import Dict, List, Tuple
+import numpy as np
+
+LABEL_WORDS = [
+    "Health", "Campaign", "Management", "Dashboard", "Console", "Microplanning",
+    "Inventory", "Attendance", "Registration", "Beneficiary", "Stock", "Payments",
+    "Release", "Guide", "User", "Manual", "Setup", "Configuration", "Reports",
+    "HCM", "DIGIT", "Architecture", "Features", "Goals", "Benefits", "Problems",
+    "Addressed", "Implementation", "Migration", "Testing", "Complaints", "Device",
+    "Tracking", "Checklist", "Household", "Distribution", "Supervisor", "Training",
+    "Specifications", "Integration", "Planning", "Approach", "Impact", "v1.7", "v1.8",
+]
+
+CONTENT_WORDS = LABEL_WORDS + [
+    "the", "and", "for", "with", "platform", "program", "managers", "frontline",
+    "workers", "real-time", "data", "coverage", "immunisation", "malaria", "nutrition",
+    "NTD", "campaigns", "country", "district", "village", "households", "delivery",
+    "monitoring", "dashboards", "decisions", "modular", "open-source", "configure",
+    "launch", "mobile", "app", "offline", "sync", "roles", "users", "payments",
+    "workflow", "approval", "service", "API", "module", "reports", "geospatial",
+    "boundary", "target", "population", "resources", "equitable", "scalable",
+]
+
+END_USERS = ["All", "senior management", "business analyst", "implementer", "field supervisor"]
+END_USER_P = [0.85, 0.06, 0.04, 0.03, 0.02]
+
+# Mean children per node at each depth (deeper levels repeat the last value)
+BRANCHING = [6, 5, 8, 12, 16]
+
+def generate_graph(n_nodes: int, n_roots: int = 2, seed: int = 0) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Build a tree of exactly `n_nodes` nodes, filled breadth-first so large
+    graphs stay wide and a few levels deep like the DIGIT docs hierarchy.
+    Returns (nodes, edges) in the same shape as data.NODES / data.EDGES.
+    """
+    rng = np.random.default_rng(seed)
+    label_words = np.array(LABEL_WORDS, dtype=object)
+    content_words = np.array(CONTENT_WORDS, dtype=object)
+
+    label_lens = rng.integers(1, 6, size=n_nodes)           # 1-5 words
+    content_lens = rng.integers(15, 151, size=n_nodes)      # 15-150 words
+    label_idx = rng.integers(0, len(label_words), size=int(label_lens.sum()))
+    content_idx = rng.integers(0, len(content_words), size=int(content_lens.sum()))
+    end_users = rng.choice(len(END_USERS), size=n_nodes, p=END_USER_P)
+
+    nodes: List[Dict] = []
+    label_off = content_off = 0
+    for i in range(n_nodes):
+        ll, cl = int(label_lens[i]), int(content_lens[i])
+        nodes.append({
+            "id": f"n{i}",
+            "label": " ".join(label_words[label_idx[label_off:label_off + ll]]),
+            "end_user": END_USERS[end_users[i]],
+            "content": " ".join(content_words[content_idx[content_off:content_off + cl]]) + ".",
+            "url": f"https://example.org/docs/n{i}",
+        })
+        label_off += ll
+        content_off += cl
+
+    edges: List[Dict] = []
+    frontier = [(i, 0) for i in range(min(n_roots, n_nodes))]
+    next_id = len(frontier)
+    head = 0
+    while next_id < n_nodes:
+        parent, depth = frontier[head]
+        head += 1
+        mean = BRANCHING[min(depth, len(BRANCHING) - 1)]
+        for _ in range(max(1, int(rng.poisson(mean)))):
+            if next_id >= n_nodes:
+                break
+            edges.append({"source": f"n{parent}", "target": f"n{next_id}", "type": "child"})
+            frontier.append((next_id, depth + 1))
+            next_id += 1
+    return nodes, edges
+
+def sample_queries(nodes: List[Dict], n_queries: int, seed: int = 1) -> List[str]:
+    """Mix of the demo queries from search_utils.py and label/content snippets."""
+    rng = np.random.default_rng(seed)
+    base = ["what is hcm", "how to implement hcm", "how do i use hcm", "1.8 version"]
+    queries = list(base)
+    while len(queries) < n_queries:
+        node = nodes[int(rng.integers(len(nodes)))]
+        if rng.random() < 0.5:
+            queries.append(node["label"].lower())
+        else:
+            words = node["content"].split()
+            start = int(rng.integers(max(1, len(words) - 6)))
+            queries.append(" ".join(words[start:start + 6]))
+    return queries[:n_queries]
@@ -0,0 +1,144 @@
+# bundle_utils.py
+# One flat layout for a named set of numpy arrays plus JSON metadata, used
+# both for POSIX shared-memory segments and for on-disk files:
+#
+#   MAGIC (8 bytes) | header length (uint64 LE) | header JSON | pad | arrays
+#
+# Every array starts on a 64-byte boundary, so readers can wrap the segment
+# or an mmap of the file with np.frombuffer (zero copy, read-only).
+import json
+import mmap
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+MAGIC = b"KGIDX\x00\x01\x00"
+ALIGN = 64
+FORMAT_VERSION = 1
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+def _layout(arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> Tuple[bytes, int, Dict[str, int]]:
+    """Header bytes, total size and absolute offsets for each array."""
+    specs, rel, cursor = {}, {}, 0
+    for name, arr in arrays.items():
+        rel[name] = cursor
+        specs[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": cursor}
+        cursor = _align(cursor + arr.nbytes)
+    header = json.dumps({"format_version": FORMAT_VERSION, "meta": meta, "arrays": specs},
+                        separators=(",", ":")).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header))
+    offsets = {name: data_start + off for name, off in rel.items()}
+    return header, data_start + cursor, offsets
+
+def bundle_size(arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> int:
+    return _layout(arrays, meta)[1]
+
+def write_bundle(buf, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> int:
+    """
+    Write into a writable, zero-filled buffer (shm.buf, bytearray, mmap) of at
+    least bundle_size(). MAGIC goes in last, so a reader never accepts a
+    half-written bundle.
+    """
+    header, total, offsets = _layout(arrays, meta)
+    view = memoryview(buf)
+    view[len(MAGIC):len(MAGIC) + 8] = struct.pack("<Q", len(header))
+    view[len(MAGIC) + 8:len(MAGIC) + 8 + len(header)] = header
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        dst = np.frombuffer(view, dtype=arr.dtype, count=arr.size, offset=offsets[name])
+        dst[:] = arr.ravel()
+    view[:len(MAGIC)] = MAGIC
+    return total
+
+def read_bundle(buf) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Zero-copy, read-only array views over a bundle buffer."""
+    view = memoryview(buf)
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not an index bundle (bad magic)")
+    (header_len,) = struct.unpack("<Q", view[len(MAGIC):len(MAGIC) + 8])
+    header = json.loads(bytes(view[len(MAGIC) + 8:len(MAGIC) + 8 + header_len]).decode("utf-8"))
+    if header.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format version: {header.get('format_version')}")
+    data_start = _align(len(MAGIC) + 8 + header_len)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"])) if spec["shape"] else 1
+        arr = np.frombuffer(view, dtype=dtype, count=count, offset=data_start + spec["offset"])
+        arr = arr.reshape(spec["shape"])
+        arr.flags.writeable = False
+        arrays[name] = arr
+    return header["meta"], arrays
+
+# ---------------------------
+# Shared memory
+# ---------------------------
+def publish_shared(name: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> shared_memory.SharedMemory:
+    """
+    Create segment `name` and copy the bundle into it. Raises FileExistsError
+    if another process already published it. Keep the returned object alive;
+    call .unlink() when the index should disappear for everyone.
+    """
+    shm = shared_memory.SharedMemory(name=name, create=True, size=bundle_size(arrays, meta))
+    write_bundle(shm.buf, arrays, meta)
+    return shm
+
+def attach_shared(name: str, wait_s: float = 30.0) -> Tuple[shared_memory.SharedMemory, Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Attach read-only to a published segment. Raises FileNotFoundError if
+    absent; waits up to `wait_s` for a segment that is still being written,
+    then raises ValueError.
+    """
+    shm = shared_memory.SharedMemory(name=name, create=False)
+    if sys.version_info < (3, 13):
+        # Before 3.13 attaching registers the segment with this process's
+        # resource tracker, which would unlink it when we exit.
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+    deadline = time.monotonic() + wait_s
+    while bytes(shm.buf[:len(MAGIC)]) == b"\0" * len(MAGIC):  # publisher has not finished
+        if time.monotonic() > deadline:
+            shm.close()
+            raise ValueError(f"Shared index '{name}' is still incomplete after {wait_s:.0f}s")
+        time.sleep(0.05)
+    meta, arrays = read_bundle(shm.buf)
+    return shm, meta, arrays
+
+def detach_shared(shm: shared_memory.SharedMemory, arrays: Dict[str, np.ndarray]):
+    """
+    Close a segment from attach_shared that will not be used (e.g. its
+    fingerprint did not match). The views go first: SharedMemory.close()
+    raises BufferError while arrays still point into the segment.
+    """
+    arrays.clear()
+    shm.close()
+
+# ---------------------------
+# Files (memory-mapped)
+# ---------------------------
+def save_bundle(path: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+    """Write a bundle file atomically (temp file + rename)."""
+    import os
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        header, total, offsets = _layout(arrays, meta)
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name, arr in arrays.items():
+            f.write(b"\0" * (offsets[name] - f.tell()))
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.write(b"\0" * (total - f.tell()))
+    os.replace(tmp, path)
+
+def load_bundle(path: str) -> Tuple[mmap.mmap, Dict[str, Any], Dict[str, np.ndarray]]:
+    """mmap a bundle file read-only; arrays are views into the page cache."""
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    meta, arrays = read_bundle(mm)
+    return mm, meta, arrays
@@ -0,0 +1,66 @@
+# cache_utils.py
+# Bounded, thread-safe LRU for search results. Keys carry the index version,
+# so entries from an older index can never be served; clear() drops them
+# eagerly when the owner rebuilds. Pinned entries (precomputed answers for the
+# most frequent queries) sit outside the LRU and are never evicted.
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from metrics_utils import REGISTRY as METRICS
+
+METRICS.describe("cache_requests_total", "Result cache lookups, by cache and result (hit/miss).")
+
+class ResultCache:
+    def __init__(self, maxsize: int = 1024, name: str = "search"):
+        self.maxsize = maxsize
+        self.name = name
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._pinned: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._pinned.get(key)
+            if value is None:
+                value = self._data.get(key)
+                if value is not None:
+                    self._data.move_to_end(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if METRICS.enabled:
+            METRICS.inc("cache_requests_total", cache=self.name, result="miss" if value is None else "hit")
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._pinned or key in self._data  # no LRU touch, no stats
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pin(self, key: Hashable, value: Any):
+        with self._lock:
+            self._pinned[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._pinned.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {"size": len(self._data), "maxsize": self.maxsize, "pinned": len(self._pinned), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
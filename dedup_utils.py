@@ -0,0 +1,165 @@
+# dedup_utils.py
+# Near-duplicate detection with locality-sensitive hashing. Content is
+# shingled into character 5-grams and MinHashed (Jaccard); embeddings, when
+# available, get random-hyperplane signatures (cosine). Both signatures are
+# split into bands that key hash buckets, so a query only compares against
+# nodes sharing a bucket instead of the whole corpus.
+#   python dedup_utils.py scan [--threshold 0.7] [--index index.kgidx]
+import argparse
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+_PRIME = np.uint64(4294967291)  # largest prime < 2**32, so a*x + b fits in uint64
+
+def shingles(text: str, size: int = 5) -> Set[str]:
+    """Character shingles of the lower-cased, whitespace-collapsed text."""
+    norm = " ".join(re.findall(r"\w+", (text or "").lower()))
+    if len(norm) <= size:
+        return {norm} if norm else set()
+    return {norm[i:i + size] for i in range(len(norm) - size + 1)}
+
+def node_text(node: Dict) -> str:
+    label = str(node.get("label", "")).replace("Auto-added:", "").rstrip(".")
+    content = node.get("content")
+    return f"{label} {content if isinstance(content, str) else ''}"
+
+@dataclass
+class DuplicateMatch:
+    node_id: str
+    jaccard: float                  # MinHash estimate
+    cosine: Optional[float] = None  # exact, when both sides have embeddings
+
+class NearDuplicateIndex:
+    """
+    MinHash LSH over content shingles (bands x rows = num_perm) plus
+    random-hyperplane LSH over embeddings (tables x bits). Candidates from
+    either are verified before being reported as duplicates.
+    A pair with Jaccard s shares a band with probability 1 - (1 - s**rows)**bands:
+    32 x 4 catches 99.98% of pairs at s = 0.7 (16 x 8 only 61%).
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, tables: int = 12, bits: int = 12,
+                 jaccard_threshold: float = 0.7, cosine_threshold: float = 0.95, seed: int = 0):
+        if num_perm % bands:
+            raise ValueError(f"num_perm={num_perm} is not divisible by bands={bands}")
+        self.bands, self.rows = bands, num_perm // bands
+        self.tables, self.bits = tables, bits
+        self.jaccard_threshold = jaccard_threshold
+        self.cosine_threshold = cosine_threshold
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._rng = rng
+        self._planes: Optional[np.ndarray] = None  # (tables * bits, dim), drawn on first embedding
+        self._weights = (1 << np.arange(bits)).astype(np.int64)
+        self._buckets: Dict[Tuple, List[str]] = defaultdict(list)
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.embeddings: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def minhash(self, text: str) -> np.ndarray:
+        grams = shingles(text)
+        if not grams:
+            return np.full(len(self._a), int(_PRIME), dtype=np.uint64)
+        h = np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+        return ((np.outer(h, self._a) + self._b) % _PRIME).min(axis=0)
+
+    def _hyperplane_keys(self, embedding: np.ndarray) -> np.ndarray:
+        v = np.asarray(embedding, dtype=np.float32).ravel()
+        if self._planes is None:
+            self._planes = self._rng.standard_normal((self.tables * self.bits, len(v))).astype(np.float32)
+        bits = (self._planes @ v > 0).reshape(self.tables, self.bits)
+        return bits @ self._weights
+
+    def _keys(self, signature: np.ndarray, embedding: Optional[np.ndarray]) -> List[Tuple]:
+        keys = [("m", b, signature[b * self.rows:(b + 1) * self.rows].tobytes()) for b in range(self.bands)]
+        if embedding is not None:
+            keys += [("h", t, int(key)) for t, key in enumerate(self._hyperplane_keys(embedding))]
+        return keys
+
+    @staticmethod
+    def _unit(embedding) -> Optional[np.ndarray]:
+        if embedding is None:
+            return None
+        v = np.asarray(embedding, dtype=np.float32).ravel()
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    def add(self, node_id: str, text: str, embedding=None):
+        signature = self.minhash(text)
+        embedding = self._unit(embedding)
+        self.signatures[node_id] = signature
+        if embedding is not None:
+            self.embeddings[node_id] = embedding
+        for key in self._keys(signature, embedding):
+            self._buckets[key].append(node_id)
+
+    def add_nodes(self, nodes: Iterable[Dict], embeddings: Optional[np.ndarray] = None):
+        for i, node in enumerate(nodes):
+            self.add(node["id"], node_text(node), None if embeddings is None else embeddings[i])
+
+    def query(self, text: str, embedding=None, exclude: Optional[str] = None) -> List[DuplicateMatch]:
+        """Indexed nodes that look like duplicates of (text, embedding), most similar first."""
+        return self._verify(self.minhash(text), self._unit(embedding), exclude)
+
+    def _verify(self, signature: np.ndarray, embedding: Optional[np.ndarray],
+                exclude: Optional[str]) -> List[DuplicateMatch]:
+        candidates = {nid for key in self._keys(signature, embedding) for nid in self._buckets.get(key, ())}
+        candidates.discard(exclude)
+        matches = []
+        for nid in candidates:
+            jaccard = float((self.signatures[nid] == signature).mean())
+            other = self.embeddings.get(nid)
+            cosine = float(other @ embedding) if other is not None and embedding is not None else None
+            if jaccard >= self.jaccard_threshold or (cosine is not None and cosine >= self.cosine_threshold):
+                matches.append(DuplicateMatch(nid, jaccard, cosine))
+        return sorted(matches, key=lambda m: (-(m.cosine if m.cosine is not None else m.jaccard), -m.jaccard))
+
+    def scan(self) -> List[List[str]]:
+        """Bulk dedup of everything indexed: groups of near-duplicate node ids (size >= 2)."""
+        parent = {nid: nid for nid in self.signatures}
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for nid, signature in self.signatures.items():
+            for match in self._verify(signature, self.embeddings.get(nid), exclude=nid):
+                parent[find(match.node_id)] = find(nid)
+        groups: Dict[str, List[str]] = defaultdict(list)
+        for nid in self.signatures:
+            groups[find(nid)].append(nid)
+        return [g for g in groups.values() if len(g) > 1]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Near-duplicate scan over the graph's nodes")
+    parser.add_argument("command", choices=["scan"])
+    parser.add_argument("--threshold", type=float, default=0.7, help="MinHash Jaccard threshold")
+    parser.add_argument("--cosine", type=float, default=0.95, help="embedding cosine threshold")
+    parser.add_argument("--index", help="also compare embeddings from an index snapshot")
+    args = parser.parse_args(argv)
+
+    from data import NODES, EDGES
+
+    embeddings = None
+    if args.index:
+        from search_utils import GraphSearcher
+        embeddings = GraphSearcher.load(args.index, NODES, EDGES).embeddings
+    index = NearDuplicateIndex(jaccard_threshold=args.threshold, cosine_threshold=args.cosine)
+    index.add_nodes(NODES, embeddings)
+    labels = {n["id"]: n.get("label", n["id"]) for n in NODES}
+    groups = index.scan()
+    for group in groups:
+        print(" ~ ".join(f"{nid} ({labels[nid]})" for nid in group))
+    print(f"{len(groups)} near-duplicate groups among {len(index)} nodes")
+
+if __name__ == "__main__":
+    main()
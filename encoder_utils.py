@@ -0,0 +1,243 @@
+# encoder_utils.py
+# Selectable sentence-encoder backends for GraphSearcher / GraphKNN:
+#   torch - SentenceTransformer (full precision, imports torch)
+#   onnx  - the same model exported to ONNX with int8 dynamic quantisation, run
+#           with onnxruntime + tokenizers (no torch on the query path)
+# Pick with KG_ENCODER_BACKEND=torch|onnx; the ONNX model directory comes from
+# KG_ONNX_MODEL_DIR (default models/<model>-onnx).
+#
+#   python encoder_utils.py export [--model all-MiniLM-L6-v2] [--out DIR]   # needs torch + onnx
+#   python encoder_utils.py check  [--model-dir DIR]   # parity vs torch (cosine >= 0.99)
+#   python encoder_utils.py bench  [--model-dir DIR]   # startup + per-query latency per backend
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+CONFIG_FILE = "encoder_config.json"
+FP32_FILE = "model.onnx"
+INT8_FILE = "model_int8.onnx"
+
+def default_model_dir(model_name: str = DEFAULT_MODEL) -> str:
+    return os.path.join("models", f"{model_name.split('/')[-1]}-onnx")
+
+class OnnxEncoder:
+    """
+    Drop-in for the SentenceTransformer.encode calls this repo makes:
+    tokenize -> ONNX transformer -> mean/CLS pooling -> optional L2 normalise.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = True, threads: Optional[int] = None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, CONFIG_FILE), "r", encoding="utf-8") as f:
+            self.config: Dict[str, Any] = json.load(f)
+        self.model_name = self.config["model_name"]
+        self.pooling = self.config.get("pooling", "mean")
+        self.normalize = bool(self.config.get("normalize", False))
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=int(self.config["max_seq_length"]))
+        self.tokenizer.enable_padding(pad_id=int(self.config["pad_token_id"]), pad_token=self.config["pad_token"])
+
+        self.path = os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        self.nbytes = os.path.getsize(self.path)  # reported by memory_utils.module_bytes
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.config["dim"])
+
+    def eval(self) -> "OnnxEncoder":
+        return self
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask,
+                 "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64)}
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self._inputs})[0]
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        else:
+            weights = mask[..., None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        if self.normalize:
+            pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled.astype(np.float32)
+
+    def encode(self, sentences: Union[str, Sequence[str]], batch_size: int = 32,
+               normalize_embeddings: bool = False, **_ignored) -> np.ndarray:
+        """Returns numpy only (convert_to_tensor / show_progress_bar are ignored)."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        # Longest first, as SentenceTransformer does, so batches pad less
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = np.zeros((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for lo in range(0, len(texts), batch_size):
+            idx = order[lo:lo + batch_size]
+            out[idx] = self._encode_batch([texts[i] for i in idx])
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
+
+def load_encoder(model_name: str = DEFAULT_MODEL, backend: Optional[str] = None, device: str = "cpu"):
+    """SentenceTransformer or OnnxEncoder, per `backend` / KG_ENCODER_BACKEND (default torch)."""
+    backend = (backend or os.getenv("KG_ENCODER_BACKEND") or "torch").lower()
+    if backend == "onnx":
+        model_dir = os.getenv("KG_ONNX_MODEL_DIR") or default_model_dir(model_name)
+        encoder = OnnxEncoder(model_dir)
+        if encoder.model_name.split("/")[-1] != model_name.split("/")[-1]:
+            raise ValueError(f"{model_dir} holds {encoder.model_name}, expected {model_name}")
+        return encoder
+    if backend != "torch":
+        raise ValueError(f"Unknown encoder backend: {backend}")
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name, device=device)
+    model.eval()
+    return model
+
+# ---------------------------
+# Export / parity / benchmark
+# ---------------------------
+def export_onnx(model_name: str = DEFAULT_MODEL, out_dir: Optional[str] = None,
+                quantize: bool = True, opset: int = 14) -> str:
+    """Export the SentenceTransformer's transformer to ONNX (+ int8 copy) with its tokenizer."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = out_dir or default_model_dir(model_name)
+    os.makedirs(out_dir, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    tokenizer.save_pretrained(out_dir)  # tokenizer.json for the fast tokenizer
+
+    dummy = tokenizer(["export an onnx graph"], return_tensors="pt")
+    input_names = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in dummy]
+
+    class _LastHidden(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *args):
+            return self.model(**dict(zip(input_names, args))).last_hidden_state
+
+    fp32_path = os.path.join(out_dir, FP32_FILE)
+    axes = {name: {0: "batch", 1: "seq"} for name in input_names + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(_LastHidden(transformer), tuple(dummy[k] for k in input_names), fp32_path,
+                          input_names=input_names, output_names=["last_hidden_state"],
+                          dynamic_axes=axes, opset_version=opset, dynamo=False)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(out_dir, INT8_FILE), weight_type=QuantType.QInt8)
+
+    pooling = st_model[1].get_config_dict() if len(st_model) > 1 else {}
+    config = {
+        "model_name": model_name,
+        "dim": st_model.get_sentence_embedding_dimension(),
+        "max_seq_length": st_model.max_seq_length,
+        "pooling": "cls" if pooling.get("pooling_mode_cls_token") else "mean",
+        "normalize": any(type(m).__name__ == "Normalize" for m in st_model),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "quantized": quantize,
+    }
+    with open(os.path.join(out_dir, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return out_dir
+
+def parity_check(texts: Sequence[str], reference, candidate, min_cosine: float = 0.99) -> Dict[str, Any]:
+    """Row-wise cosine between two encoders' embeddings of the same texts."""
+    a = np.asarray(reference.encode(list(texts), convert_to_numpy=True), dtype=np.float32)
+    b = np.asarray(candidate.encode(list(texts), convert_to_numpy=True), dtype=np.float32)
+    cos = (a * b).sum(axis=1) / np.maximum(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12)
+    worst = int(np.argmin(cos))
+    return {"n": len(texts), "min_cosine": float(cos.min()), "mean_cosine": float(cos.mean()),
+            "worst_text": texts[worst], "passed": bool(cos.min() >= min_cosine)}
+
+_BENCH_SNIPPET = """
+import json, os, sys, time
+t0 = time.perf_counter()
+from encoder_utils import load_encoder
+encoder = load_encoder(sys.argv[1], backend=sys.argv[2])
+startup = time.perf_counter() - t0
+queries = json.loads(sys.argv[3])
+t0 = time.perf_counter(); encoder.encode(queries[0]); first = time.perf_counter() - t0
+lat = []
+for q in queries:
+    t0 = time.perf_counter(); encoder.encode(q); lat.append((time.perf_counter() - t0) * 1000.0)
+lat.sort()
+print(json.dumps({"backend": sys.argv[2], "startup_s": startup, "first_query_ms": first * 1000.0,
+                  "p50_ms": lat[len(lat) // 2], "p95_ms": lat[int(len(lat) * 0.95) - 1],
+                  "torch_imported": "torch" in sys.modules}))
+"""
+
+def benchmark(model_name: str, queries: List[str], backends: Sequence[str] = ("torch", "onnx")) -> List[Dict[str, Any]]:
+    """Fresh interpreter per backend, so startup includes imports (torch or onnxruntime)."""
+    rows = []
+    here = os.path.dirname(os.path.abspath(__file__))
+    for backend in backends:
+        proc = subprocess.run([sys.executable, "-c", _BENCH_SNIPPET, model_name, backend, json.dumps(queries)],
+                              capture_output=True, text=True, cwd=here)
+        if proc.returncode != 0:
+            rows.append({"backend": backend, "error": proc.stderr.strip().splitlines()[-1:]})
+        else:
+            rows.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return rows
+
+def _sample_texts(limit: int = 200) -> List[str]:
+    from data import NODES
+    texts = [f"{n.get('label', '')} {n.get('content', '')}" for n in NODES]
+    texts += [n.get("label", "") for n in NODES]
+    texts += ["what is hcm", "how to implement hcm", "1.8 version", "stock management", "payments"]
+    return texts[:limit]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export/check/benchmark the ONNX int8 encoder backend")
+    parser.add_argument("command", choices=["export", "check", "bench"])
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--model-dir", "--out", dest="model_dir", default=None)
+    parser.add_argument("--no-quantize", action="store_true")
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args(argv)
+    model_dir = args.model_dir or default_model_dir(args.model)
+
+    if args.command == "export":
+        t0 = time.perf_counter()
+        export_onnx(args.model, model_dir, quantize=not args.no_quantize)
+        sizes = {f: os.path.getsize(os.path.join(model_dir, f)) / 1e6
+                 for f in (FP32_FILE, INT8_FILE) if os.path.exists(os.path.join(model_dir, f))}
+        print(f"Exported {args.model} to {model_dir} in {time.perf_counter() - t0:.1f}s: "
+              + ", ".join(f"{f} {mb:.1f} MB" for f, mb in sizes.items()))
+    elif args.command == "check":
+        os.environ["KG_ONNX_MODEL_DIR"] = model_dir
+        result = parity_check(_sample_texts(), load_encoder(args.model, "torch"),
+                              load_encoder(args.model, "onnx"), args.min_cosine)
+        print(json.dumps(result, indent=2))
+        if not result["passed"]:
+            raise SystemExit(1)
+    else:
+        os.environ["KG_ONNX_MODEL_DIR"] = os.path.abspath(model_dir)
+        texts = _sample_texts()
+        queries = [texts[i % len(texts)][:80] for i in range(args.queries)]
+        for row in benchmark(args.model, queries):
+            print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# eval_utils.py
+# Offline relevance + latency evaluation for GraphSearcher.
+# BM25 and dense score matrices are computed once for all labelled queries;
+# fusion weights and thresholds are then swept as array operations.
+#   python eval_utils.py labels.jsonl --alphas 0.2 0.4 0.6 --betas 0.4 0.6 0.8
+#
+# labels.jsonl: one {"query": "...", "relevant": ["10", "36"]} per line
+import argparse
+import csv
+import json
+import time
+from dataclasses import dataclass
+from itertools import product
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+APP_CUTOFF = 0.5  # app.py only shows graph matches with score >= 0.5
+
+@dataclass
+class ScoreMatrices:
+    query_ids: List[str]
+    bm25: np.ndarray           # (Q, N) min-max normalised per query, as in search()
+    dense: np.ndarray          # (Q, N) cosine similarity
+    relevant: np.ndarray       # (Q, N) bool
+    lexical_ms: np.ndarray     # (Q,) per-query preprocess + BM25 time
+    encode_ms: float           # mean per-query encode time (batched)
+    dense_ms: np.ndarray       # (Q,) per-query cosine time
+
+def load_labels(path: str) -> List[Dict]:
+    """Read query -> relevant node ids; accepts `relevant`, `node_ids` or `node_id`."""
+    labels = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            relevant = row.get("relevant") or row.get("node_ids") or row.get("node_id") or []
+            if isinstance(relevant, str):
+                relevant = [relevant]
+            labels.append({"query": row["query"], "relevant": [str(r) for r in relevant]})
+    return labels
+
+def compute_score_matrices(searcher, labels: List[Dict]) -> ScoreMatrices:
+    """Score every labelled query against every node once (the slow part)."""
+    n = len(searcher.nodes)
+    row_of = {node["id"]: i for i, node in enumerate(searcher.nodes)}
+    q = len(labels)
+    bm25 = np.zeros((q, n), dtype=np.float32)
+    relevant = np.zeros((q, n), dtype=bool)
+    lexical_ms = np.zeros(q)
+    expanded = []
+    for i, row in enumerate(labels):
+        t0 = time.perf_counter()
+        text = searcher._expand_acronyms(row["query"])
+        # Same lexical stage as search(): spell-corrected tokens and the phrase boost
+        bm25[i] = searcher._lexical_scores(text, searcher._query_tokens(text))
+        lexical_ms[i] = (time.perf_counter() - t0) * 1000.0
+        expanded.append(text)
+        for node_id in row["relevant"]:
+            if node_id in row_of:
+                relevant[i, row_of[node_id]] = True
+
+    t0 = time.perf_counter()
+    query_emb = np.asarray(searcher.model.encode(expanded, convert_to_numpy=True), dtype=np.float32)
+    encode_ms = (time.perf_counter() - t0) * 1000.0 / max(q, 1)
+    query_emb /= np.maximum(np.linalg.norm(query_emb, axis=1, keepdims=True), 1e-12)
+    dense = np.zeros((q, n), dtype=np.float32)
+    dense_ms = np.zeros(q)
+    for i in range(q):
+        t0 = time.perf_counter()
+        dense[i] = (searcher.embeddings @ query_emb[i]) / searcher._embedding_norms
+        dense_ms[i] = (time.perf_counter() - t0) * 1000.0
+    return ScoreMatrices([r["query"] for r in labels], bm25, dense, relevant, lexical_ms, encode_ms, dense_ms)
+
+def sweep(m: ScoreMatrices, alphas: Sequence[float], betas: Sequence[float],
+          t_lows: Sequence[float], t_highs: Sequence[float], ks: Sequence[int] = (1, 3, 5),
+          app_cutoff: float = APP_CUTOFF) -> List[Dict]:
+    """
+    One row per (alpha, beta, t_low, t_high). Ranking depends only on the
+    weights, so each weight pair costs one (Q, N) fusion + top-k; all
+    thresholds are then evaluated together on the (Q, k_max) top scores.
+    """
+    k_max = max(ks)
+    n_rel = m.relevant.sum(axis=1)
+    has_rel = n_rel > 0
+    t_low_arr = np.asarray(t_lows, dtype=np.float32)
+    t_high_arr = np.asarray(t_highs, dtype=np.float32)
+    est_query_ms = float(m.lexical_ms.mean() + m.encode_ms + m.dense_ms.mean())
+    q_idx = np.arange(m.bm25.shape[0])[:, None]
+
+    rows: List[Dict] = []
+    for alpha, beta in product(alphas, betas):
+        t0 = time.perf_counter()
+        fused = alpha * m.bm25 + beta * m.dense                      # (Q, N)
+        kk = min(k_max, fused.shape[1])
+        top = np.argpartition(-fused, kk - 1, axis=1)[:, :kk]
+        order = np.argsort(-fused[q_idx, top], axis=1, kind="stable")
+        top = top[q_idx, order]                                      # (Q, k)
+        top_scores = fused[q_idx, top]                               # (Q, k)
+        top_rel = m.relevant[q_idx, top]                             # (Q, k)
+
+        # Visible results: score >= max(t_low, app cutoff)  -> (T, Q, k)
+        cut = np.maximum(t_low_arr, app_cutoff)[:, None, None]
+        visible = top_scores[None] >= cut
+        hit = visible & top_rel[None]
+        recall = {k: (hit[:, :, :k].sum(axis=2) / np.maximum(n_rel, 1))[:, has_rel].mean(axis=1)
+                  if has_rel.any() else np.zeros(len(t_lows)) for k in ks}
+        first = np.where(hit.any(axis=2), hit.argmax(axis=2) + 1, 0)  # (T, Q) 1-based rank
+        rr = np.where(first > 0, 1.0 / np.maximum(first, 1), 0.0)
+        mrr = rr[:, has_rel].mean(axis=1) if has_rel.any() else np.zeros(len(t_lows))
+        fallthrough = (~visible[:, :, 0]).mean(axis=1)               # no result shown -> RAG
+        best = top_scores[:, 0][None] >= t_high_arr[:, None]         # (H, Q)
+        best_rate = best.mean(axis=1)
+        best_prec = np.where(best.sum(axis=1) > 0,
+                             (best & top_rel[:, 0][None]).sum(axis=1) / np.maximum(best.sum(axis=1), 1),
+                             np.nan)
+        sweep_ms = (time.perf_counter() - t0) * 1000.0
+
+        for ti, t_low in enumerate(t_lows):
+            for hi, t_high in enumerate(t_highs):
+                row = {"alpha": alpha, "beta": beta, "t_low": t_low, "t_high": t_high}
+                for k in ks:
+                    row[f"recall@{k}"] = float(recall[k][ti])
+                row["mrr"] = float(mrr[ti])
+                row["rag_fallthrough_rate"] = float(fallthrough[ti])
+                row["best_match_rate"] = float(best_rate[hi])
+                row["best_match_precision"] = float(best_prec[hi])
+                row["est_query_ms"] = est_query_ms
+                row["sweep_ms"] = sweep_ms
+                rows.append(row)
+    return rows
+
+def _grid(values: Optional[List[float]], start: float, stop: float, step: float) -> List[float]:
+    return values if values else [round(v, 4) for v in np.arange(start, stop + 1e-9, step)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate GraphSearcher relevance and tune fusion/thresholds")
+    parser.add_argument("labels", help="JSONL with {query, relevant: [node ids]}")
+    parser.add_argument("--alphas", type=float, nargs="*")
+    parser.add_argument("--betas", type=float, nargs="*")
+    parser.add_argument("--t-low", type=float, nargs="*", dest="t_lows")
+    parser.add_argument("--t-high", type=float, nargs="*", dest="t_highs")
+    parser.add_argument("--k", type=int, nargs="*", default=[1, 3, 5])
+    parser.add_argument("--app-cutoff", type=float, default=APP_CUTOFF)
+    parser.add_argument("--out", default=None, help="write all rows (.csv or .json)")
+    parser.add_argument("--top", type=int, default=10, help="print the best N settings by MRR")
+    args = parser.parse_args(argv)
+
+    from search_utils import GraphSearcher
+    from data import NODES, EDGES
+
+    labels = load_labels(args.labels)
+    searcher = GraphSearcher(nodes=NODES, edges=EDGES)
+    t0 = time.perf_counter()
+    matrices = compute_score_matrices(searcher, labels)
+    print(f"Scored {len(labels)} queries x {len(NODES)} nodes in {time.perf_counter() - t0:.2f}s")
+
+    t0 = time.perf_counter()
+    rows = sweep(
+        matrices,
+        alphas=_grid(args.alphas, 0.0, 1.0, 0.1),
+        betas=_grid(args.betas, 0.0, 1.0, 0.1),
+        t_lows=_grid(args.t_lows, 0.3, 0.8, 0.05),
+        t_highs=_grid(args.t_highs, 0.5, 0.95, 0.05),
+        ks=args.k,
+        app_cutoff=args.app_cutoff,
+    )
+    print(f"Swept {len(rows)} settings in {time.perf_counter() - t0:.2f}s")
+
+    if args.out:
+        if args.out.endswith(".json"):
+            with open(args.out, "w") as f:
+                json.dump(rows, f, indent=2)
+        else:
+            with open(args.out, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+
+    rows.sort(key=lambda r: (r["mrr"], -r["rag_fallthrough_rate"]), reverse=True)
+    for r in rows[:args.top]:
+        recalls = " ".join(f"R@{k}={r[f'recall@{k}']:.2f}" for k in args.k)
+        print(f"alpha={r['alpha']:.2f} beta={r['beta']:.2f} t_low={r['t_low']:.2f} t_high={r['t_high']:.2f} "
+              f"{recalls} MRR={r['mrr']:.3f} RAG={r['rag_fallthrough_rate']:.2f} "
+              f"best={r['best_match_rate']:.2f}@{r['best_match_precision']:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# graph_utils.py
+# Streamlit-free graph topology + render payload helpers. app.py wraps these
+# with session state; bench/ calls them directly.
+from typing import Any, Dict, List, Set, Tuple
+from collections import deque
+from streamlit_agraph import Node, Edge
+
+def build_index(nodes: List[Dict], edges: List[Dict]):
+    """Return (node_map, children_map, parents_map, roots) for the graph."""
+    node_map = {n["id"]: n for n in nodes}
+    children_map: Dict[str, List[str]] = {}
+    parents_map: Dict[str, List[str]] = {}
+
+    indegree: Dict[str, int] = {n["id"]: 0 for n in nodes}
+    for e in edges:
+        src, tgt = e["source"], e["target"]
+        children_map.setdefault(src, []).append(tgt)
+        parents_map.setdefault(tgt, []).append(src)
+        indegree[tgt] = indegree.get(tgt, 0) + 1
+        indegree.setdefault(src, indegree.get(src, 0))
+
+    roots = [nid for nid, d in indegree.items() if d == 0]
+    return node_map, children_map, parents_map, roots
+
+def collect_descendants(children_map: Dict[str, List[str]], root_id: str) -> Set[str]:
+    seen: Set[str] = set()
+    q = deque(children_map.get(root_id, []))
+    while q:
+        nid = q.popleft()
+        if nid in seen:
+            continue
+        seen.add(nid)
+        for c in children_map.get(nid, []):
+            if c not in seen:
+                q.append(c)
+    return seen
+
+def collapse_subtree(
+    children_map: Dict[str, List[str]],
+    visible_nodes: Set[str],
+    visible_edges: Set[Tuple[str, str]],
+    root_id: str,
+) -> Tuple[Set[str], Set[Tuple[str, str]]]:
+    """Hide root_id's descendants that are no longer reachable; returns new (nodes, edges)."""
+    descendants = collect_descendants(children_map, root_id)
+    collapsing_starts = {root_id} | descendants
+    to_remove_edges = {(u, v) for (u, v) in visible_edges if u in collapsing_starts}
+    visible_edges = visible_edges - to_remove_edges
+
+    parents_of = {}
+    for (u, v) in visible_edges:
+        parents_of[v] = parents_of.get(v, 0) + 1
+
+    to_hide_nodes: Set[str] = set()
+    for nid in descendants:
+        if parents_of.get(nid, 0) == 0:
+            to_hide_nodes.add(nid)
+
+    visible_nodes = visible_nodes - to_hide_nodes
+    visible_edges = {(u, v) for (u, v) in visible_edges if v not in to_hide_nodes}
+    return visible_nodes, visible_edges
+
+def build_graph_payload(
+    node_map: Dict[str, Dict[str, Any]],
+    children_map: Dict[str, List[str]],
+    visible_nodes: Set[str],
+    visible_edges: Set[Tuple[str, str]],
+    focus_id: Any = None,
+    role_high: Set[str] = frozenset(),
+    search_high: Set[str] = frozenset(),
+) -> Tuple[List[Node], List[Edge]]:
+    """agraph Node/Edge lists for the visible sub-graph, coloured by highlight priority."""
+    # Visual priority: focus (pink) > role_highlight (orange) > search_highlight (teal) > default
+    a_nodes = []
+    for nid in visible_nodes:
+        n = node_map[nid]
+        base_label = n.get("label", nid)
+
+        children = children_map.get(nid, [])
+        hidden_kids = any((cid not in visible_nodes) for cid in children)
+        label = f"+ {base_label}" if children and hidden_kids else (f"– {base_label}" if children else base_label)
+
+        # Determine color/size by priority
+        if nid == focus_id:
+            color = "#E91E63"   # pink
+            size = 34
+            font_size = 14
+        elif nid in role_high:
+            color = "#FFA500"   # orange
+            size = 28
+            font_size = 13
+        elif nid in search_high:
+            color = "#2EC4B6"   # teal
+            size = 28
+            font_size = 13
+        else:
+            color = "#324563"
+            size = 24
+            font_size = 12
+
+        a_nodes.append(
+            Node(
+                id=nid,
+                label=label,
+                size=size,
+                shape="dot",
+                color=color,
+                font={"size": font_size, "color": "#FFFFFF", "face": "Arial"},
+                borderWidth=0,
+                borderWidthSelected=3,
+            )
+        )
+
+    # Edge color logic: orange if touches role-highlight; else gold-ish if touches focus/search; else grey
+    a_edges = []
+    for (src, tgt) in visible_edges:
+        if src in role_high or tgt in role_high:
+            e_color = "#FFA500"  # orange
+            e_width = 1.2
+        elif src == focus_id or tgt == focus_id or src in search_high or tgt in search_high:
+            e_color = "#FF9F1C"  # gold highlight
+            e_width = 1.2
+        else:
+            e_color = "#8a8a8a"
+            e_width = 0.9
+        a_edges.append(
+            Edge(
+                source=src,
+                target=tgt,
+                type="CURVE_SMOOTH",
+                width=e_width,
+                color=e_color,
+                smooth={"type": "curvedCW", "roundness": 0.2},
+            )
+        )
+    return a_nodes, a_edges
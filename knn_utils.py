@@ -1,7 +1,9 @@
+import hashlib
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from sklearn.neighbors import NearestNeighbors
-from sentence_transformers import SentenceTransformer
+from encoder_utils import load_encoder
+from pq_utils import ProductQuantizer, subspaces_for
 from dataclasses import dataclass
 
 @dataclass
@@ -10,38 +12,157 @@ class SimilarNode:
     score: float
     label: str
 
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+
+def _fingerprint(nodes: List[Dict], embedding_model_name: str) -> Dict[str, str]:
+    h = hashlib.sha256()
+    for node in nodes:
+        h.update(f"{node['id']}\0{node.get('label', '')} {node.get('content', '')}\0".encode('utf-8'))
+    return {'model': embedding_model_name, 'data': h.hexdigest()}
+
 class GraphKNN:
-    def __init__(self, nodes: List[Dict], embedding_model_name: str = 'all-MiniLM-L6-v2'):
+    def __init__(self, nodes: List[Dict], embedding_model_name: str = DEFAULT_MODEL,
+                 node_embeddings: Optional[np.ndarray] = None, index: str = 'exact',
+                 pq_subspaces: int = 48, rescore: int = 0,
+                 pq: Optional[ProductQuantizer] = None, pq_codes: Optional[np.ndarray] = None):
         """
         Initialize the KNN model for graph nodes.
         
         Args:
             nodes: List of node dictionaries with at least 'id', 'label', and 'content' keys
             embedding_model_name: Name of the SentenceTransformer model to use
+                (backend per KG_ENCODER_BACKEND, see encoder_utils)
+            node_embeddings: Pre-computed embeddings (e.g. a shared-memory view) to use
+                instead of encoding the nodes
+            index: 'exact' (sklearn brute-force cosine) or 'pq' (product-quantised
+                codes, pq_subspaces bytes per node; see pq_utils)
+            pq_subspaces: PQ sub-vectors per embedding; lowered to the nearest
+                divisor of the embedding dimension if it does not divide it
+            rescore: with index='pq', re-rank this many PQ candidates by exact cosine.
+                Keeps node_embeddings; pass an mmap'd/shared array to keep them off-heap
+            pq, pq_codes: A trained quantizer and codes (e.g. from a snapshot)
         """
+        if index not in ('exact', 'pq'):
+            raise ValueError(f"Unknown index type: {index}")
         self.nodes = nodes
-        self.embedding_model = SentenceTransformer(embedding_model_name)
-        self.node_embeddings = None
+        self.embedding_model_name = embedding_model_name
+        self._embedding_model = None  # loaded on first encode
+        self.node_embeddings = node_embeddings
+        self._external_embeddings = node_embeddings is not None
+        self.index = index
+        self.pq_subspaces = pq_subspaces
+        self.rescore = rescore
+        self.pq = pq
+        self.pq_codes = pq_codes
         self.knn_model = None
         self._prepare_embeddings()
         
+    @classmethod
+    def _from_bundle(cls, meta: Dict[str, Any], arrays: Dict[str, np.ndarray], nodes: List[Dict],
+                     source: str, **kwargs) -> 'GraphKNN':
+        if meta['node_ids'] != [node['id'] for node in nodes]:
+            raise ValueError(f"{source} was built for a different node set/order")
+        expected = _fingerprint(nodes, kwargs.get('embedding_model_name', DEFAULT_MODEL))
+        if meta.get('knn_fingerprint') != expected:
+            raise ValueError(f"{source} GraphKNN fingerprint mismatch: {meta.get('knn_fingerprint')} != {expected}")
+        if 'knn_pq_codes' in arrays:
+            kwargs.setdefault('index', 'pq')
+        if kwargs.get('index', 'exact') == 'pq' and 'knn_pq_codes' in arrays:
+            kwargs.update(pq=ProductQuantizer(arrays['knn_pq_codebooks']), pq_codes=arrays['knn_pq_codes'].T)
+        elif 'knn_embeddings' not in arrays:
+            raise ValueError(f"{source} has no GraphKNN embeddings")
+        return cls(nodes, node_embeddings=arrays.get('knn_embeddings'), **kwargs)
+    
+    @classmethod
+    def from_shared(cls, name: str, nodes: List[Dict], **kwargs) -> 'GraphKNN':
+        """Attach to embeddings published with GraphSearcher.publish_shared(name, knn=...)."""
+        from bundle_utils import attach_shared, detach_shared
+        shm, meta, arrays = attach_shared(name)
+        try:
+            knn = cls._from_bundle(meta, arrays, nodes, f"Shared index '{name}'", **kwargs)
+        except Exception:
+            detach_shared(shm, arrays)
+            raise
+        knn._index_buffer = shm  # keeps the mapping alive
+        return knn
+    
+    @classmethod
+    def load(cls, path: str, nodes: List[Dict], **kwargs) -> 'GraphKNN':
+        """Memory-map embeddings/PQ codes from a GraphSearcher.save(path, knn=...) snapshot."""
+        from bundle_utils import load_bundle
+        mm, meta, arrays = load_bundle(path)
+        knn = cls._from_bundle(meta, arrays, nodes, f"Snapshot '{path}'", **kwargs)
+        knn._index_buffer = mm  # keeps the mapping alive
+        return knn
+    
+    def fingerprint(self) -> Dict[str, str]:
+        """Model name + hash of node ids and embedded texts; stored arrays are only valid for a match."""
+        return _fingerprint(self.nodes, self.embedding_model_name)
+    
+    def knn_arrays(self) -> Dict[str, np.ndarray]:
+        """Arrays to store alongside a GraphSearcher index (bundle_utils layout)."""
+        arrays = {}
+        if self.node_embeddings is not None:
+            arrays['knn_embeddings'] = self.node_embeddings
+        if self.pq is not None:
+            arrays['knn_pq_codebooks'] = self.pq.codebooks
+            arrays['knn_pq_codes'] = self.pq_codes.T  # (m, n): stays column-major for search once loaded
+        return arrays
+    
+    @property
+    def embedding_model(self):
+        if self._embedding_model is None:
+            self._embedding_model = load_encoder(self.embedding_model_name)
+        return self._embedding_model
+        
     def _prepare_embeddings(self):
-        """Generate embeddings for all nodes."""
-        # Extract node texts to embed (combine label and content)
-        node_texts = [f"{node.get('label', '')} {node.get('content', '')}" 
-                     for node in self.nodes]
+        """Generate embeddings for all nodes (unless they were provided)."""
+        have_codes = self.index == 'pq' and self.pq_codes is not None
+        if self.node_embeddings is None and not (have_codes and not self.rescore):
+            # Extract node texts to embed (combine label and content)
+            node_texts = [f"{node.get('label', '')} {node.get('content', '')}" 
+                         for node in self.nodes]
+            
+            # Generate embeddings
+            self.node_embeddings = self.embedding_model.encode(
+                node_texts, 
+                show_progress_bar=True,
+                convert_to_numpy=True
+            )
         
-        # Generate embeddings
-        self.node_embeddings = self.embedding_model.encode(
-            node_texts, 
-            show_progress_bar=True,
-            convert_to_numpy=True
-        )
+        if self.index == 'pq':
+            self._prepare_pq()
+            return
         
         # Initialize KNN model
         self.knn_model = NearestNeighbors(n_neighbors=5, metric='cosine')
         self.knn_model.fit(self.node_embeddings)
     
+    def _prepare_pq(self):
+        """Train PQ on unit vectors (inner product == cosine) unless codes were given."""
+        if self.pq is None or self.pq_codes is None:
+            unit = np.asarray(self.node_embeddings, dtype=np.float32)
+            unit = unit / np.maximum(np.linalg.norm(unit, axis=1, keepdims=True), 1e-12)
+            m = subspaces_for(unit.shape[1], self.pq_subspaces)
+            if m != self.pq_subspaces:
+                print(f"PQ: {self.pq_subspaces} sub-spaces do not divide dim {unit.shape[1]}; using {m}")
+            self.pq = ProductQuantizer.fit(unit, m=m)
+            self.pq_codes = self.pq.encode(unit)
+        # Raw vectors are only needed for exact re-scoring
+        if not self.rescore and not self._external_embeddings:
+            self.node_embeddings = None
+    
+    def _pq_candidates(self, query: np.ndarray, n: int):
+        """(rows, cosine scores) best first: PQ ranking, optionally re-scored exactly."""
+        q = query / max(float(np.linalg.norm(query)), 1e-12)
+        rows, scores = self.pq.search(self.pq_codes, q, max(n, self.rescore))
+        if self.rescore and self.node_embeddings is not None:
+            emb = np.asarray(self.node_embeddings[rows], dtype=np.float32)
+            scores = (emb @ q) / np.maximum(np.linalg.norm(emb, axis=1), 1e-12)
+            order = np.argsort(-scores, kind='stable')
+            rows, scores = rows[order], scores[order]
+        return rows[:n], scores[:n]
+    
     def find_similar_nodes(self, query_embedding: List[float], k: int = 3) -> List[SimilarNode]:
         """
         Find k most similar nodes to the query embedding.
@@ -53,14 +174,19 @@ class GraphKNN:
         Returns:
             List of SimilarNode objects
         """
-        if self.knn_model is None:
-            raise ValueError("KNN model not initialized. Call _prepare_embeddings() first.")
+        if self.index == 'pq':
+            rows, scores = self._pq_candidates(np.asarray(query_embedding, dtype=np.float32).ravel(),
+                                               min(k + 1, len(self.nodes)))
+            distances, indices = [1.0 - scores], [rows]
+        else:
+            if self.knn_model is None:
+                raise ValueError("KNN model not initialized. Call _prepare_embeddings() first.")
+                
+            # Reshape query embedding if needed
+            query_embedding = np.array(query_embedding).reshape(1, -1)
             
-        # Reshape query embedding if needed
-        query_embedding = np.array(query_embedding).reshape(1, -1)
-        
-        # Find k+1 neighbors (in case the query matches a node exactly)
-        distances, indices = self.knn_model.kneighbors(query_embedding, n_neighbors=min(k+1, len(self.nodes)))
+            # Find k+1 neighbors (in case the query matches a node exactly)
+            distances, indices = self.knn_model.kneighbors(query_embedding, n_neighbors=min(k+1, len(self.nodes)))
         
         similar_nodes = []
         for i, (dist, idx) in enumerate(zip(distances[0], indices[0])):
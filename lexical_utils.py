@@ -0,0 +1,252 @@
+# lexical_utils.py
+# Array-backed BM25 (same scoring as rank_bm25.BM25Okapi) whose state is a
+# handful of flat numpy arrays: easy to slice into shards, share between
+# processes and memory-map from a snapshot.
+import math
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+def _idf(doc_freq: np.ndarray, n: int, epsilon: float) -> np.ndarray:
+    """Same idf as BM25Okapi, including the epsilon floor for common terms."""
+    idf = np.array([math.log(n - f + 0.5) - math.log(f + 0.5) for f in doc_freq], dtype=np.float64)
+    if len(idf):
+        idf[idf < 0] = epsilon * (sum(idf.tolist()) / len(idf))
+    return idf
+
+def _csr_indptr(terms: np.ndarray, n_terms: int) -> np.ndarray:
+    indptr = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=n_terms), out=indptr[1:])
+    return indptr
+
+class BM25Index:
+    """
+    Term -> postings index. Postings for term t are
+    doc_ids[indptr[t]:indptr[t + 1]] (ascending) with term frequencies in
+    tfs[...]; scoring only touches the postings of the query terms.
+    """
+    ARRAY_FIELDS = ("indptr", "doc_ids", "tfs", "idf", "doc_len")
+
+    def __init__(self, vocab: Dict[str, int], indptr: np.ndarray, doc_ids: np.ndarray,
+                 tfs: np.ndarray, idf: np.ndarray, doc_len: np.ndarray, avgdl: float,
+                 k1: float = 1.5, b: float = 0.75):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.idf = idf
+        self.doc_len = doc_len
+        self.avgdl = float(avgdl)
+        self.k1 = k1
+        self.b = b
+        self.corpus_size = len(doc_len)
+
+    @classmethod
+    def build(cls, corpus: Sequence[List[str]], k1: float = 1.5, b: float = 0.75,
+              epsilon: float = 0.25) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_of: List[int] = []
+        counts: List[int] = []
+        doc_len = np.zeros(len(corpus), dtype=np.float32)
+        for d, doc in enumerate(corpus):
+            doc_len[d] = len(doc)
+            freqs: Dict[str, int] = {}
+            for w in doc:
+                freqs[w] = freqs.get(w, 0) + 1
+            for w, c in freqs.items():
+                t = vocab.setdefault(w, len(vocab))
+                term_ids.append(t)
+                doc_of.append(d)
+                counts.append(c)
+        term_arr = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_arr, kind="stable")  # stable keeps doc ids ascending per term
+        indptr = _csr_indptr(term_arr, len(vocab))
+        n = len(corpus)
+        avgdl = float(doc_len.sum()) / n if n else 0.0
+        return cls(vocab, indptr, np.asarray(doc_of, dtype=np.int32)[order],
+                   np.asarray(counts, dtype=np.float32)[order], _idf(np.diff(indptr), n, epsilon),
+                   doc_len, avgdl, k1, b)
+
+    def _term_contrib(self, t: int, docs: np.ndarray, tf: np.ndarray) -> np.ndarray:
+        # float64 arithmetic, as rank_bm25 does on Python ints
+        dl = self.doc_len[docs].astype(np.float64)
+        tf = tf.astype(np.float64)
+        return self.idf[t] * (tf * (self.k1 + 1) /
+                              (tf + self.k1 * (1 - self.b + self.b * dl / self.avgdl)))
+
+    def get_scores(self, query: Sequence[str]) -> np.ndarray:
+        score = np.zeros(self.corpus_size)
+        for q in query:
+            t = self.vocab.get(q)
+            if t is None:
+                continue
+            lo, hi = self.indptr[t], self.indptr[t + 1]
+            docs = self.doc_ids[lo:hi]
+            score[docs] += self._term_contrib(t, docs, self.tfs[lo:hi])
+        return score
+
+    def get_batch_scores(self, query: Sequence[str], doc_ids: Sequence[int]) -> np.ndarray:
+        """Scores for a subset of rows, via binary search into each term's postings."""
+        rows = np.asarray(doc_ids, dtype=np.int64)
+        score = np.zeros(len(rows))
+        for q in query:
+            t = self.vocab.get(q)
+            if t is None:
+                continue
+            lo, hi = self.indptr[t], self.indptr[t + 1]
+            postings = self.doc_ids[lo:hi]
+            pos = np.searchsorted(postings, rows)
+            found = pos < len(postings)
+            found[found] = postings[pos[found]] == rows[found]
+            if found.any():
+                score[found] += self._term_contrib(t, rows[found], self.tfs[lo:hi][pos[found]])
+        return score
+
+    def shard(self, lo: int, hi: int) -> "BM25Index":
+        """Rows [lo, hi) renumbered from 0, keeping the global idf / avgdl."""
+        term_of = np.repeat(np.arange(len(self.vocab)), np.diff(self.indptr))
+        keep = (self.doc_ids >= lo) & (self.doc_ids < hi)
+        indptr = np.zeros_like(self.indptr)
+        np.cumsum(np.bincount(term_of[keep], minlength=len(self.vocab)), out=indptr[1:])
+        return BM25Index(self.vocab, indptr, (self.doc_ids[keep] - lo).astype(np.int32),
+                         self.tfs[keep], self.idf, self.doc_len[lo:hi], self.avgdl, self.k1, self.b)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in self.ARRAY_FIELDS}
+
+    def params(self) -> Dict[str, float]:
+        return {"avgdl": self.avgdl, "k1": self.k1, "b": self.b}
+
+    @classmethod
+    def from_arrays(cls, vocab_terms: Sequence[str], arrays: Dict[str, np.ndarray],
+                    params: Dict[str, float]) -> "BM25Index":
+        vocab = {w: i for i, w in enumerate(vocab_terms)}
+        return cls(vocab, arrays["indptr"], arrays["doc_ids"], arrays["tfs"], arrays["idf"],
+                   arrays["doc_len"], params["avgdl"], params.get("k1", 1.5), params.get("b", 0.75))
+
+    def vocab_terms(self) -> List[str]:
+        terms = [""] * len(self.vocab)
+        for w, i in self.vocab.items():
+            terms[i] = w
+        return terms
+
+class PositionalIndex:
+    """
+    Term -> (doc, position) postings, sharing the BM25 vocabulary ids.
+    Entries for term t are keys[indptr[t]:indptr[t + 1]], each doc << 32 | pos,
+    ascending, so a phrase is a merge of its terms' postings with the i-th
+    term shifted back i positions; nothing else is touched.
+    """
+    ARRAY_FIELDS = ("indptr", "keys")
+
+    def __init__(self, vocab: Dict[str, int], indptr: np.ndarray, keys: np.ndarray):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.keys = keys
+
+    @classmethod
+    def build(cls, corpus: Sequence[List[str]], vocab: Dict[str, int]) -> "PositionalIndex":
+        terms = np.fromiter((vocab[w] for doc in corpus for w in doc), dtype=np.int64,
+                            count=sum(len(doc) for doc in corpus))
+        keys = np.concatenate([(np.int64(d) << 32) + np.arange(len(doc), dtype=np.int64)
+                               for d, doc in enumerate(corpus)] or [np.zeros(0, dtype=np.int64)])
+        order = np.argsort(terms, kind="stable")  # keys are already ascending within a term
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=indptr[1:])
+        return cls(vocab, indptr, keys[order])
+
+    def phrase_docs(self, phrase: Sequence[str]) -> np.ndarray:
+        """Ascending doc ids containing the tokens consecutively, in order."""
+        postings = []
+        for offset, w in enumerate(phrase):
+            t = self.vocab.get(w)
+            if t is None:
+                return np.zeros(0, dtype=np.int64)
+            postings.append((self.indptr[t + 1] - self.indptr[t], offset, t))
+        if not postings:
+            return np.zeros(0, dtype=np.int64)
+        postings.sort()  # rarest term first keeps the candidate set small
+        _, offset, t = postings[0]
+        starts = self.keys[self.indptr[t]:self.indptr[t + 1]] - offset
+        for _, offset, t in postings[1:]:
+            if not len(starts):
+                break
+            other = self.keys[self.indptr[t]:self.indptr[t + 1]] - offset
+            pos = np.minimum(np.searchsorted(other, starts), len(other) - 1)
+            starts = starts[other[pos] == starts]
+        return np.unique(starts >> 32)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in self.ARRAY_FIELDS}
+
+    @classmethod
+    def from_arrays(cls, vocab: Dict[str, int], arrays: Dict[str, np.ndarray]) -> "PositionalIndex":
+        return cls(vocab, arrays["indptr"], arrays["keys"])
+
+def update_lexical(bm25: BM25Index, positions: PositionalIndex, source_rows: Sequence[int],
+                   docs: Dict[int, List[str]], epsilon: float = 0.25) -> Tuple[BM25Index, PositionalIndex]:
+    """
+    BM25 + positional index of an edited corpus, from the previous one.
+    New row i is previous row source_rows[i], or -1 for a row whose tokens
+    are in docs[i]. Only those rows are counted in Python; the kept postings
+    are renumbered and re-sorted with numpy, and terms no row uses any more
+    are dropped. Scores match a fresh build; the inputs are left untouched.
+    """
+    source = np.asarray(source_rows, dtype=np.int64)
+    n = len(source)
+    kept = np.flatnonzero(source >= 0)
+    old_to_new = np.full(bm25.corpus_size, -1, dtype=np.int64)
+    old_to_new[source[kept]] = kept
+    vocab = dict(bm25.vocab)
+
+    # Postings of the kept rows, renumbered
+    doc = old_to_new[bm25.doc_ids]
+    keep = doc >= 0
+    terms = [np.repeat(np.arange(len(bm25.vocab)), np.diff(bm25.indptr))[keep]]
+    doc_ids, tfs = [doc[keep]], [bm25.tfs[keep]]
+    key_doc = old_to_new[positions.keys >> 32]
+    keep = key_doc >= 0
+    key_terms = [np.repeat(np.arange(len(bm25.vocab)), np.diff(positions.indptr))[keep]]
+    keys = [(key_doc[keep] << 32) | (positions.keys[keep] & 0xFFFFFFFF)]
+    doc_len = np.zeros(n, dtype=np.float32)
+    doc_len[kept] = bm25.doc_len[source[kept]]
+
+    # New / edited rows
+    add_t: List[int] = []
+    add_d: List[int] = []
+    add_tf: List[int] = []
+    add_kt: List[int] = []
+    add_k: List[int] = []
+    for d, tokens in docs.items():
+        doc_len[d] = len(tokens)
+        freqs: Dict[int, int] = {}
+        for pos, w in enumerate(tokens):
+            t = vocab.setdefault(w, len(vocab))
+            freqs[t] = freqs.get(t, 0) + 1
+            add_kt.append(t)
+            add_k.append((d << 32) + pos)
+        add_t.extend(freqs)
+        add_d.extend([d] * len(freqs))
+        add_tf.extend(freqs.values())
+    terms.append(np.asarray(add_t, dtype=np.int64))
+    doc_ids.append(np.asarray(add_d, dtype=np.int64))
+    tfs.append(np.asarray(add_tf, dtype=np.float32))
+    key_terms.append(np.asarray(add_kt, dtype=np.int64))
+    keys.append(np.asarray(add_k, dtype=np.int64))
+    terms, doc_ids, tfs = np.concatenate(terms), np.concatenate(doc_ids), np.concatenate(tfs)
+    key_terms, keys = np.concatenate(key_terms), np.concatenate(keys)
+
+    # Drop terms with no postings left, renumber the rest densely
+    live = np.bincount(terms, minlength=len(vocab)) > 0
+    remap = np.cumsum(live) - 1
+    vocab = {w: int(remap[t]) for w, t in vocab.items() if live[t]}
+    terms, key_terms = remap[terms], remap[key_terms]
+
+    order = np.lexsort((doc_ids, terms))
+    indptr = _csr_indptr(terms, len(vocab))
+    avgdl = float(doc_len.sum()) / n if n else 0.0
+    new_bm25 = BM25Index(vocab, indptr, doc_ids[order].astype(np.int32), tfs[order],
+                         _idf(np.diff(indptr), n, epsilon), doc_len, avgdl, bm25.k1, bm25.b)
+    order = np.lexsort((keys, key_terms))
+    return new_bm25, PositionalIndex(vocab, _csr_indptr(key_terms, len(vocab)), keys[order])
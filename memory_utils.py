@@ -0,0 +1,265 @@
+# memory_utils.py
+# Per-component memory accounting for the search stack, plus a tracemalloc
+# diff between index build and steady-state querying.
+#   python memory_utils.py --synthetic 10000 --queries 50 --json mem.json
+import argparse
+import gc
+import json
+import os
+import sys
+import threading
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+import scipy.sparse as sp
+
+@dataclass
+class ComponentSize:
+    component: str
+    bytes: int
+    detail: str = ""
+
+@dataclass
+class MemoryReport:
+    components: List[ComponentSize] = field(default_factory=list)
+    rss_bytes: Optional[int] = None
+    allocation_diff: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(c.bytes for c in self.components)
+
+    def add(self, component: str, nbytes: int, detail: str = ""):
+        self.components.append(ComponentSize(component, int(nbytes), detail))
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = asdict(self)
+        out["total_bytes"] = self.total_bytes
+        return out
+
+    def format(self) -> str:
+        lines = [f"{'component':<40} {'MiB':>10}  detail"]
+        for c in sorted(self.components, key=lambda c: c.bytes, reverse=True):
+            lines.append(f"{c.component:<40} {c.bytes / 2**20:>10.2f}  {c.detail}")
+        lines.append(f"{'total (accounted)':<40} {self.total_bytes / 2**20:>10.2f}")
+        if self.rss_bytes is not None:
+            lines.append(f"{'process RSS':<40} {self.rss_bytes / 2**20:>10.2f}")
+        return "\n".join(lines)
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size (Linux /proc), else peak RSS from getrusage."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return None
+
+def module_bytes(module: Any) -> int:
+    """Parameter + buffer bytes of a torch nn.Module (e.g. a SentenceTransformer)."""
+    if hasattr(module, "nbytes"):  # encoder_utils.OnnxEncoder: model file size
+        return int(module.nbytes)
+    total = 0
+    for t in list(module.parameters()) + list(module.buffers()):
+        total += t.numel() * t.element_size()
+    return total
+
+def deep_sizeof(obj: Any, seen: Optional[Set[int]] = None) -> int:
+    """
+    Recursive size of containers, strings, numpy arrays and scipy sparse
+    matrices. Objects already in `seen` count zero, so passing one set across
+    components avoids double-counting shared arrays.
+    """
+    if seen is None:
+        seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        if isinstance(o, np.ndarray):
+            # Views point at their base's buffer; count the buffer once
+            base = o
+            while isinstance(base.base, np.ndarray):
+                base = base.base
+            if base is not o:
+                total += sys.getsizeof(o) - (o.nbytes if o.flags.owndata else 0)
+                stack.append(base)
+            else:
+                total += sys.getsizeof(o) if o.flags.owndata else sys.getsizeof(o) + o.nbytes
+            continue
+        if sp.issparse(o):
+            for attr in ("data", "indices", "indptr", "row", "col", "offsets"):
+                arr = getattr(o, attr, None)
+                if isinstance(arr, np.ndarray):
+                    stack.append(arr)
+            continue
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif hasattr(o, "__dict__") and not isinstance(o, type):
+            stack.append(o.__dict__)
+    return total
+
+def add_searcher_components(report: MemoryReport, searcher: Any, seen: Set[int], prefix: str = "GraphSearcher"):
+    model = getattr(searcher, "_model", None)  # only if already loaded; shared ones (in seen) count zero
+    if model is not None and id(model) not in seen:
+        seen.add(id(model))
+        report.add(f"{prefix}.model", module_bytes(model), type(model).__name__)
+    emb = searcher.embeddings
+    report.add(f"{prefix}.embeddings", deep_sizeof(emb, seen), f"{emb.shape} {emb.dtype}")
+    for attr in ("_embedding_norms", "node_texts", "facets", "_adjacency",
+                 "id_to_row", "_parent_row", "_order", "_tin", "_tout",
+                 "positions", "_spell", "_suggest_index"):
+        if hasattr(searcher, attr):
+            report.add(f"{prefix}.{attr}", deep_sizeof(getattr(searcher, attr), seen))
+    bm25 = getattr(searcher, "bm25", None)
+    if bm25 is not None:
+        report.add(f"{prefix}.bm25", deep_sizeof(bm25, seen), "postings + idf + doc_len")
+    reranker = getattr(searcher, "_reranker", None)
+    if reranker is not None and id(reranker) not in seen:
+        seen.add(id(reranker))
+        inner = getattr(reranker, "model", reranker)
+        report.add(f"{prefix}.reranker", module_bytes(inner), type(reranker).__name__)
+
+def add_knn_components(report: MemoryReport, knn: Any, seen: Set[int], prefix: str = "GraphKNN"):
+    model = getattr(knn, "_embedding_model", None)
+    if model is not None:
+        seen.add(id(model))
+        report.add(f"{prefix}.embedding_model", module_bytes(model), type(model).__name__)
+    if knn.node_embeddings is not None:
+        report.add(f"{prefix}.node_embeddings", deep_sizeof(knn.node_embeddings, seen),
+                   f"{knn.node_embeddings.shape} {knn.node_embeddings.dtype}")
+    if getattr(knn, "pq", None) is not None:
+        codes = knn.pq_codes
+        report.add(f"{prefix}.pq_codes", deep_sizeof(codes, seen),
+                   f"{codes.shape} {codes.dtype}, {codes.shape[1] * codes.itemsize} B/node")
+        report.add(f"{prefix}.pq_codebooks", deep_sizeof(knn.pq.codebooks, seen), str(knn.pq.codebooks.shape))
+    if knn.knn_model is not None:
+        fit_x = getattr(knn.knn_model, "_fit_X", None)
+        shared = fit_x is knn.node_embeddings
+        report.add(f"{prefix}.knn_model", deep_sizeof(knn.knn_model, seen),
+                   "fit data shared with node_embeddings" if shared else "own copy of fit data")
+
+def add_topology_components(report: MemoryReport, seen: Set[int], **maps: Any):
+    for name, value in maps.items():
+        report.add(name, deep_sizeof(value, seen))
+
+class SessionSizeTracker:
+    """Latest session_state size per session id, for an average across live sessions."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sizes: Dict[str, int] = {}
+
+    def record(self, session_id: str, state: Any):
+        size = deep_sizeof({k: state[k] for k in list(state.keys())})
+        with self._lock:
+            self._sizes[session_id] = size
+        return size
+
+    def forget(self, live_session_ids: Set[str]):
+        with self._lock:
+            for sid in list(self._sizes):
+                if sid not in live_session_ids:
+                    del self._sizes[sid]
+
+    def average(self) -> Optional[float]:
+        with self._lock:
+            return (sum(self._sizes.values()) / len(self._sizes)) if self._sizes else None
+
+    def __len__(self):
+        return len(self._sizes)
+
+def allocation_diff(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot,
+                    limit: int = 15) -> List[Dict[str, Any]]:
+    """Top allocation sites that grew between two tracemalloc snapshots."""
+    rows = []
+    for stat in after.compare_to(before, "lineno")[:limit]:
+        frame = stat.traceback[0]
+        rows.append({
+            "site": f"{os.path.relpath(frame.filename)}:{frame.lineno}",
+            "size_diff_bytes": stat.size_diff,
+            "size_bytes": stat.size,
+            "count_diff": stat.count_diff,
+        })
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory accounting for the search stack")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="use a synthetic graph of this many nodes instead of data.py")
+    parser.add_argument("--queries", type=int, default=50, help="queries to run for the steady-state snapshot")
+    parser.add_argument("--no-knn", action="store_true", help="skip GraphKNN")
+    parser.add_argument("--json", default=None, help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        from bench.synthetic import generate_graph, sample_queries
+        nodes, edges = generate_graph(args.synthetic)
+        queries = sample_queries(nodes, args.queries)
+    else:
+        from data import NODES as nodes, EDGES as edges
+        queries = ["what is hcm", "how to implement hcm", "how do i use hcm", "1.8 version"]
+        queries = (queries * (args.queries // len(queries) + 1))[:args.queries]
+
+    from search_utils import GraphSearcher
+    from graph_utils import build_index
+
+    tracemalloc.start(5)
+    gc.collect()
+    baseline = tracemalloc.take_snapshot()
+
+    searcher = GraphSearcher(nodes=nodes, edges=edges)
+    knn = None
+    if not args.no_knn:
+        from knn_utils import GraphKNN
+        knn = GraphKNN(nodes)
+    node_map, children_map, parents_map, roots = build_index(nodes, edges)
+    gc.collect()
+    built = tracemalloc.take_snapshot()
+
+    for q in queries:
+        searcher.search(q)
+        if knn is not None:
+            knn.find_similar_nodes(knn.get_embedding(q), k=3)
+    gc.collect()
+    steady = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    report = MemoryReport(rss_bytes=rss_bytes())
+    seen: Set[int] = set()
+    add_searcher_components(report, searcher, seen)
+    if knn is not None:
+        add_knn_components(report, knn, seen)
+    add_topology_components(report, seen, NODE_MAP=node_map, CHILDREN_MAP=children_map,
+                            PARENTS_MAP=parents_map, ROOT_IDS=roots)
+    report.allocation_diff = {
+        "index_build": allocation_diff(baseline, built),
+        "steady_state": allocation_diff(built, steady),
+    }
+
+    print(report.format())
+    for phase, rows in report.allocation_diff.items():
+        print(f"\nTop allocation growth ({phase}):")
+        for r in rows[:10]:
+            print(f"  {r['size_diff_bytes'] / 2**20:>9.2f} MiB  {r['count_diff']:>8} blocks  {r['site']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report.to_dict(), f, indent=2)
+
+if __name__ == "__main__":
+    main()
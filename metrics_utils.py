@@ -0,0 +1,160 @@
+# metrics_utils.py
+# In-process histogram/counter registry for search timings, exported in
+# Prometheus text format. Disabled unless KG_METRICS=1 or KG_METRICS_PORT is set;
+# when disabled every hook is a single attribute check.
+import os
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Millisecond buckets: sub-ms tokenization up to multi-second encodes
+DEFAULT_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside its bucket."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if seen + c >= rank and c > 0:
+                lo = self.buckets[i - 1] if i > 0 else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = False, prefix: str = "kg"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, **labels: str):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(value)
+
+    def inc(self, name: str, amount: float = 1.0, **labels: str):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def summary(self) -> List[Dict[str, object]]:
+        """Rows of {metric, labels, count, mean, p50, p99} for the diagnostics panel."""
+        rows = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                for key, h in sorted(series.items()):
+                    rows.append({
+                        "metric": name,
+                        "labels": ",".join(f"{k}={v}" for k, v in key),
+                        "count": h.count,
+                        "mean_ms": h.sum / h.count if h.count else None,
+                        "p50_ms": h.quantile(0.5),
+                        "p99_ms": h.quantile(0.99),
+                    })
+            for name, series in sorted(self._counters.items()):
+                for key, value in sorted(series.items()):
+                    rows.append({"metric": name, "labels": ",".join(f"{k}={v}" for k, v in key),
+                                 "count": value})
+        return rows
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        def fmt_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            items = key + extra
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                full = f"{self.prefix}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                for key, h in sorted(series.items()):
+                    cumulative = 0
+                    for bound, c in zip(h.buckets, h.counts):
+                        cumulative += c
+                        lines.append(f"{full}_bucket{fmt_labels(key, (('le', repr(float(bound))),))} {cumulative}")
+                    lines.append(f"{full}_bucket{fmt_labels(key, (('le', '+Inf'),))} {h.count}")
+                    lines.append(f"{full}_sum{fmt_labels(key)} {h.sum}")
+                    lines.append(f"{full}_count{fmt_labels(key)} {h.count}")
+            for name, series in sorted(self._counters.items()):
+                full = f"{self.prefix}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{full}{fmt_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry(
+    enabled=os.getenv("KG_METRICS") == "1" or bool(os.getenv("KG_METRICS_PORT"))
+)
+REGISTRY.describe("search_stage_ms", "GraphSearcher.search per-stage duration in milliseconds.")
+REGISTRY.describe("index_build_stage_ms", "GraphSearcher index build per-stage duration in milliseconds.")
+REGISTRY.describe("search_queries_total", "Queries handled by GraphSearcher.search.")
+REGISTRY.describe("search_best_match_total", "Queries whose top hit scored at or above t_high.")
+REGISTRY.describe("search_degraded_total", "Queries whose deadline skipped or cut short a stage (dense, smoothing, rerank).")
+REGISTRY.describe("rag_fallthrough_total", "Queries that fell through to the RAG API.")
+
+def start_metrics_server(port: int, registry: MetricsRegistry = REGISTRY,
+                         host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve GET /metrics from a daemon thread; returns the server."""
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # keep Streamlit logs quiet
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="kg-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,113 @@
+# pq_utils.py
+# Product quantisation for compressed nearest-neighbour search over unit
+# vectors. Each vector is split into `m` sub-vectors and every sub-vector is
+# replaced by the id of its nearest centroid (uint8 for 256 centroids), so a
+# 384-d float32 embedding (1536 bytes) becomes m bytes. Queries are scored with
+# asymmetric distance tables: the query stays exact, and the inner product with
+# every code is a sum of m table lookups.
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+def _kmeans(x: np.ndarray, k: int, iters: int, rng: np.random.Generator) -> np.ndarray:
+    """Plain Lloyd's k-means (squared L2), initialised from distinct sample rows."""
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    x_sq = (x * x).sum(axis=1, keepdims=True)
+    for _ in range(iters):
+        dist = x_sq - 2.0 * x @ centroids.T + (centroids * centroids).sum(axis=1)
+        assign = dist.argmin(axis=1)
+        sums = np.stack([np.bincount(assign, weights=x[:, col], minlength=k) for col in range(x.shape[1])], axis=1)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():  # re-seed empty clusters from random points
+            centroids[empty] = x[rng.choice(len(x), size=int(empty.sum()))]
+    return centroids
+
+def subspaces_for(dim: int, m: int) -> int:
+    """The largest sub-space count <= m that divides dim (m itself when it does)."""
+    if m < 1:
+        raise ValueError(f"m must be at least 1, got {m}")
+    return max(s for s in range(1, min(m, dim) + 1) if dim % s == 0)
+
+@dataclass
+class ProductQuantizer:
+    codebooks: np.ndarray  # (m, ksub, dsub) float32
+
+    @property
+    def m(self) -> int:
+        return self.codebooks.shape[0]
+
+    @property
+    def ksub(self) -> int:
+        return self.codebooks.shape[1]
+
+    @property
+    def dim(self) -> int:
+        return self.codebooks.shape[0] * self.codebooks.shape[2]
+
+    @classmethod
+    def fit(cls, x: np.ndarray, m: int = 48, ksub: int = 256, iters: int = 15,
+            max_train: int = 16384, seed: int = 0) -> "ProductQuantizer":
+        """Train one k-means codebook per sub-space on a sample of x (64 points per centroid)."""
+        x = np.asarray(x, dtype=np.float32)
+        n, dim = x.shape
+        if m < 1 or dim % m:
+            raise ValueError(f"dim {dim} is not divisible by m={m}; "
+                             f"use a divisor of {dim}, e.g. m={subspaces_for(dim, max(m, 1))}")
+        rng = np.random.default_rng(seed)
+        if n > max_train:
+            x = x[rng.choice(n, size=max_train, replace=False)]
+        ksub = min(ksub, len(x))
+        dsub = dim // m
+        codebooks = np.stack([_kmeans(x[:, j * dsub:(j + 1) * dsub], ksub, iters, rng) for j in range(m)])
+        return cls(codebooks.astype(np.float32))
+
+    def encode(self, x: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        """
+        (n, m) codes, uint8 when ksub <= 256. Column-major, so search() reads
+        each sub-space's codes contiguously.
+        """
+        x = np.asarray(x, dtype=np.float32)
+        dsub = self.codebooks.shape[2]
+        codes = np.empty((len(x), self.m), dtype=np.uint8 if self.ksub <= 256 else np.uint16, order="F")
+        c_sq = (self.codebooks * self.codebooks).sum(axis=2)  # (m, ksub)
+        for lo in range(0, len(x), chunk):
+            block = x[lo:lo + chunk]
+            for j in range(self.m):
+                sub = block[:, j * dsub:(j + 1) * dsub]
+                codes[lo:lo + len(block), j] = (c_sq[j] - 2.0 * sub @ self.codebooks[j].T).argmin(axis=1)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.codebooks[np.arange(self.m), codes].reshape(len(codes), self.dim)
+
+    def ip_tables(self, query: np.ndarray) -> np.ndarray:
+        """(m, ksub) inner products of each query sub-vector with each centroid."""
+        q = np.asarray(query, dtype=np.float32).reshape(self.m, -1)
+        return np.einsum("md,mkd->mk", q, self.codebooks)
+
+    def search(self, codes: np.ndarray, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows by approximate inner product: (rows, scores), best first."""
+        tables = self.ip_tables(query)
+        scores = np.zeros(len(codes), dtype=np.float32)
+        for j in range(self.m):  # one table lookup per sub-space
+            scores += tables[j].take(codes[:, j])
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return top, scores[top]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codebooks.nbytes
+
+def recall_at_k(exact: np.ndarray, approx: np.ndarray, k: Optional[int] = None) -> float:
+    """Mean fraction of each row's exact top-k ids found in its approximate top-k."""
+    exact, approx = np.atleast_2d(exact), np.atleast_2d(approx)
+    k = k or exact.shape[1]
+    hits = [len(set(e[:k].tolist()) & set(a[:k].tolist())) / max(len(e[:k]), 1) for e, a in zip(exact, approx)]
+    return float(np.mean(hits)) if hits else 0.0
@@ -0,0 +1,115 @@
+# profiling_utils.py
+# Opt-in profiling of a single call (one Streamlit script run in app.py).
+# "deterministic" uses cProfile; "sampling" uses pyinstrument when installed.
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+@dataclass
+class ProfileReport:
+    label: str
+    mode: str                      # deterministic | sampling
+    wall_ms: float
+    path: str                      # main artefact on disk (.prof / .html)
+    text_path: str                 # human-readable call tree / stats
+    top_functions: List[Dict[str, Any]] = field(default_factory=list)
+    tree_text: str = ""            # sampling mode: pyinstrument call tree
+
+def _safe_name(label: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", label)[:80] or "run"
+
+def _top_functions(stats: pstats.Stats, limit: int) -> List[Dict[str, Any]]:
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():  # type: ignore[attr-defined]
+        rows.append({
+            "function": f"{func} ({os.path.basename(filename)}:{line})",
+            "calls": nc,
+            "self_ms": tt * 1000.0,
+            "cumulative_ms": ct * 1000.0,
+        })
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+def prune_profiles(out_dir: str, max_runs: int):
+    """Delete all but the newest `max_runs` runs (files sharing a timestamped stem) in `out_dir`."""
+    stems: Dict[str, List[str]] = {}
+    for name in os.listdir(out_dir):
+        stems.setdefault(os.path.splitext(name)[0], []).append(name)
+    for stem in sorted(stems)[:-max_runs] if max_runs > 0 else sorted(stems):
+        for name in stems[stem]:
+            try:
+                os.remove(os.path.join(out_dir, name))
+            except OSError:
+                pass
+
+def profile_call(fn: Callable[[], Any], label: str, out_dir: str = "profiles",
+                 mode: str = "deterministic", top: int = 25,
+                 on_report: Optional[Callable[[ProfileReport], None]] = None,
+                 max_runs: Optional[int] = None):
+    """
+    Run `fn()` under a profiler and write the output to `out_dir`, keeping
+    only the newest `max_runs` runs there if set.
+    Returns (fn's result, ProfileReport). `on_report` is called with the report
+    before any exception from `fn` (including Streamlit's rerun/stop control
+    flow) is re-raised, so the profile is never lost.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.join(out_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{_safe_name(label)}")
+
+    sampler = None
+    if mode == "sampling":
+        try:
+            from pyinstrument import Profiler
+            sampler = Profiler(interval=0.001)
+        except ImportError:
+            mode = "deterministic"  # pyinstrument not installed; fall back to cProfile
+    profiler = cProfile.Profile() if sampler is None else None
+
+    started = time.perf_counter()
+    result, error = None, None
+    if sampler is not None:
+        sampler.start()
+    else:
+        profiler.enable()
+    try:
+        result = fn()
+    except BaseException as e:  # noqa: B036 - re-raised below
+        error = e
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        else:
+            profiler.disable()
+    wall_ms = (time.perf_counter() - started) * 1000.0
+
+    if sampler is not None:
+        tree = sampler.output_text(unicode=True, color=False)
+        with open(stem + ".html", "w") as f:
+            f.write(sampler.output_html())
+        with open(stem + ".txt", "w") as f:
+            f.write(tree)
+        report = ProfileReport(label, mode, wall_ms, stem + ".html", stem + ".txt", tree_text=tree)
+    else:
+        profiler.dump_stats(stem + ".prof")
+        buf = io.StringIO()
+        stats = pstats.Stats(profiler, stream=buf).sort_stats("cumulative")
+        stats.print_stats(60)
+        stats.print_callees(30)
+        with open(stem + ".txt", "w") as f:
+            f.write(buf.getvalue())
+        report = ProfileReport(label, mode, wall_ms, stem + ".prof", stem + ".txt",
+                               top_functions=_top_functions(stats, top))
+
+    if max_runs is not None:
+        prune_profiles(out_dir, max_runs)
+    if on_report is not None:
+        on_report(report)
+    if error is not None:
+        raise error
+    return result, report
@@ -0,0 +1,166 @@
+# querylog_utils.py
+# Append-only query log (JSON lines, size-rotated) and the offline job that
+# turns it into precomputed answers: the top-N most frequent normalised
+# queries are searched once, saved with the index fingerprint, and pinned in
+# the searcher's result cache at startup, so the head of the query
+# distribution is served without the model from the first request.
+#   python querylog_utils.py top --log queries.jsonl [--top 20]
+#   python querylog_utils.py precompute --log queries.jsonl --out precomputed.json [--top 200] [--index index.kgidx]
+import argparse
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, Iterator, List, Optional
+
+class QueryLog:
+    """Thread-safe JSON-lines writer; rotates to path.1 .. path.<backups> at max_bytes."""
+
+    def __init__(self, path: str, max_bytes: int = 10 * 2**20, backups: int = 5):
+        self.path = path
+        self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._lock = threading.Lock()
+
+    def record(self, query: str, latency_ms: Optional[float] = None, top_ids: Optional[List[str]] = None,
+               rag_fallthrough: Optional[str] = None, **extra: Any):
+        """One line per event; rag_fallthrough is the reason ('no_graph_match', ...) or None."""
+        entry = {"ts": round(time.time(), 3), "query": query, "latency_ms": latency_ms,
+                 "top_ids": top_ids or [], "rag_fallthrough": rag_fallthrough, **extra}
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            self._handler.emit(logging.makeLogRecord({"msg": line}))
+
+    def close(self):
+        self._handler.close()
+
+def read_log(path: str) -> Iterator[Dict[str, Any]]:
+    """Entries from the live file and its rotated backups, oldest file first; bad lines are skipped."""
+    backups = sorted((int(p.rsplit(".", 1)[1]), p) for p in glob.glob(f"{glob.escape(path)}.*")
+                     if p.rsplit(".", 1)[1].isdigit())
+    for name in [p for _, p in reversed(backups)] + [path]:  # path.N is the oldest
+        if not os.path.exists(name):
+            continue
+        with open(name, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+def top_queries(searcher: Any, entries: Iterator[Dict[str, Any]], n: int = 200) -> List[Dict[str, Any]]:
+    """
+    Most frequent searches grouped by the searcher's result-cache key
+    (acronyms expanded, tokenised, phrases, same filters/scope); the most
+    common raw spelling of each group is kept as its representative.
+    """
+    counts: Counter = Counter()
+    spellings: Dict[Any, Counter] = {}
+    params: Dict[Any, tuple] = {}
+    for e in entries:
+        if e.get("event", "search") != "search" or not e.get("query"):
+            continue
+        key = searcher._cache_key(e["query"], e.get("filters"), e.get("within"))
+        counts[key] += 1
+        spellings.setdefault(key, Counter())[e["query"]] += 1
+        params.setdefault(key, (e.get("filters"), e.get("within")))
+    return [{"query": spellings[key].most_common(1)[0][0], "filters": params[key][0],
+             "within": params[key][1], "count": count}
+            for key, count in counts.most_common(n)]
+
+def _config(searcher: Any) -> Dict[str, str]:
+    return {k: str(v) for k, v in searcher._config().items()}
+
+def precompute(searcher: Any, queries: List[Dict[str, Any]], path: str):
+    """Search each query once and save (query, params, response) with the index fingerprint."""
+    entries = []
+    t0 = time.perf_counter()
+    for q in queries:
+        response = searcher.search(q["query"], filters=q["filters"], within=q["within"])
+        if response.degraded:
+            continue
+        entries.append({**q, "rerank": True, "response": {
+            "best_match": response.best_match.node_id if response.best_match else None,
+            "results": [[r.node_id, r.score, r.rerank_score] for r in response.results],
+            "stages": response.stages,
+        }})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": searcher.fingerprint(), "config": _config(searcher),
+                   "created_at": time.time(), "entries": entries}, f)
+    print(f"Precomputed {len(entries)} queries in {time.perf_counter() - t0:.1f}s -> {path}")
+
+def load_precomputed(searcher: Any, path: str) -> int:
+    """Pin saved answers into searcher.result_cache; 0 if the file is missing or stale."""
+    from search_utils import SearchResponse, SearchResult
+
+    if not path or not os.path.exists(path) or getattr(searcher, "cache_size", 0) <= 0:
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        table = json.load(f)
+    if table.get("fingerprint") != searcher.fingerprint():
+        print(f"Ignoring stale precomputed answers {path}: fingerprint mismatch")
+        return 0
+    if table.get("config") != _config(searcher):
+        print(f"Ignoring precomputed answers {path}: built with other search settings")
+        return 0
+    loaded = 0
+    for e in table["entries"]:
+        rows = [searcher.id_to_row.get(nid) for nid, _, _ in e["response"]["results"]]
+        if any(row is None for row in rows):
+            continue
+        results = [SearchResult(node_id=nid, score=score, node_data=searcher.nodes[row], rerank_score=rerank)
+                   for (nid, score, rerank), row in zip(e["response"]["results"], rows)]
+        best = e["response"]["best_match"]
+        response = SearchResponse(
+            best_match=next((r for r in results if r.node_id == best), None) if best else None,
+            results=results, stages=e["response"]["stages"], timings_ms={},
+        )
+        # The key search() and ShardedSearcher.search look up
+        key = searcher._cache_key(e["query"], e["filters"], e["within"], rerank=e.get("rerank", True))
+        searcher.result_cache.pin(key, response)
+        loaded += 1
+    print(f"Loaded {loaded} precomputed answers from {path}")
+    return loaded
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query log statistics and precomputed answers")
+    parser.add_argument("command", choices=["top", "precompute"])
+    parser.add_argument("--log", required=True)
+    parser.add_argument("--top", type=int, default=200)
+    parser.add_argument("--out", help="precomputed answers file (precompute)")
+    parser.add_argument("--index", help="index snapshot to search with instead of rebuilding")
+    args = parser.parse_args(argv)
+
+    from search_utils import GraphSearcher
+    from data import NODES, EDGES
+
+    # Same settings as app.py, so the saved answers match its cache keys
+    options = dict(
+        candidate_pool=int(os.getenv("SEARCH_CANDIDATE_POOL", "0")) or None,
+        rerank_model=os.getenv("SEARCH_RERANK_MODEL") or None,
+        rerank_batch_size=int(os.getenv("SEARCH_RERANK_BATCH_SIZE", "32")),
+        rerank_t_high=float(os.getenv("SEARCH_RERANK_T_HIGH", "0.5")),
+    )
+    searcher = None
+    if args.index and os.path.exists(args.index):
+        try:
+            searcher = GraphSearcher.load(args.index, NODES, EDGES, **options)
+        except ValueError as e:
+            print(f"Ignoring stale index snapshot {args.index}: {e}")
+    if searcher is None:
+        searcher = GraphSearcher(nodes=NODES, edges=EDGES, **options)
+    queries = top_queries(searcher, read_log(args.log), args.top)
+    if args.command == "top":
+        for q in queries:
+            print(f"{q['count']:>6}  {q['query']}" + (f"  {q['filters']}" if q["filters"] else ""))
+    else:
+        if not args.out:
+            parser.error("precompute needs --out")
+        precompute(searcher, queries, args.out)
+
+if __name__ == "__main__":
+    main()
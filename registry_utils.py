@@ -0,0 +1,177 @@
+# registry_utils.py
+# Several knowledge graphs (per country / program) in one process. Each graph
+# is loaded on first use, from its index snapshot when one is valid, and
+# its footprint is measured with memory_utils. When the loaded graphs exceed
+# the memory budget the least recently used ones are dropped. All searchers
+# share one encoder, so the model weights are loaded once.
+#   KG_GRAPHS=graphs.json  {"kenya": {"source": "graphs/kenya.json", "snapshot": "indexes/kenya.kgidx"}, ...}
+#   KG_GRAPH_MEMORY_MB=2048
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from graph_utils import build_index
+from memory_utils import MemoryReport, add_searcher_components, add_topology_components
+from reload_utils import GraphVersion, load_graph_source
+
+_LOAD_VERSIONS = itertools.count(1)  # every load gets a fresh GraphVersion.version
+
+@dataclass
+class GraphSpec:
+    name: str
+    source: str                     # .py (NODES/EDGES) or .json graph, see reload_utils.load_graph_source
+    snapshot: Optional[str] = None  # index snapshot; written after a build if missing/stale
+    label: Optional[str] = None
+
+@dataclass
+class LoadedGraph:
+    graph: GraphVersion
+    nbytes: int
+    load_ms: float
+    last_used: float
+
+def load_specs(path: str) -> Dict[str, GraphSpec]:
+    with open(path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    resolve = lambda p: p if p is None or os.path.isabs(p) else os.path.join(base, p)
+    return {name: GraphSpec(name, resolve(spec["source"]), resolve(spec.get("snapshot")), spec.get("label"))
+            for name, spec in payload.items()}
+
+def graph_nbytes(graph: GraphVersion, shared: List[Any]) -> int:
+    """
+    Accounted bytes of one loaded graph, excluding objects in `shared` (encoder,
+    reranker). Arrays mapped from an index snapshot count at their full size
+    like heap arrays (memory_utils.deep_sizeof follows views down to the
+    mapped buffer), although the OS may share or page out those bytes.
+    """
+    seen = {id(obj) for obj in shared if obj is not None}
+    report = MemoryReport()
+    add_searcher_components(report, graph.searcher, seen)
+    add_topology_components(report, seen, topology=graph.topology, nodes=graph.nodes, edges=graph.edges)
+    return report.total_bytes
+
+class GraphRegistry:
+    """
+    Lazily loaded, LRU-evicted GraphVersions by name. `memory_budget_bytes`
+    bounds the sum of the loaded graphs' footprints (the shared model is not
+    counted, snapshot-mapped arrays are; see graph_nbytes); the graph being requested is never evicted, so one graph larger
+    than the budget still loads.
+    """
+
+    def __init__(self, specs: Dict[str, GraphSpec], memory_budget_bytes: Optional[int] = None,
+                 model_name: str = "all-MiniLM-L6-v2", **searcher_options: Any):
+        self.specs = specs
+        self.memory_budget_bytes = memory_budget_bytes
+        self.model_name = model_name
+        self.searcher_options = searcher_options
+        self._loaded: "OrderedDict[str, LoadedGraph]" = OrderedDict()
+        self._lock = threading.Lock()  # guards _loaded; never held during a load
+        self._load_locks = {name: threading.Lock() for name in specs}  # one load per graph
+        self._model_lock = threading.Lock()
+        self._model: Optional[Any] = None
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls, **searcher_options: Any) -> Optional["GraphRegistry"]:
+        path = os.getenv("KG_GRAPHS")
+        if not path:
+            return None
+        budget_mb = os.getenv("KG_GRAPH_MEMORY_MB")
+        return cls(load_specs(path), int(float(budget_mb) * 2**20) if budget_mb else None, **searcher_options)
+
+    @property
+    def model(self):
+        """One encoder for every graph (loaded with the first graph)."""
+        with self._model_lock:  # graphs may load concurrently
+            if self._model is None:
+                from encoder_utils import load_encoder
+                self._model = load_encoder(self.model_name)
+        return self._model
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.specs)
+
+    def get(self, name: str) -> GraphVersion:
+        if name not in self.specs:
+            raise KeyError(f"Unknown graph: {name}")
+        graph = self._touch(name)
+        if graph is not None:
+            return graph
+        # Load without the registry lock, so hits and loads of other graphs
+        # are not blocked; concurrent requests for this graph wait for one load.
+        with self._load_locks[name]:
+            graph = self._touch(name)
+            if graph is not None:
+                return graph
+            entry = self._load(self.specs[name])
+            with self._lock:
+                self._loaded[name] = entry
+                self._evict(keep=name)
+            return entry.graph
+
+    def _touch(self, name: str) -> Optional[GraphVersion]:
+        with self._lock:
+            entry = self._loaded.get(name)
+            if entry is None:
+                return None
+            self._loaded.move_to_end(name)
+            entry.last_used = time.time()
+            return entry.graph
+
+    def _load(self, spec: GraphSpec) -> LoadedGraph:
+        from search_utils import GraphSearcher
+
+        t0 = time.perf_counter()
+        nodes, edges = load_graph_source(spec.source)
+        options = dict(self.searcher_options, model_name=self.model_name, model=self.model)
+        searcher = None
+        if spec.snapshot and os.path.exists(spec.snapshot):
+            try:
+                searcher = GraphSearcher.load(spec.snapshot, nodes, edges, **options)
+            except ValueError as e:
+                print(f"Ignoring stale index snapshot {spec.snapshot}: {e}")
+        if searcher is None:
+            searcher = GraphSearcher(nodes=nodes, edges=edges, **options)
+            if spec.snapshot:
+                searcher.save(spec.snapshot)
+        # The cross-encoder is loaded on first rerank; hand over one another graph already has
+        with self._lock:
+            others = list(self._loaded.values())
+        searcher._reranker = next((e.graph.searcher._reranker for e in others
+                                   if e.graph.searcher._reranker is not None), None)
+        graph = GraphVersion(next(_LOAD_VERSIONS), nodes, edges, searcher, build_index(nodes, edges))
+        load_ms = (time.perf_counter() - t0) * 1000.0
+        nbytes = graph_nbytes(graph, [self._model, searcher._reranker])
+        print(f"Loaded graph {spec.name}: {len(nodes)} nodes, {nbytes / 2**20:.1f} MiB in {load_ms:.0f} ms")
+        return LoadedGraph(graph, nbytes, load_ms, time.time())
+
+    def _evict(self, keep: str):
+        if self.memory_budget_bytes is None:
+            return
+        while self.total_bytes > self.memory_budget_bytes:
+            victim = next((n for n in self._loaded if n != keep), None)
+            if victim is None:
+                break
+            entry = self._loaded.pop(victim)
+            self.evictions += 1
+            print(f"Evicted graph {victim} ({entry.nbytes / 2**20:.1f} MiB) to stay under "
+                  f"{self.memory_budget_bytes / 2**20:.1f} MiB")
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(e.nbytes for e in list(self._loaded.values()))
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Loaded graphs, least recently used first."""
+        with self._lock:
+            loaded = list(self._loaded.items())
+        return [{"graph": name, "MiB": round(e.nbytes / 2**20, 2), "nodes": len(e.graph.nodes),
+                 "load_ms": round(e.load_ms, 1), "idle_s": round(time.time() - e.last_used, 1)}
+                for name, e in loaded]
@@ -0,0 +1,134 @@
+# related_utils.py
+# Precomputed "related nodes": every node's top-k semantic neighbours from
+# one blocked all-pairs pass over the (unit-normalised) node embeddings,
+# stored as an int32 id / float16 score adjacency. Lookups replace per-call
+# neighbour queries in the details panel and the Slack review card.
+#   python related_utils.py build related.kgrel [--k 10] [--index index.kgidx]
+import argparse
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bundle_utils import load_bundle, save_bundle
+
+def blocked_topk(embeddings: np.ndarray, k: int = 10, row_block: int = 2048,
+                 col_block: int = 16384, exclude_self: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k inner-product neighbours of every row, best first. Peak scratch
+    memory is row_block x (col_block + k) floats regardless of n.
+    """
+    x = np.asarray(embeddings, dtype=np.float32)
+    n = len(x)
+    k = min(k, n - 1 if exclude_self else n)
+    ids = np.zeros((n, max(k, 0)), dtype=np.int32)
+    scores = np.zeros((n, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return ids, scores
+    for r0 in range(0, n, row_block):
+        r1 = min(r0 + row_block, n)
+        best_s = np.full((r1 - r0, k), -np.inf, dtype=np.float32)
+        best_i = np.zeros((r1 - r0, k), dtype=np.int64)
+        for c0 in range(0, n, col_block):
+            c1 = min(c0 + col_block, n)
+            sims = x[r0:r1] @ x[c0:c1].T
+            if exclude_self and c0 < r1 and r0 < c1:  # diagonal falls in this tile
+                rows = np.arange(max(r0, c0), min(r1, c1))
+                sims[rows - r0, rows - c0] = -np.inf
+            cand_s = np.concatenate([best_s, sims], axis=1)
+            cand_i = np.concatenate([best_i, np.broadcast_to(np.arange(c0, c1), sims.shape)], axis=1)
+            keep = np.argpartition(-cand_s, k - 1, axis=1)[:, :k]
+            best_s = np.take_along_axis(cand_s, keep, axis=1)
+            best_i = np.take_along_axis(cand_i, keep, axis=1)
+        order = np.argsort(-best_s, axis=1, kind="stable")
+        ids[r0:r1] = np.take_along_axis(best_i, order, axis=1)
+        scores[r0:r1] = np.take_along_axis(best_s, order, axis=1)
+    return ids, scores
+
+@dataclass
+class RelatedIndex:
+    node_ids: List[str]
+    ids: np.ndarray     # (n, k) int32 rows into node_ids
+    scores: np.ndarray  # (n, k) float16 cosine similarity
+    fingerprint: Optional[Dict[str, str]] = None
+
+    def __post_init__(self):
+        self._row = {nid: i for i, nid in enumerate(self.node_ids)}
+
+    @classmethod
+    def build(cls, node_ids: List[str], embeddings: np.ndarray, k: int = 10,
+              fingerprint: Optional[Dict[str, str]] = None, **block_kwargs) -> "RelatedIndex":
+        x = np.asarray(embeddings, dtype=np.float32)
+        x = x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+        ids, scores = blocked_topk(x, k=k, **block_kwargs)
+        return cls(list(node_ids), ids.astype(np.int32), scores.astype(np.float16), fingerprint)
+
+    @classmethod
+    def from_searcher(cls, searcher: Any, k: int = 10, **block_kwargs) -> "RelatedIndex":
+        return cls.build([n["id"] for n in searcher.nodes], searcher.embeddings, k=k,
+                         fingerprint=searcher.fingerprint(), **block_kwargs)
+
+    def related(self, node_id: str, k: Optional[int] = None, threshold: float = 0.0) -> List[Tuple[str, float]]:
+        """(node_id, score) neighbours of node_id, best first; [] for unknown ids."""
+        row = self._row.get(node_id)
+        if row is None:
+            return []
+        k = self.ids.shape[1] if k is None else k
+        return [(self.node_ids[j], float(s)) for j, s in zip(self.ids[row, :k], self.scores[row, :k])
+                if s >= threshold]
+
+    def save(self, path: str):
+        meta = {"node_ids": self.node_ids, "fingerprint": self.fingerprint, "kind": "related"}
+        save_bundle(path, {"related_ids": self.ids, "related_scores": self.scores}, meta)
+
+    @classmethod
+    def load(cls, path: str, expected_fingerprint: Optional[Dict[str, str]] = None) -> "RelatedIndex":
+        """mmap a saved index; ValueError if it was built for other data/model."""
+        mm, meta, arrays = load_bundle(path)
+        if expected_fingerprint is not None and meta.get("fingerprint") != expected_fingerprint:
+            raise ValueError(f"Related index fingerprint mismatch: {meta.get('fingerprint')} != {expected_fingerprint}")
+        index = cls(meta["node_ids"], arrays["related_ids"], arrays["related_scores"], meta.get("fingerprint"))
+        index._buffer = mm  # keeps the mapping alive
+        return index
+
+def load_related(path: Optional[str], searcher: Any, k: int = 10, **block_kwargs) -> RelatedIndex:
+    """The index saved at `path` if it matches the searcher's fingerprint, else rebuilt (and saved)."""
+    expected = searcher.fingerprint()
+    if path and os.path.exists(path):
+        try:
+            return RelatedIndex.load(path, expected_fingerprint=expected)
+        except ValueError as e:
+            print(f"Ignoring stale related index {path}: {e}")
+    related = RelatedIndex.build([n["id"] for n in searcher.nodes], searcher.embeddings, k=k,
+                                 fingerprint=expected, **block_kwargs)
+    if path:
+        related.save(path)
+    return related
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute every node's top-k related nodes")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("path")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index", help="reuse embeddings from an index snapshot instead of encoding")
+    parser.add_argument("--row-block", type=int, default=2048)
+    args = parser.parse_args(argv)
+
+    from search_utils import GraphSearcher
+    from data import NODES, EDGES
+
+    t0 = time.perf_counter()
+    if args.index and os.path.exists(args.index):
+        searcher = GraphSearcher.load(args.index, NODES, EDGES)
+    else:
+        searcher = GraphSearcher(nodes=NODES, edges=EDGES)
+    t1 = time.perf_counter()
+    index = RelatedIndex.from_searcher(searcher, k=args.k, row_block=args.row_block)
+    index.save(args.path)
+    print(f"Related top-{index.ids.shape[1]} for {len(index.node_ids)} nodes in {time.perf_counter() - t1:.2f}s "
+          f"(load/encode {t1 - t0:.2f}s) -> {args.path} ({os.path.getsize(args.path) / 1e6:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# reload_utils.py
+# Hot reload of the graph source (data.py or a JSON file) without restarting
+# Streamlit. A background thread polls the file, diffs the node set and
+# builds the next GraphVersion from the previous one (only edited nodes are
+# re-encoded), then swaps it in with a single reference assignment. Sessions
+# read `reloader.current` once per rerun, so a run never mixes versions.
+import json
+import os
+import runpy
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from graph_utils import build_index
+
+@dataclass
+class NodeDiff:
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    edges_changed: bool = False
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.removed or self.changed or self.edges_changed)
+
+    def __str__(self) -> str:
+        return (f"+{len(self.added)} -{len(self.removed)} ~{len(self.changed)} nodes"
+                f"{', edges changed' if self.edges_changed else ''}")
+
+@dataclass
+class GraphVersion:
+    version: int
+    nodes: List[Dict]
+    edges: List[Dict]
+    searcher: Any
+    topology: Tuple  # (node_map, children_map, parents_map, root_ids), see graph_utils.build_index
+    diff: NodeDiff = field(default_factory=NodeDiff)
+    loaded_at: float = field(default_factory=time.time)
+
+def load_graph_source(path: str) -> Tuple[List[Dict], List[Dict]]:
+    """(nodes, edges) from a .py module defining NODES/EDGES or a JSON {"nodes", "edges"} file."""
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        return payload["nodes"], payload.get("edges", [])
+    namespace = runpy.run_path(path)  # fresh namespace; the imported `data` module is untouched
+    return namespace["NODES"], namespace.get("EDGES", [])
+
+def diff_graph(old_nodes: List[Dict], old_edges: List[Dict],
+               new_nodes: List[Dict], new_edges: List[Dict]) -> NodeDiff:
+    old = {n["id"]: n for n in old_nodes}
+    new = {n["id"]: n for n in new_nodes}
+    edge_key = lambda e: json.dumps(e, sort_keys=True)
+    return NodeDiff(
+        added=[nid for nid in new if nid not in old],
+        removed=[nid for nid in old if nid not in new],
+        changed=[nid for nid in new if nid in old and new[nid] != old[nid]],
+        edges_changed=sorted(map(edge_key, old_edges)) != sorted(map(edge_key, new_edges)),
+    )
+
+def update_topology(topology: Tuple, nodes: List[Dict], edges: List[Dict], diff: NodeDiff) -> Tuple:
+    """Patch node_map for node edits; children/parents/roots only change with the edges."""
+    if diff.edges_changed or diff.added or diff.removed:
+        return build_index(nodes, edges)
+    node_map, children_map, parents_map, roots = topology
+    node_map = dict(node_map)
+    for n in nodes:
+        if n["id"] in diff.changed:
+            node_map[n["id"]] = n
+    return node_map, children_map, parents_map, roots
+
+class HotReloader:
+    """
+    Watch `path` and keep `current` pointing at the latest GraphVersion.
+    `rebuild(previous_searcher, nodes, edges)` returns the next searcher,
+    normally previous_searcher.updated(nodes, edges); `retire(old_searcher)`,
+    if given, runs after the swap to release what only the old one holds.
+    in_sync=False means `initial` was not loaded from `path`, so the first
+    check loads it.
+    """
+
+    def __init__(self, path: str, initial: GraphVersion,
+                 rebuild: Callable[[Any, List[Dict], List[Dict]], Any],
+                 interval_s: float = 2.0, in_sync: bool = True,
+                 retire: Optional[Callable[[Any], None]] = None):
+        self.path = path
+        self.current = initial
+        self.rebuild = rebuild
+        self.retire = retire
+        self.interval_s = interval_s
+        self.last_error: Optional[str] = None
+        self._stamp = self._file_stamp() if in_sync else None
+        self._lock = threading.Lock()  # one rebuild at a time
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def check_now(self) -> bool:
+        """Reload if the source changed; True if a new version was swapped in."""
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        with self._lock:
+            self._stamp = stamp
+            old = self.current
+            try:
+                nodes, edges = load_graph_source(self.path)
+                diff = diff_graph(old.nodes, old.edges, nodes, edges)
+                if diff.empty:
+                    return False
+                t0 = time.perf_counter()
+                searcher = self.rebuild(old.searcher, nodes, edges)
+                topology = update_topology(old.topology, nodes, edges, diff)
+            except Exception as e:  # a half-saved or broken file keeps the old version
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Graph reload failed, keeping v{old.version}: {self.last_error}")
+                return False
+            self.last_error = None
+            self.current = GraphVersion(old.version + 1, nodes, edges, searcher, topology, diff)
+            print(f"Graph reloaded v{old.version} -> v{old.version + 1} ({diff}) "
+                  f"in {time.perf_counter() - t0:.2f}s")
+            if self.retire is not None and searcher is not old.searcher:
+                try:
+                    self.retire(old.searcher)
+                except Exception as e:
+                    print(f"Retiring searcher v{old.version} failed: {type(e).__name__}: {e}")
+            return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.check_now()
+
+    def start(self) -> "HotReloader":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="graph-reloader", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_s + 1)
+            self._thread = None
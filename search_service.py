@@ -0,0 +1,404 @@
+# search_service.py
+# Standalone asyncio HTTP/JSON service hosting one warm GraphSearcher, so
+# app.py, slack_integration.py and the RAG server share a single index and
+# model instead of each loading their own.
+#   python search_service.py --port 8765 [--index index.kgidx] [--watch data.py] [--precomputed answers.json]
+#
+#   POST /search   {"query": ..., "filters": {...}, "within": id, "deadline_ms": ..., "rerank": true}
+#                  or {"queries": [<search request>, ...]}  -> {"responses": [...]}
+#   POST /similar  {"query": ...} | {"embedding": [...]} | {"queries": [...]}, "k": 3, "threshold": 0.0
+#   POST /facets   {"field": "end_user", "filters": {...}} | {"filters": {...}, "node_ids": true}
+#   POST /suggest  {"prefix": ..., "k": 8}
+#   GET  /health
+#
+# Concurrent requests are coalesced: identical requests share one result, and
+# everything that arrives while a batch runs is encoded in one model call.
+# HTTP/1.1 keep-alive is supported; stdlib only.
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from metrics_utils import REGISTRY as METRICS
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+METRICS.describe("service_requests_total", "Requests handled by the search service, by endpoint.")
+METRICS.describe("service_coalesced_total", "Search service requests answered by an identical in-flight request.")
+METRICS.describe("service_batch_ms", "Search service batch duration in milliseconds.")
+
+def _result_dict(r) -> Dict[str, Any]:
+    return {"node_id": r.node_id, "score": r.score, "rerank_score": r.rerank_score,
+            "label": (r.node_data or {}).get("label", r.node_id), "node_data": r.node_data}
+
+def _response_dict(response) -> Dict[str, Any]:
+    return {
+        "best_match": _result_dict(response.best_match) if response.best_match else None,
+        "results": [_result_dict(r) for r in response.results],
+        "stages": response.stages,
+        "timings_ms": response.timings_ms,
+        "degraded": response.degraded,
+    }
+
+class Coalescer:
+    """
+    Micro-batcher for one executor thread. Requests with the same key share a
+    future; requests arriving within `max_wait_ms` (or while the previous batch
+    is still running) go to `run_batch(items) -> results` together. An
+    Exception in place of a result fails only that item's future, so one bad
+    request cannot fail the others in its batch.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]], executor: ThreadPoolExecutor,
+                 name: str, max_batch: int = 32, max_wait_ms: float = 2.0):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.name = name
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self._pending: Dict[str, Tuple[Any, asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def submit(self, key: str, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        if key in self._pending:
+            METRICS.inc("service_coalesced_total", endpoint=self.name)
+            return await asyncio.shield(self._pending[key][1])
+        fut = loop.create_future()
+        self._pending[key] = (item, fut)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._flush)
+        return await asyncio.shield(fut)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = list(self._pending.values()), {}
+        asyncio.ensure_future(self._run([item for item, _ in batch], [fut for _, fut in batch]))
+
+    async def _run(self, items: List[Any], futures: List[asyncio.Future]):
+        t0 = time.perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, self.run_batch, items)
+        except Exception as e:
+            for fut in futures:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        METRICS.observe("service_batch_ms", (time.perf_counter() - t0) * 1000.0, endpoint=self.name)
+        for fut, result in zip(futures, results):
+            if fut.done():
+                continue
+            if isinstance(result, Exception):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+
+class SearchService:
+    """HTTP front end; `get_searcher()` is read per batch so a hot reload swaps the index."""
+
+    def __init__(self, get_searcher: Callable[[], Any], max_batch: int = 32, max_wait_ms: float = 2.0,
+                 idle_timeout_s: float = 60.0):
+        self.get_searcher = get_searcher
+        self.idle_timeout_s = idle_timeout_s
+        # One worker: batches run back to back and the next one fills meanwhile
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kg-search")
+        self._search = Coalescer(self._search_batch, self._executor, "search", max_batch, max_wait_ms)
+        self._similar = Coalescer(self._similar_batch, self._executor, "similar", max_batch, max_wait_ms)
+        self._fingerprint: Tuple[Any, Optional[Dict[str, str]]] = (None, None)  # (searcher, its fingerprint)
+
+    # --- batch workers (executor thread) ---
+    def _search_batch(self, requests_: List[Dict[str, Any]]) -> List[Any]:
+        searcher = self.get_searcher()
+        # Cached queries are answered without the model; encode the rest in one call
+        todo = [i for i, r in enumerate(requests_)
+                if not searcher.is_cached(r["query"], r.get("filters"), r.get("within"), r.get("rerank", True))]
+        embeddings: List[Optional[np.ndarray]] = [None] * len(requests_)
+        if todo:
+            for i, emb in zip(todo, searcher.encode_queries([requests_[i]["query"] for i in todo])):
+                embeddings[i] = emb
+        out: List[Any] = []
+        for req, emb in zip(requests_, embeddings):
+            try:
+                response = searcher.search(
+                    req["query"], filters=req.get("filters"), within=req.get("within"),
+                    deadline_ms=req.get("deadline_ms"), rerank=req.get("rerank", True), query_embedding=emb,
+                )
+                out.append(_response_dict(response))
+            except Exception as e:  # reported to this request only
+                out.append(e)
+        return out
+
+    def _similar_batch(self, requests_: List[Dict[str, Any]]) -> List[Any]:
+        searcher = self.get_searcher()
+        texts = [r["query"] for r in requests_ if "embedding" not in r]
+        encoded = iter(searcher.encode_queries(texts)) if texts else iter(())
+        dim = searcher.embeddings.shape[1]
+        out: List[Any] = [None] * len(requests_)
+        valid, vectors, params = [], [], []
+        for i, req in enumerate(requests_):
+            vec = next(encoded) if "embedding" not in req else None
+            try:
+                if vec is None:
+                    vec = np.asarray(req["embedding"], dtype=np.float32)
+                    if vec.shape != (dim,):
+                        raise ValueError(f"'embedding' must be a list of {dim} floats")
+                params.append((int(req.get("k", 3)), float(req.get("threshold", 0.0))))
+            except Exception as e:  # reported to this request only
+                out[i] = e
+                continue
+            valid.append(i)
+            vectors.append(vec)
+        if valid:
+            k_max = max(k for k, _ in params)
+            for i, (k, threshold), hits in zip(valid, params, searcher.nearest(np.stack(vectors), k=k_max)):
+                out[i] = [{"node_id": h.node_id, "score": h.score, "label": h.node_data.get("label", h.node_id)}
+                          for h in hits[:k] if h.score >= threshold]
+        return out
+
+    # --- endpoints ---
+    async def _handle_search(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        if "queries" in body:
+            responses = await asyncio.gather(*(self._submit_search(q) for q in body["queries"]))
+            return {"responses": list(responses)}
+        return await self._submit_search(body)
+
+    async def _submit_search(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        if not isinstance(req.get("query"), str):
+            raise ValueError("'query' must be a string")
+        key = json.dumps({k: req.get(k) for k in ("query", "filters", "within", "deadline_ms", "rerank")},
+                         sort_keys=True)
+        return await self._search.submit(key, req)
+
+    async def _handle_similar(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        if "queries" in body:
+            results = await asyncio.gather(*(self._submit_similar({**body, "query": q}) for q in body["queries"]))
+            return {"responses": [{"results": r} for r in results]}
+        return {"results": await self._submit_similar(body)}
+
+    async def _submit_similar(self, req: Dict[str, Any]) -> List[Dict[str, Any]]:
+        req = {k: v for k, v in req.items() if k != "queries"}
+        if "embedding" not in req and not isinstance(req.get("query"), str):
+            raise ValueError("'query' or 'embedding' is required")
+        return await self._similar.submit(json.dumps(req, sort_keys=True), req)
+
+    async def _in_executor(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run a one-off call on the search thread, off the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _facets(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        searcher = self.get_searcher()
+        if body.get("node_ids"):
+            return {"node_ids": searcher.facet_node_ids(body.get("filters") or {})}
+        return {"counts": searcher.facet_counts(body["field"], body.get("filters"))}
+
+    def _suggest(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        suggestions = self.get_searcher().suggest(str(body["prefix"]), int(body.get("k", 8)))
+        return {"suggestions": [{"text": s.text, "score": s.score, "node_id": s.node_id} for s in suggestions]}
+
+    async def _handle_facets(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._in_executor(self._facets, body)
+
+    async def _handle_suggest(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._in_executor(self._suggest, body)
+
+    async def _health(self) -> Dict[str, Any]:
+        searcher = self.get_searcher()
+        cached_for, fingerprint = self._fingerprint
+        if cached_for is not searcher:  # hashes every node text: once per loaded index
+            fingerprint = await self._in_executor(searcher.fingerprint)
+            self._fingerprint = (searcher, fingerprint)
+        return {"status": "ok", "nodes": len(searcher.nodes), "fingerprint": fingerprint,
+                "cache": searcher.cache_stats()}
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        if path == "/health":
+            return 200, await self._health()
+        routes = {"/search": self._handle_search, "/similar": self._handle_similar, "/facets": self._handle_facets,
+                  "/suggest": self._handle_suggest}
+        if path not in routes:
+            return 404, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        METRICS.inc("service_requests_total", endpoint=path.lstrip("/"))
+        try:
+            payload = json.loads(body or b"{}")
+            return 200, await routes[path](payload)
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": f"{type(e).__name__}: {e}"}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    # --- HTTP/1.1 with keep-alive ---
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.idle_timeout_s)
+                if not line:
+                    break
+                method, target, version = line.decode("latin-1").split()
+                headers: Dict[str, str] = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = h.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                status, payload = await self._dispatch(method, target.split("?")[0], body)
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"Search service listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+class SearchClient:
+    """
+    Thin blocking client (keep-alive requests.Session). search() returns a
+    SearchResponse like GraphSearcher.search, so callers can swap one for the other.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, timeout: float = 30.0):
+        self.base_url = (base_url or os.getenv("KG_SEARCH_URL") or DEFAULT_URL).rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = self._session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _to_response(data: Dict[str, Any]):
+        from search_utils import SearchResponse, SearchResult
+        to_result = lambda r: SearchResult(node_id=r["node_id"], score=r["score"], node_data=r["node_data"],
+                                           rerank_score=r.get("rerank_score"))
+        return SearchResponse(
+            best_match=to_result(data["best_match"]) if data["best_match"] else None,
+            results=[to_result(r) for r in data["results"]],
+            stages=data["stages"], timings_ms=data["timings_ms"], degraded=data["degraded"],
+        )
+
+    def search(self, query: str, filters: Optional[Dict[str, Any]] = None, within: Optional[str] = None,
+               deadline_ms: Optional[float] = None, rerank: bool = True):
+        return self._to_response(self._post("/search", {
+            "query": query, "filters": filters, "within": within, "deadline_ms": deadline_ms, "rerank": rerank,
+        }))
+
+    def search_many(self, queries: List[str], **kwargs) -> list:
+        data = self._post("/search", {"queries": [{"query": q, **kwargs} for q in queries]})
+        return [self._to_response(r) for r in data["responses"]]
+
+    def similar(self, query: Optional[str] = None, embedding: Optional[List[float]] = None,
+                k: int = 3, threshold: float = 0.0) -> List[Dict[str, Any]]:
+        payload: Dict[str, Any] = {"k": k, "threshold": threshold}
+        if embedding is not None:
+            payload["embedding"] = [float(x) for x in embedding]
+        else:
+            payload["query"] = query
+        return self._post("/similar", payload)["results"]
+
+    def facet_counts(self, field: str, filters: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+        return self._post("/facets", {"field": field, "filters": filters})["counts"]
+
+    def facet_node_ids(self, filters: Dict[str, Any]) -> List[str]:
+        return self._post("/facets", {"filters": filters, "node_ids": True})["node_ids"]
+
+    def suggest(self, prefix: str, k: int = 8) -> list:
+        from suggest_utils import Suggestion
+        return [Suggestion(**s) for s in self._post("/suggest", {"prefix": prefix, "k": k})["suggestions"]]
+
+    def health(self) -> Dict[str, Any]:
+        response = self._session.get(f"{self.base_url}/health", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve GraphSearcher over HTTP/JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--index", help="index snapshot (snapshot_utils.py build); rebuilt if stale")
+    parser.add_argument("--watch", help="hot-reload the graph from this .py/.json source")
+    parser.add_argument("--candidate-pool", type=int, default=None)
+    parser.add_argument("--rerank-model", default=None)
+    parser.add_argument("--rerank-t-high", type=float, default=0.5, help="best-match threshold on the rerank score")
+    parser.add_argument("--precomputed", help="precomputed answers to pin in the result cache (querylog_utils.py)")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    import data
+    from search_utils import GraphSearcher
+    from data import NODES, EDGES
+
+    options = dict(candidate_pool=args.candidate_pool, rerank_model=args.rerank_model,
+                   rerank_t_high=args.rerank_t_high)
+    searcher = None
+    if args.index and os.path.exists(args.index):
+        try:
+            searcher = GraphSearcher.load(args.index, NODES, EDGES, **options)
+        except ValueError as e:
+            print(f"Ignoring stale index snapshot {args.index}: {e}")
+    if searcher is None:
+        searcher = GraphSearcher(nodes=NODES, edges=EDGES, **options)
+        if args.index:
+            searcher.save(args.index)
+    searcher.encode_queries(["warm up"])  # load the model before the first request
+    from querylog_utils import load_precomputed
+    load_precomputed(searcher, args.precomputed)
+
+    get_searcher = lambda: searcher
+    if args.watch:
+        from graph_utils import build_index
+        from reload_utils import GraphVersion, HotReloader
+        initial = GraphVersion(0, NODES, EDGES, searcher, build_index(NODES, EDGES))
+
+        def rebuild(prev, nodes, edges):
+            updated = prev.updated(nodes, edges)
+            load_precomputed(updated, args.precomputed)
+            return updated
+
+        reloader = HotReloader(args.watch, initial, rebuild,
+                               in_sync=os.path.abspath(args.watch) == os.path.abspath(data.__file__))
+        reloader.check_now()
+        reloader.start()
+        get_searcher = lambda: reloader.current.searcher
+
+    service = SearchService(get_searcher, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
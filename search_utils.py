@@ -1,57 +1,499 @@
 # search_utils.py
+import hashlib
+import itertools
+import json
 import re
-from typing import List, Dict, Tuple, Optional
+import time
+from typing import Any, List, Dict, Tuple, Optional, Sequence
 from dataclasses import dataclass
-from rank_bm25 import BM25Okapi
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
-import torch
+import scipy.sparse as sp
+from encoder_utils import load_encoder
 from data import NODES, EDGES
+from metrics_utils import REGISTRY as METRICS
+from lexical_utils import BM25Index, PositionalIndex, update_lexical
+from bundle_utils import attach_shared, detach_shared, load_bundle, publish_shared, save_bundle
+from cache_utils import ResultCache
+from spell_utils import SymSpell
+from suggest_utils import PrefixIndex, Suggestion, graph_suggestions, term_frequencies
+
+# Bumped whenever _tokenize changes, so snapshots with old BM25 terms are rebuilt
+TOKENIZER_VERSION = '2'
+_VERSION_TOKEN = re.compile(r'v?(\d+(?:\.\d+)+)')
+_PHRASE = re.compile(r'"([^"]+)"')
+_INDEX_VERSIONS = itertools.count(1)  # process-wide, so no two index states share a version
 
 @dataclass
 class SearchResult:
     node_id: str
     score: float
     node_data: dict
+    rerank_score: Optional[float] = None  # cross-encoder relevance (0-1), if reranked
+
+@dataclass
+class SearchResponse:
+    best_match: Optional[SearchResult]
+    results: List[SearchResult]
+    stages: List[str]                # stages that completed: lexical, dense, smoothing, rerank (or cache)
+    timings_ms: Dict[str, float]     # per-stage wall time
+    degraded: bool = False           # True if a deadline skipped or cut short a stage (dense, smoothing, rerank)
+    
+    def __iter__(self):
+        """Unpack as (best_match, results), like the original tuple return."""
+        return iter((self.best_match, self.results))
+    
+    def from_cache(self, started: float) -> 'SearchResponse':
+        """Copy served from the result cache (callers may reorder/extend the list)."""
+        return SearchResponse(self.best_match, list(self.results), ['cache'],
+                              {'total': (time.perf_counter() - started) * 1000.0}, self.degraded)
 
 class GraphSearcher:
     def __init__(self, nodes: List[dict], edges: List[dict] = None, alpha: float = 0.4, 
-                 beta: float = 0.6, t_high: float = 0.78, t_low: float = 0.55):
+                 beta: float = 0.6, t_high: float = 0.78, t_low: float = 0.55,
+                 facet_fields: Sequence[str] = ("end_user",),
+                 smoothing_steps: int = 0, smoothing_damping: float = 0.3,
+                 dense_chunk_size: int = 8192, candidate_pool: Optional[int] = None,
+                 rerank_model: Optional[str] = None, rerank_batch_size: int = 32,
+                 rerank_t_high: float = 0.5,
+                 model_name: str = 'all-MiniLM-L6-v2', spell_correct: bool = True,
+                 cache_size: int = 1024,
+                 index: Optional[Tuple[Dict[str, Any], Dict[str, np.ndarray]]] = None,
+                 previous: Optional['GraphSearcher'] = None, model: Optional[Any] = None):
         self.nodes = nodes
         self.edges = edges or []  # Store edges for parent lookup
         self.alpha = alpha
         self.beta = beta
         self.t_high = t_high
         self.t_low = t_low
+        self.facet_fields = tuple(facet_fields)
+        # Graph smoothing after fusion (disabled when smoothing_steps == 0)
+        self.smoothing_steps = smoothing_steps
+        self.smoothing_damping = smoothing_damping
+        # Rows per cosine block; the deadline is checked between blocks
+        self.dense_chunk_size = dense_chunk_size
+        self._encode_ms: Optional[float] = None  # moving average of query encode time
+        # Two-stage retrieval: keep the top `candidate_pool` fused hits, then
+        # optionally rerank just those with a cross-encoder (loaded on first use)
+        self.candidate_pool = candidate_pool
+        self.rerank_model = rerank_model
+        self.rerank_batch_size = rerank_batch_size
+        self.rerank_t_high = rerank_t_high  # best-match threshold on the cross-encoder score
+        self._reranker: Optional[Any] = None  # sentence_transformers.CrossEncoder
+        self._suggest_index: Optional[PrefixIndex] = None  # built on first suggest()
+        # Typo correction of out-of-vocabulary query terms before BM25
+        self.spell_correct = spell_correct
+        self._spell: Optional[SymSpell] = None
+        # LRU of recent responses, keyed on the normalised query + parameters + index_version
+        self.cache_size = cache_size
+        self.result_cache = ResultCache(cache_size)
+        self.index_version = 0
+        self._rerank_ms: Optional[float] = None  # moving average of rerank time
+        
+        # Per-facet row masks, used to pre-filter scoring and for sidebar counts
+        t0 = time.perf_counter()
+        self._build_facets()
         
-        # Initialize BM25
-        self.tokenized_corpus = [self._tokenize(self._prepare_text(node)) for node in nodes]
-        self.bm25 = BM25Okapi(self.tokenized_corpus)
+        # Parent lookup + pre-order (Euler tour) ranges for subtree-scoped search
+        self._build_hierarchy()
         
-        # Initialize sentence transformer
-        self.model = SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
-        self.model.eval()
+        # Normalised adjacency for score propagation along EDGES
+        self._build_adjacency()
+        METRICS.observe('index_build_stage_ms', (time.perf_counter() - t0) * 1000.0, stage='topology')
         
-        # Pre-compute embeddings
-        print("Computing node embeddings...")
         self.node_texts = [self._prepare_text(node) for node in nodes]
-        self.embeddings = self.model.encode(
-            self.node_texts, 
-            convert_to_tensor=True,
-            show_progress_bar=True
-        ).cpu().numpy()
+        
+        # Sentence encoder (torch or ONNX int8, see encoder_utils), loaded on
+        # first encode (snapshot loads skip it); `model` shares an already loaded one
+        self.model_name = model_name
+        self._model: Optional[Any] = model
+        if previous is not None and previous.model_name == model_name:
+            self._model = previous._model
+            self._reranker = previous._reranker if previous.rerank_model == rerank_model else None
+        
+        if index is not None:
+            # Pre-built BM25 + embeddings (shared memory / mmap): nothing to compute
+            self._load_index_arrays(*index)
+        else:
+            self._build_index_arrays(previous)
+    
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = load_encoder(self.model_name)
+        return self._model
+    
+    @property
+    def spell(self) -> SymSpell:
+        """Symmetric-delete dictionary over the BM25 vocabulary (built with the index or on load)."""
+        if self._spell is None:
+            self._spell = SymSpell(self._term_counts())
+        return self._spell
+    
+    def _term_counts(self) -> Dict[str, int]:
+        doc_freq = np.diff(self.bm25.indptr)
+        return {t: int(doc_freq[i]) for t, i in self.bm25.vocab.items()}
+    
+    def fingerprint(self) -> Dict[str, str]:
+        """Model name + hash of node ids and indexed texts; a snapshot is only valid for a match."""
+        h = hashlib.sha256()
+        for node, text in zip(self.nodes, self.node_texts):
+            h.update(str(node['id']).encode('utf-8') + b'\0' + text.encode('utf-8') + b'\0')
+        return {'model': self.model_name, 'data': h.hexdigest(), 'tokenizer': TOKENIZER_VERSION}
+    
+    def _config(self) -> Dict[str, Any]:
+        return dict(
+            alpha=self.alpha, beta=self.beta, t_high=self.t_high, t_low=self.t_low,
+            facet_fields=self.facet_fields, smoothing_steps=self.smoothing_steps,
+            smoothing_damping=self.smoothing_damping, dense_chunk_size=self.dense_chunk_size,
+            candidate_pool=self.candidate_pool, rerank_model=self.rerank_model,
+            rerank_batch_size=self.rerank_batch_size, rerank_t_high=self.rerank_t_high,
+            model_name=self.model_name,
+            spell_correct=self.spell_correct, cache_size=self.cache_size,
+        )
+    
+    def updated(self, nodes: List[dict], edges: List[dict] = None) -> 'GraphSearcher':
+        """
+        New searcher over an edited graph with the same settings. Nodes whose
+        indexed text is unchanged keep their embeddings and BM25 / positional
+        postings, and the typo dictionary only expands added / removed terms,
+        so only edited/added nodes are tokenized and encoded.
+        Still O(corpus): every node's indexed text is rebuilt to find the
+        edits, the kept postings are renumbered and re-sorted (numpy), and the
+        facet masks, hierarchy and adjacency are rebuilt from scratch.
+        This searcher is left untouched for in-flight queries.
+        """
+        return GraphSearcher(nodes, edges, previous=self, **self._config())
+    
+    def _build_index_arrays(self, previous: Optional['GraphSearcher'] = None):
+        """
+        Tokenize + BM25 and encode every node (the expensive part of __init__).
+        With a previous searcher only rows whose indexed text changed are
+        tokenized and encoded; its postings are renumbered with numpy.
+        """
+        source = None
+        if previous is not None:
+            prev_rows = {text: row for row, text in enumerate(previous.node_texts)}
+            source = [prev_rows.get(text, -1) for text in self.node_texts]
+        t0 = time.perf_counter()
+        if source is None:
+            tokenized = {i: self._tokenize(text) for i, text in enumerate(self.node_texts)}
+        else:
+            tokenized = {i: self._tokenize(self.node_texts[i]) for i, row in enumerate(source) if row < 0}
+        METRICS.observe('index_build_stage_ms', (time.perf_counter() - t0) * 1000.0, stage='tokenize')
+        t0 = time.perf_counter()
+        if source is None:
+            corpus = list(tokenized.values())
+            self.bm25 = BM25Index.build(corpus)
+            self.positions = PositionalIndex.build(corpus, self.bm25.vocab)
+        else:
+            self.bm25, self.positions = update_lexical(previous.bm25, previous.positions, source, tokenized)
+        METRICS.observe('index_build_stage_ms', (time.perf_counter() - t0) * 1000.0, stage='bm25')
+        if self.spell_correct:
+            t0 = time.perf_counter()
+            if previous is not None and previous._spell is not None:
+                self._spell = previous._spell.updated(self._term_counts())
+            self.spell  # build the typo dictionary now rather than on the first query
+            METRICS.observe('index_build_stage_ms', (time.perf_counter() - t0) * 1000.0, stage='spell')
+        
+        # Pre-compute embeddings, stored unit-normalised (cosine == dot product).
+        # With a previous searcher, rows for unchanged texts are copied over.
+        rows = np.asarray(source if previous is not None and previous.model_name == self.model_name
+                          else [-1] * len(self.node_texts), dtype=np.int64)
+        kept = rows >= 0
+        todo = np.flatnonzero(~kept).tolist()
+        print(f"Computing node embeddings ({len(todo)} of {len(self.node_texts)})...")
+        t0 = time.perf_counter()
+        dim = previous.embeddings.shape[1] if kept.any() else self.model.get_sentence_embedding_dimension()
+        self.embeddings = np.zeros((len(self.node_texts), dim), dtype=np.float32)
+        if kept.any():
+            self.embeddings[kept] = previous.embeddings[rows[kept]]
+        if todo:
+            encoded = np.asarray(self.model.encode(
+                [self.node_texts[i] for i in todo],
+                convert_to_numpy=True,
+                show_progress_bar=True
+            ), dtype=np.float32)
+            self.embeddings[todo] = encoded / np.maximum(np.linalg.norm(encoded, axis=1, keepdims=True), 1e-12)
+        self.reencoded = len(todo)
+        self._embedding_norms = np.maximum(np.linalg.norm(self.embeddings, axis=1), 1e-12)
+        METRICS.observe('index_build_stage_ms', (time.perf_counter() - t0) * 1000.0, stage='encode')
         print("Node embeddings computed.")
+        self._index_changed()
+    
+    def index_arrays(self) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """(meta, arrays) for the BM25 + embedding state, in bundle_utils layout."""
+        arrays = {'embeddings': self.embeddings, 'embedding_norms': self._embedding_norms}
+        arrays.update({f'bm25_{k}': v for k, v in self.bm25.arrays().items()})
+        arrays.update({f'pos_{k}': v for k, v in self.positions.arrays().items()})
+        meta = {
+            'node_ids': [node['id'] for node in self.nodes],
+            'vocab': self.bm25.vocab_terms(),
+            'bm25': self.bm25.params(),
+            'fingerprint': self.fingerprint(),
+        }
+        return meta, arrays
+    
+    def publish_shared(self, name: str, knn: Optional[Any] = None):
+        """
+        Publish the index arrays (and optionally a GraphKNN's node embeddings)
+        to shared-memory segment `name`. Keep the returned SharedMemory alive.
+        """
+        meta, arrays = self.index_arrays()
+        if knn is not None:
+            arrays.update(knn.knn_arrays())
+            meta['knn_fingerprint'] = knn.fingerprint()
+        return publish_shared(name, arrays, meta)
+    
+    @classmethod
+    def from_shared(cls, name: str, nodes: List[dict], edges: List[dict] = None, **kwargs) -> 'GraphSearcher':
+        """Attach to a published segment read-only; embeddings/BM25 are not copied."""
+        shm, meta, arrays = attach_shared(name)
+        try:
+            searcher = cls(nodes, edges, index=(meta, arrays), **kwargs)
+        except Exception:
+            detach_shared(shm, arrays)
+            raise
+        searcher._index_buffer = shm  # keeps the mapping alive
+        return searcher
+    
+    def save(self, path: str, knn: Optional[Any] = None):
+        """Write the index (and optionally a GraphKNN's embeddings) as one mmap-able file."""
+        meta, arrays = self.index_arrays()
+        if knn is not None:
+            arrays.update(knn.knn_arrays())
+            meta['knn_fingerprint'] = knn.fingerprint()
+        save_bundle(path, arrays, meta)
+    
+    @classmethod
+    def load(cls, path: str, nodes: List[dict], edges: List[dict] = None, **kwargs) -> 'GraphSearcher':
+        """
+        Memory-map a snapshot written by save(). Raises ValueError if it was built
+        from different nodes or another model; nothing is tokenized or encoded.
+        """
+        mm, meta, arrays = load_bundle(path)
+        searcher = cls(nodes, edges, index=(meta, arrays), **kwargs)
+        searcher._index_buffer = mm  # keeps the mapping alive
+        return searcher
+    
+    def _load_index_arrays(self, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        if meta['node_ids'] != [node['id'] for node in self.nodes]:
+            raise ValueError("Index was built for a different node set/order")
+        if meta.get('fingerprint') != self.fingerprint():
+            raise ValueError(f"Index fingerprint mismatch: {meta.get('fingerprint')} != {self.fingerprint()}")
+        self.bm25 = BM25Index.from_arrays(
+            meta['vocab'], {k[len('bm25_'):]: v for k, v in arrays.items() if k.startswith('bm25_')},
+            meta['bm25'])
+        self.positions = PositionalIndex.from_arrays(
+            self.bm25.vocab, {k[len('pos_'):]: v for k, v in arrays.items() if k.startswith('pos_')})
+        if self.spell_correct:
+            t0 = time.perf_counter()
+            self.spell  # the snapshot has no typo dictionary; build it here, not on the first query
+            METRICS.observe('index_build_stage_ms', (time.perf_counter() - t0) * 1000.0, stage='spell')
+        self.embeddings = arrays['embeddings']
+        self._embedding_norms = arrays['embedding_norms']
+        self._index_changed()
+    
+    def _index_changed(self):
+        """New index state: cached results are from the old one."""
+        self.index_version = next(_INDEX_VERSIONS)
+        self.result_cache.clear()
+    
+    def _cache_key(self, query: str, filters: Optional[Dict[str, Any]], within: Optional[str],
+                   **params: Any) -> Tuple:
+        """Acronym-expanded, normalised query + search parameters + index/settings state."""
+        expanded = self._expand_acronyms(query)
+        return (
+            self.index_version,
+            ' '.join(self._tokenize(expanded)),
+            tuple(' '.join(p) for p in self._phrases(expanded)),
+            json.dumps(filters, sort_keys=True, default=str) if filters else None,
+            within,
+            tuple(sorted(params.items())),
+            tuple(sorted((k, str(v)) for k, v in self._config().items())),
+        )
+    
+    def is_cached(self, query: str, filters: Optional[Dict[str, Any]] = None,
+                  within: Optional[str] = None, rerank: bool = True) -> bool:
+        """True if search() would answer from the result cache (lets batch callers skip the encode)."""
+        return self.cache_size > 0 and self._cache_key(query, filters, within, rerank=rerank) in self.result_cache
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        return {**self.result_cache.stats(), 'index_version': self.index_version}
+    
+    def _build_hierarchy(self):
+        """
+        Lay the nodes out in DFS pre-order so every subtree is one contiguous
+        slice `self._order[self._tin[row]:self._tout[row]]`. A node with several
+        parents is placed under its first one (same rule as `_get_parent`).
+        """
+        self.id_to_row: Dict[str, int] = {node['id']: i for i, node in enumerate(self.nodes)}
+        self._parent_row: Dict[int, int] = {}
+        children: Dict[int, List[int]] = {}
+        for edge in self.edges:
+            if edge.get('type') != 'child':
+                continue
+            src = self.id_to_row.get(edge['source'])
+            tgt = self.id_to_row.get(edge['target'])
+            if src is None or tgt is None or tgt in self._parent_row:
+                continue
+            self._parent_row[tgt] = src
+            children.setdefault(src, []).append(tgt)
+        
+        n = len(self.nodes)
+        self._tin = np.full(n, -1, dtype=np.int64)
+        self._tout = np.zeros(n, dtype=np.int64)
+        order: List[int] = []
+        roots = [i for i in range(n) if i not in self._parent_row]
+        # Rows never reached from a root sit on a parent cycle; treat them as roots too
+        for start in roots + list(range(n)):
+            if self._tin[start] >= 0:
+                continue
+            stack = [(start, False)]
+            while stack:
+                row, done = stack.pop()
+                if done:
+                    self._tout[row] = len(order)
+                    continue
+                if self._tin[row] >= 0:
+                    continue
+                self._tin[row] = len(order)
+                order.append(row)
+                stack.append((row, True))
+                stack.extend((c, False) for c in reversed(children.get(row, [])))
+        self._order = np.asarray(order, dtype=np.int64)
+    
+    def _build_adjacency(self):
+        """
+        Row-normalised adjacency D^-1 A over the (undirected) child edges, so
+        scores flow both parent -> child and child -> parent. Each step averages
+        the neighbours' scores, which keeps fused scores on their original
+        scale and the t_high / t_low thresholds meaningful.
+        """
+        n = len(self.nodes)
+        src, tgt = [], []
+        for edge in self.edges:
+            if edge.get('type') != 'child':
+                continue
+            u = self.id_to_row.get(edge['source'])
+            v = self.id_to_row.get(edge['target'])
+            if u is None or v is None or u == v:
+                continue
+            src.extend((u, v))
+            tgt.extend((v, u))
+        adj = sp.csr_matrix((np.ones(len(src), dtype=np.float32), (src, tgt)), shape=(n, n))
+        adj.sum_duplicates()
+        adj.data[:] = 1.0
+        degree = np.asarray(adj.sum(axis=1)).ravel()
+        inv = np.zeros(n, dtype=np.float32)
+        inv[degree > 0] = 1.0 / degree[degree > 0]
+        self._adjacency = (sp.diags(inv) @ adj).tocsr()
+    
+    def _smooth_scores(self, scores: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """
+        A few personalised-PageRank steps, s <- (1 - d) * s0 + d * P @ s,
+        seeded with the fused scores. For a row subset only the induced sub-graph is used, so scoped
+        searches stay proportional to the scope.
+        """
+        if self.smoothing_steps <= 0 or self._adjacency.nnz == 0:
+            return scores
+        adjacency = self._adjacency if rows is None else self._adjacency[rows][:, rows]
+        # Probability mass of edges leaving the scored rows (or of isolated
+        # nodes) stays on the node itself instead of leaking away.
+        stay = 1.0 - np.asarray(adjacency.sum(axis=1)).ravel()
+        d = self.smoothing_damping
+        seed = (1.0 - d) * scores
+        smoothed = scores
+        for _ in range(self.smoothing_steps):
+            smoothed = seed + d * (adjacency @ smoothed + stay * smoothed)
+        return smoothed
+    
+    def _subtree_rows(self, node_id: str) -> np.ndarray:
+        """Rows of `node_id`'s descendants (the node itself excluded)."""
+        row = self.id_to_row.get(node_id)
+        if row is None:
+            raise ValueError(f"Unknown node id: {node_id}")
+        return self._order[self._tin[row] + 1:self._tout[row]]
+    
+    def _build_facets(self):
+        """Precompute one boolean row mask ("bitmap") per facet value."""
+        self.facets: Dict[str, Dict[str, np.ndarray]] = {}
+        for field in self.facet_fields:
+            masks: Dict[str, np.ndarray] = {}
+            for i, node in enumerate(self.nodes):
+                value = node.get(field)
+                if value in (None, "", []):
+                    continue
+                for v in (value if isinstance(value, (list, tuple, set)) else [value]):
+                    mask = masks.get(str(v))
+                    if mask is None:
+                        mask = masks[str(v)] = np.zeros(len(self.nodes), dtype=bool)
+                    mask[i] = True
+            self.facets[field] = masks
+    
+    def _facet_mask(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        AND across facet fields, OR across the values of one field.
+        Returns None when no filter applies (i.e. every row is allowed).
+        """
+        if not filters:
+            return None
+        mask = None
+        for field, wanted in filters.items():
+            if field not in self.facets:
+                raise ValueError(f"Unknown facet field: {field}")
+            if wanted in (None, "", []):
+                continue
+            values = list(wanted) if isinstance(wanted, (list, tuple, set)) else [wanted]  # as in _build_facets
+            field_mask = np.zeros(len(self.nodes), dtype=bool)
+            for v in values:
+                value_mask = self.facets[field].get(str(v))
+                if value_mask is not None:
+                    field_mask |= value_mask
+            mask = field_mask if mask is None else (mask & field_mask)
+        return mask
+    
+    def facet_counts(self, field: str, filters: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+        """Count nodes per value of `field`, optionally within other facet filters."""
+        if field not in self.facets:
+            raise ValueError(f"Unknown facet field: {field}")
+        mask = self._facet_mask(filters)
+        return {
+            value: int(value_mask.sum() if mask is None else np.count_nonzero(value_mask & mask))
+            for value, value_mask in sorted(self.facets[field].items())
+        }
+    
+    def facet_node_ids(self, filters: Dict[str, Any]) -> List[str]:
+        """Node ids matching the facet filters, read straight from the masks."""
+        mask = self._facet_mask(filters)
+        if mask is None:
+            return []
+        return [self.nodes[i]['id'] for i in np.flatnonzero(mask)]
+    
+    def build_suggest_index(self, popularity: Optional[Dict[str, float]] = None) -> PrefixIndex:
+        """
+        (Re)build the type-ahead index: labels ranked by popularity (node id ->
+        score, e.g. from click logs), then depth and subtree size; label and
+        content words by document frequency.
+        """
+        depths = np.zeros(len(self.nodes), dtype=np.int64)
+        for row in self._order:  # pre-order: parents come before children
+            parent = self._parent_row.get(int(row))
+            depths[row] = depths[parent] + 1 if parent is not None else 0
+        self._suggest_index = PrefixIndex(graph_suggestions(
+            self.nodes, depths.tolist(), (self._tout - self._tin).tolist(),
+            term_frequencies(self.nodes), popularity))
+        return self._suggest_index
+    
+    def suggest(self, prefix: str, k: int = 8) -> List[Suggestion]:
+        """Completions for a partly typed query (labels, then content terms); no model call."""
+        index = self._suggest_index or self.build_suggest_index()
+        return index.complete(prefix, k)
     
     def _get_parent(self, node: dict) -> Optional[dict]:
         """Find the parent node if it exists."""
-        if not hasattr(self, 'edges'):
-            return None
-            
-        for edge in self.edges:
-            if edge['target'] == node['id'] and edge.get('type') == 'child':
-                return next((n for n in self.nodes if n['id'] == edge['source']), None)
-        return None
+        row = self.id_to_row.get(node['id'])
+        parent_row = self._parent_row.get(row) if row is not None else None
+        return self.nodes[parent_row] if parent_row is not None else None
         
     def _normalize_text(self, text: str) -> str:
         """Normalize text by lowercasing and removing special characters."""
@@ -60,8 +502,44 @@ class GraphSearcher:
         return text
     
     def _tokenize(self, text: str) -> List[str]:
-        """Tokenize text into words."""
-        return self._normalize_text(text).split()
+        """
+        Tokenize text into words. Version/number tokens keep their dots
+        ("1.8", "v2.1.0" -> "2.1.0"); elsewhere special characters are dropped.
+        """
+        tokens = []
+        for word in re.sub(r'[^a-z0-9\s.]', '', text.lower()).split():
+            version = _VERSION_TOKEN.fullmatch(word.strip('.'))
+            word = version.group(1) if version else word.replace('.', '')
+            if word:
+                tokens.append(word)
+        return tokens
+    
+    def _phrases(self, query: str) -> List[List[str]]:
+        """Token lists of the double-quoted phrases in the query (2+ tokens each)."""
+        return [tokens for tokens in map(self._tokenize, _PHRASE.findall(query)) if len(tokens) > 1]
+    
+    def _phrase_scores(self, phrases: List[List[str]], rows: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Extra raw BM25 credit for rows containing each exact phrase: the sum of
+        the phrase terms' idf, found by merging positional postings.
+        """
+        n = len(self.nodes) if rows is None else len(rows)
+        extra = np.zeros(n)
+        for phrase in phrases:
+            docs = self.positions.phrase_docs(phrase)
+            if not len(docs):
+                continue
+            boost = float(sum(self.bm25.idf[self.bm25.vocab[w]] for w in phrase))
+            if rows is None:
+                extra[docs] += boost
+            else:
+                extra[np.isin(rows, docs)] += boost
+        return extra
+    
+    def _query_tokens(self, query: str) -> List[str]:
+        """BM25 tokens for an (acronym-expanded) query, misspelled terms corrected."""
+        tokens = self._tokenize(query)
+        return self.spell.correct(tokens) if self.spell_correct else tokens
     
     def _prepare_text(self, node: dict) -> str:
         """Prepare node text with hierarchical context for search."""
@@ -103,53 +581,238 @@ class GraphSearcher:
         expanded_words = [acronyms.get(word.lower(), word) for word in words]
         return ' '.join(expanded_words)
     
-    def search(self, query: str) -> Tuple[Optional[SearchResult], List[SearchResult]]:
+    def _candidate_rows(self, filters: Optional[Dict[str, Any]] = None,
+                        within: Optional[str] = None) -> Optional[np.ndarray]:
+        """Rows allowed by `within` and the facet filters; None means all rows."""
+        mask = self._facet_mask(filters)
+        if within is not None:
+            rows = self._subtree_rows(within)
+            return rows if mask is None else rows[mask[rows]]
+        return None if mask is None else np.flatnonzero(mask)
+    
+    def _get_reranker(self):
+        """Load the cross-encoder lazily; most deployments never rerank."""
+        if self._reranker is None:
+            from sentence_transformers import CrossEncoder  # imports torch
+            self._reranker = CrossEncoder(self.rerank_model, device='cpu')
+        return self._reranker
+    
+    def _rerank_text(self, node: dict) -> str:
+        """Full label + content for the cross-encoder (it truncates itself)."""
+        return f"{node.get('label', '').strip()}. {node.get('content', '').strip()}"
+    
+    def _rerank(self, query: str, results: List[SearchResult]) -> List[SearchResult]:
+        """Score (query, node) pairs in one batched cross-encoder call and reorder."""
+        logits = self._get_reranker().predict(
+            [(query, self._rerank_text(r.node_data)) for r in results],
+            batch_size=self.rerank_batch_size,
+            show_progress_bar=False,
+        )
+        probs = 1.0 / (1.0 + np.exp(-np.asarray(logits, dtype=np.float64)))
+        for r, p in zip(results, probs):
+            r.rerank_score = float(p)
+        return sorted(results, key=lambda r: r.rerank_score, reverse=True)
+    
+    def _lexical_scores(self, query: str, query_tokens: List[str],
+                        rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """BM25 plus the phrase boost for an acronym-expanded query, min-max normalised for fusion."""
+        if rows is None:
+            scores = self.bm25.get_scores(query_tokens)
+        else:
+            scores = self.bm25.get_batch_scores(query_tokens, rows)
+        phrases = self._phrases(query)
+        if phrases:
+            scores = scores + self._phrase_scores(phrases, rows)
+        if scores.max() > scores.min():  # Avoid division by zero
+            scores = (scores - scores.min()) / (scores.max() - scores.min())
+        return scores
+    
+    def _deadline_left_ms(self, deadline: Optional[float]) -> float:
+        """Milliseconds left before `deadline` (a perf_counter value); inf if none."""
+        if deadline is None:
+            return float('inf')
+        return (deadline - time.perf_counter()) * 1000.0
+    
+    def search(self, query: str, filters: Optional[Dict[str, Any]] = None,
+               within: Optional[str] = None, deadline_ms: Optional[float] = None,
+               rerank: bool = True, query_embedding: Optional[np.ndarray] = None) -> SearchResponse:
         """
         Search for nodes matching the query.
-        Returns (best_match, all_matches_above_threshold)
+        `filters` maps facet fields to one or more allowed values, e.g.
+        {"end_user": ["All", "business analyst"]}; `within` limits the search
+        to the descendants of that node id. Only the allowed rows are scored.
+        
+        With `deadline_ms`, the cheap lexical stage always runs first; the dense
+        stage only starts if the recent encode time fits in the remaining budget,
+        and scores rows in chunks until the deadline. Rows the dense stage did
+        not reach are ranked on BM25 alone and never become the best match.
+        Smoothing and the rerank are skipped once the budget is spent. Any
+        skipped stage marks the response `degraded`, and it is not cached.
+        
+        If `candidate_pool` is set, only the top M fused hits are kept, taken
+        before any threshold. With a `rerank_model` (and `rerank=True`) those M
+        are reordered by a cross-encoder in one batch and all M are returned;
+        the head is the best match if its rerank_score (0-1) reaches
+        `rerank_t_high`. Without a rerank, `t_low` / `t_high` apply to the
+        fused score as usual.
+        
+        `query_embedding` (from encode_queries) skips the per-query encode, so
+        callers can batch-encode many queries in one model call.
+        
+        Returns a SearchResponse, which unpacks as (best_match, all_matches_above_threshold)
         """
-        # Preprocess query
+        started = time.perf_counter()
+        cache_key = self._cache_key(query, filters, within, rerank=rerank) if self.cache_size > 0 else None
+        if cache_key is not None:
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached.from_cache(started)
+        deadline = started + deadline_ms / 1000.0 if deadline_ms is not None else None
+        timings: Dict[str, float] = {}
+        stages: List[str] = []
+        
+        rows = self._candidate_rows(filters, within)
+        if rows is not None and len(rows) == 0:
+            return SearchResponse(None, [], stages, timings)
+        n_rows = len(self.nodes) if rows is None else len(rows)
+        
+        # Lexical stage: preprocess query + BM25
+        t0 = time.perf_counter()
         query = self._expand_acronyms(query)
-        query_tokens = self._tokenize(query)
-        
-        # Get BM25 scores
-        bm25_scores = self.bm25.get_scores(query_tokens)
-        if bm25_scores.max() > bm25_scores.min():  # Avoid division by zero
-            bm25_scores = (bm25_scores - bm25_scores.min()) / (bm25_scores.max() - bm25_scores.min())
-        
-        # Get embedding similarity
-        with torch.no_grad():  # Disable gradient calculation
-            query_embedding = self.model.encode(
-                query, 
-                convert_to_tensor=True
-            ).cpu().numpy()  # Convert to numpy array
+        query_tokens = self._query_tokens(query)
+        timings['preprocess'] = (time.perf_counter() - t0) * 1000.0
+        t0 = time.perf_counter()
+        bm25_scores = self._lexical_scores(query, query_tokens, rows)
+        timings['bm25'] = (time.perf_counter() - t0) * 1000.0
+        stages.append('lexical')
+        
+        # Dense stage: only if the last observed encode time fits the budget
+        similarities = np.zeros(n_rows, dtype=np.float32)
+        dense_done = 0
+        if query_embedding is not None or self._deadline_left_ms(deadline) > (self._encode_ms or 0.0):
+            if query_embedding is None:
+                t0 = time.perf_counter()
+                query_embedding = np.asarray(self.model.encode(query, convert_to_numpy=True), dtype=np.float32)
+                encode_ms = (time.perf_counter() - t0) * 1000.0
+                self._encode_ms = encode_ms if self._encode_ms is None else 0.8 * self._encode_ms + 0.2 * encode_ms
+                timings['encode'] = encode_ms
             
-            # Calculate cosine similarity
-            similarities = cosine_similarity(
-                query_embedding.reshape(1, -1),
-                self.embeddings
-            )[0]
+            # Cosine similarity, chunk by chunk so a deadline can cut it short
+            t0 = time.perf_counter()
+            query_norm = max(float(np.linalg.norm(query_embedding)), 1e-12)
+            for lo in range(0, n_rows, self.dense_chunk_size):
+                if self._deadline_left_ms(deadline) <= 0:
+                    break
+                hi = min(lo + self.dense_chunk_size, n_rows)
+                chunk = slice(lo, hi) if rows is None else rows[lo:hi]
+                similarities[lo:hi] = (self.embeddings[chunk] @ query_embedding) / (
+                    self._embedding_norms[chunk] * query_norm)
+                dense_done = hi
+            timings['dense'] = (time.perf_counter() - t0) * 1000.0
+            if dense_done == n_rows:
+                stages.append('dense')
         
-        # Combine scores
+        # Combine scores; rows without a dense score fall back to BM25 on the full weight
         combined_scores = (self.alpha * bm25_scores) + (self.beta * similarities)
+        if dense_done < n_rows:
+            combined_scores[dense_done:] = (self.alpha + self.beta) * bm25_scores[dense_done:]
+        
+        degraded = dense_done < n_rows  # any stage the deadline skips sets this
+        
+        # Optionally let scores flow along the graph edges
+        if self.smoothing_steps > 0 and self._deadline_left_ms(deadline) <= 0:
+            degraded = True
+        elif self.smoothing_steps > 0:
+            t0 = time.perf_counter()
+            combined_scores = self._smooth_scores(combined_scores, rows)
+            timings['smoothing'] = (time.perf_counter() - t0) * 1000.0
+            stages.append('smoothing')
         
-        # Get all results above threshold
+        # First stage: the top-M fused candidates, cut before any threshold so the
+        # reranker can still promote rows below t_low; without a pool, every row above t_low
+        t0 = time.perf_counter()
+        if self.candidate_pool is None:
+            hits = np.flatnonzero(combined_scores >= self.t_low)
+        elif n_rows > self.candidate_pool:
+            hits = np.argpartition(-combined_scores, self.candidate_pool - 1)[:self.candidate_pool]
+        else:
+            hits = np.arange(n_rows)
+        hits = hits[np.argsort(-combined_scores[hits], kind='stable')]
         results = []
-        for i, score in enumerate(combined_scores):
-            if score >= self.t_low:
-                results.append(SearchResult(
-                    node_id=self.nodes[i]['id'],
-                    score=float(score),
-                    node_data=self.nodes[i]
-                ))
+        for j in hits:
+            i = j if rows is None else rows[j]
+            results.append(SearchResult(
+                node_id=self.nodes[i]['id'],
+                score=float(combined_scores[j]),
+                node_data=self.nodes[i]
+            ))
+        dense_scored = {r.node_id for r, j in zip(results, hits) if j < dense_done}
+        timings['retrieve'] = (time.perf_counter() - t0) * 1000.0
         
-        # Sort by score descending
-        results.sort(key=lambda x: x.score, reverse=True)
+        # Second stage: cross-encoder rerank of the candidates, budget permitting
+        reranked = False
+        if (rerank and self.rerank_model and len(results) > 1
+                and self._deadline_left_ms(deadline) <= (self._rerank_ms or 0.0)):
+            degraded = True
+        elif rerank and self.rerank_model and len(results) > 1:
+            t0 = time.perf_counter()
+            results = self._rerank(query, results)
+            rerank_ms = (time.perf_counter() - t0) * 1000.0
+            self._rerank_ms = rerank_ms if self._rerank_ms is None else 0.8 * self._rerank_ms + 0.2 * rerank_ms
+            timings['rerank'] = rerank_ms
+            stages.append('rerank')
+            reranked = True
         
-        # Determine best match
-        best_match = results[0] if results and results[0].score >= self.t_high else None
+        # Thresholds: reranked lists are judged on the cross-encoder score, the
+        # rest on the fused score. A row the dense stage skipped is never the best match.
+        if reranked:
+            confident = lambda r: r.rerank_score >= self.rerank_t_high
+        else:
+            results = [r for r in results if r.score >= self.t_low]
+            confident = lambda r: r.score >= self.t_high
+        best_match = results[0] if results and confident(results[0]) and results[0].node_id in dense_scored else None
         
-        return best_match, results
+        timings['total'] = (time.perf_counter() - started) * 1000.0
+        response = SearchResponse(best_match, results, stages, timings, degraded=degraded)
+        if METRICS.enabled:
+            self._record_metrics(response)
+        # The key has no deadline: only full answers are cached, a later one replaces a degraded one
+        if cache_key is not None and not degraded:
+            self.result_cache.put(cache_key, response)
+        return response
+    
+    def encode_queries(self, queries: Sequence[str]) -> np.ndarray:
+        """One model call for many queries (acronyms expanded as in search)."""
+        return np.asarray(self.model.encode(
+            [self._expand_acronyms(q) for q in queries],
+            convert_to_numpy=True
+        ), dtype=np.float32)
+    
+    def nearest(self, query_embeddings: np.ndarray, k: int = 3) -> List[List[SearchResult]]:
+        """Top-k nodes by cosine similarity for each row of `query_embeddings`."""
+        q = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+        sims = q @ self.embeddings.T  # embeddings are unit-normalised
+        k = min(k, sims.shape[1])
+        if k <= 0:
+            return [[] for _ in range(len(q))]
+        out = []
+        for row in sims:
+            top = np.argpartition(-row, k - 1)[:k] if k < len(row) else np.arange(len(row))
+            top = top[np.argsort(-row[top], kind='stable')]
+            out.append([SearchResult(node_id=self.nodes[i]['id'], score=float(row[i]), node_data=self.nodes[i])
+                        for i in top])
+        return out
+    
+    def _record_metrics(self, response: SearchResponse):
+        """Push one query's stage timings and counters into the metrics registry."""
+        for stage, ms in response.timings_ms.items():
+            METRICS.observe('search_stage_ms', ms, stage=stage)
+        METRICS.inc('search_queries_total')
+        if response.best_match is not None:
+            METRICS.inc('search_best_match_total')
+        if response.degraded:
+            METRICS.inc('search_degraded_total')
 
 # Example usage
 if __name__ == "__main__":
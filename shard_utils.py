@@ -0,0 +1,198 @@
+# shard_utils.py
+# Multi-process sharded search: the node set is split across N worker
+# processes, each holding its embedding slice and a BM25 shard scored with
+# the global IDF / avgdl (BM25Index.shard). Queries fan out over pipes and the per-shard
+# results merge exactly into what a single GraphSearcher would return.
+# Each worker serves `concurrency` lanes (one pipe + thread per lane), so up to
+# that many searches are in flight at once; the query encode stays in the
+# calling thread (pass query_embedding from encode_queries to batch it).
+import dataclasses
+import multiprocessing as mp
+import queue
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from metrics_utils import REGISTRY as METRICS
+
+def _shard_worker(conns, shard: Dict[str, Any]):
+    """One thread per lane; the shard arrays are shared read-only between them."""
+    threads = [threading.Thread(target=_serve_lane, args=(conn, shard), daemon=True) for conn in conns]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def _serve_lane(conn, shard: Dict[str, Any]):
+    """Lane loop. Two-phase protocol so BM25 min-max uses global bounds."""
+    bm25 = shard["bm25"]             # rows renumbered, global idf / avgdl
+    embeddings = shard["embeddings"]
+    norms = shard["norms"]
+    offset = shard["offset"]
+    raw = dense = None
+    while True:
+        msg = conn.recv()
+        op = msg[0]
+        if op == "score":
+            _, tokens, query_vec, query_norm = msg
+            raw = np.asarray(bm25.get_scores(tokens))
+            # Same arithmetic and float32 storage as GraphSearcher.search
+            dense = ((embeddings @ query_vec) / (norms * query_norm)).astype(np.float32)
+            conn.send((float(raw.min()), float(raw.max())))
+        elif op == "topk":
+            _, lo, hi, alpha, beta, t_low, k = msg
+            bm = (raw - lo) / (hi - lo) if hi > lo else raw
+            fused = alpha * bm + beta * dense
+            idx = np.flatnonzero(fused >= t_low)
+            if k is not None and len(idx) > k:
+                idx = idx[np.argpartition(-fused[idx], k - 1)[:k]]
+            conn.send((idx + offset, fused[idx]))
+        elif op == "close":
+            conn.close()
+            return
+
+class ShardedSearcher:
+    """
+    Scatter-gather front end over a built GraphSearcher. The local searcher
+    keeps the model (one query encode per search) and serves in-process every
+    search the workers cannot reproduce exactly: facet/subtree scopes,
+    phrases, deadlines, precomputed embeddings, graph smoothing and the
+    candidate pool / rerank stage. Plain fused searches are scored by the
+    shard workers. Other attributes (facet_counts, ...) are delegated to the
+    local searcher.
+    
+    `concurrency` searches run on the workers at once, each on its own lane
+    (a pipe to every shard); further callers wait for a free lane.
+    """
+    def __init__(self, searcher, n_shards: int = 2, mp_context: str = "spawn", concurrency: int = 4):
+        self._searcher = searcher
+        n = len(searcher.nodes)
+        self.n_shards = max(1, min(n_shards, n))
+        self.concurrency = max(1, concurrency)
+        self._lock = threading.Lock()
+        self._closed = False
+        ctx = mp.get_context(mp_context)
+        bounds = np.linspace(0, n, self.n_shards + 1).astype(int)
+        lanes = [[] for _ in range(self.concurrency)]  # lane -> one pipe per shard
+        self._procs = []
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            shard = {
+                "bm25": searcher.bm25.shard(int(lo), int(hi)),
+                "embeddings": np.ascontiguousarray(searcher.embeddings[lo:hi]),
+                "norms": np.ascontiguousarray(searcher._embedding_norms[lo:hi]),
+                "offset": int(lo),
+            }
+            pipes = [ctx.Pipe() for _ in range(self.concurrency)]
+            proc = ctx.Process(target=_shard_worker, args=([child for _, child in pipes], shard),
+                               daemon=True, name=f"kg-shard-{len(self._procs)}")
+            proc.start()
+            for lane, (parent_conn, child_conn) in zip(lanes, pipes):
+                child_conn.close()
+                lane.append(parent_conn)
+            self._procs.append(proc)
+        # Free lanes; after close() it holds a single None
+        self._free: "queue.Queue[Optional[list]]" = queue.Queue()
+        for lane in lanes:
+            self._free.put(lane)
+
+    def __getattr__(self, name: str):
+        return getattr(self._searcher, name)
+
+    def search(self, query: str, filters: Optional[Dict[str, Any]] = None,
+               within: Optional[str] = None, k: Optional[int] = None, deadline_ms: Optional[float] = None,
+               rerank: bool = True, query_embedding: Optional[np.ndarray] = None):
+        """Same contract as GraphSearcher.search; `k` caps the merged result list."""
+        from search_utils import SearchResponse, SearchResult
+
+        s = self._searcher
+        if (self._closed or filters or within is not None or deadline_ms is not None or s.smoothing_steps > 0
+                or s.candidate_pool is not None or (rerank and s.rerank_model) or s._phrases(query)):
+            response = s.search(query, filters=filters, within=within, deadline_ms=deadline_ms,
+                                rerank=rerank, query_embedding=query_embedding)
+            return response if k is None else dataclasses.replace(response, results=response.results[:k])
+
+        started = time.perf_counter()
+        # Same key as the local path (the merge is exact), so precomputed answers and
+        # local entries are shared; a capped list is cached under its own key
+        cache_key = (s._cache_key(query, None, None, rerank=rerank, **({"k": k} if k is not None else {}))
+                     if s.cache_size > 0 else None)
+        if cache_key is not None:
+            cached = s.result_cache.get(cache_key)
+            if cached is not None:
+                return cached.from_cache(started)
+        timings: Dict[str, float] = {}
+        original_query = query
+        t0 = time.perf_counter()
+        query = s._expand_acronyms(query)
+        tokens = s._query_tokens(query)
+        timings["preprocess"] = (time.perf_counter() - t0) * 1000.0
+        t0 = time.perf_counter()
+        if query_embedding is None:
+            query_vec = np.asarray(s.model.encode(query, convert_to_numpy=True), dtype=np.float32)
+            timings["encode"] = (time.perf_counter() - t0) * 1000.0
+        else:
+            query_vec = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = max(float(np.linalg.norm(query_vec)), 1e-12)
+
+        t0 = time.perf_counter()
+        lane = self._free.get()
+        if lane is None:  # closed since the check above
+            self._free.put(None)
+            response = s.search(original_query, rerank=rerank, query_embedding=query_vec)
+            return response if k is None else dataclasses.replace(response, results=response.results[:k])
+        try:
+            for conn in lane:
+                conn.send(("score", tokens, query_vec, query_norm))
+            bounds = [conn.recv() for conn in lane]
+            lo = min(b[0] for b in bounds)
+            hi = max(b[1] for b in bounds)
+            for conn in lane:
+                conn.send(("topk", lo, hi, s.alpha, s.beta, s.t_low, k))
+            parts = [conn.recv() for conn in lane]
+        finally:
+            self._free.put(lane)
+        timings["scatter_gather"] = (time.perf_counter() - t0) * 1000.0
+
+        t0 = time.perf_counter()
+        rows = np.concatenate([p[0] for p in parts])
+        scores = np.concatenate([p[1] for p in parts])
+        order = np.lexsort((rows, -scores))  # score desc, then row order (matches stable sort)
+        if k is not None:
+            order = order[:k]
+        results = [
+            SearchResult(node_id=s.nodes[r]["id"], score=float(sc), node_data=s.nodes[r])
+            for r, sc in zip(rows[order], scores[order])
+        ]
+        timings["merge"] = (time.perf_counter() - t0) * 1000.0
+        best_match = results[0] if results and results[0].score >= s.t_high else None
+        timings["total"] = (time.perf_counter() - started) * 1000.0
+        response = SearchResponse(best_match, results, ["lexical", "dense"], timings)
+        if METRICS.enabled:
+            s._record_metrics(response)
+        if cache_key is not None:
+            s.result_cache.put(cache_key, response)
+        return response
+
+    def close(self):
+        """Stop the workers (after the in-flight searches); later searches run on the local searcher."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            procs, self._procs = self._procs, []
+        lanes = [self._free.get() for _ in range(self.concurrency)]  # waits for busy lanes
+        self._free.put(None)
+        for lane in lanes:
+            for conn in lane:
+                try:
+                    conn.send(("close",))
+                except (BrokenPipeError, OSError):
+                    pass
+        for proc in procs:
+            proc.join(timeout=5)
+
+    def __del__(self):
+        if getattr(self, "_procs", None):
+            self.close()
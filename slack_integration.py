@@ -28,18 +28,81 @@ def query_rag_api(query: str) -> Dict:
     except Exception as e:
         return {"error": str(e)}
 
+_search_client = None
+
+def _get_search_client():
+    # Shared warm index served by search_service.py (KG_SEARCH_URL)
+    global _search_client
+    if _search_client is None:
+        from search_service import SearchClient
+        _search_client = SearchClient()
+    return _search_client
+
 def find_similar_nodes(query_embedding: list, k: int = 3) -> list:
     """
     Find k most similar nodes using KNN.
     Returns list of node IDs and their similarity scores.
     """
-    # This is a placeholder - implement your KNN logic here
-    # You'll need to access your node embeddings and compute similarities
-    return [{"node_id": "example_id", "score": 0.95, "label": "Example Node"}]
+    try:
+        return _get_search_client().similar(embedding=query_embedding, k=k)
+    except Exception as e:
+        print(f"Error querying search service: {e}")
+        return []
+
+def find_similar_nodes_for_query(query: str, k: int = 3) -> list:
+    """Same as find_similar_nodes, but the service encodes the query text."""
+    try:
+        return _get_search_client().similar(query=query, k=k)
+    except Exception as e:
+        print(f"Error querying search service: {e}")
+        return []
+
+_related_index = None
+_node_labels: Dict[str, str] = {}
+
+def _get_related_index():
+    # Related-nodes file (KG_RELATED_PATH) checked against the current graph:
+    # the index snapshot (KG_INDEX_PATH) if it matches, else the graph is
+    # encoded once. A stale file is rebuilt and rewritten.
+    global _related_index, _node_labels
+    if _related_index is None:
+        from data import NODES, EDGES
+        from related_utils import load_related
+        from search_utils import GraphSearcher
+        snapshot = os.getenv("KG_INDEX_PATH")
+        searcher = None
+        if snapshot and os.path.exists(snapshot):
+            try:
+                searcher = GraphSearcher.load(snapshot, NODES, EDGES)
+            except ValueError as e:
+                print(f"Ignoring stale index snapshot {snapshot}: {e}")
+        if searcher is None:
+            searcher = GraphSearcher(nodes=NODES, edges=EDGES)
+        _node_labels = {n["id"]: n.get("label", n["id"]) for n in NODES}
+        _related_index = load_related(os.getenv("KG_RELATED_PATH"), searcher)
+    return _related_index
+
+def find_related_nodes(node_id: str, k: int = 3) -> list:
+    """
+    Precomputed neighbours of node_id from the related-nodes file
+    (KG_RELATED_PATH, built by related_utils.py). A lookup, no model call.
+    """
+    if not os.getenv("KG_RELATED_PATH"):
+        return []
+    try:
+        return [{"node_id": nid, "label": _node_labels.get(nid, nid), "score": score}
+                for nid, score in _get_related_index().related(node_id, k=k)]
+    except Exception as e:
+        print(f"Error reading related nodes: {e}")
+        return []
 
-def send_slack_review_request(query: str, rag_response: str, similar_nodes: list):
+def send_slack_review_request(query: str, rag_response: str, similar_nodes: list,
+                              related_nodes: Optional[list] = None):
     """Send a message to Slack for human review."""
     try:
+        if related_nodes is None and similar_nodes:
+            related_nodes = find_related_nodes(similar_nodes[0]["node_id"])
+
         # Create blocks for the Slack message
         blocks = [
             {
@@ -84,6 +147,18 @@ def send_slack_review_request(query: str, rag_response: str, similar_nodes: list
                 }
             })
 
+        # Add precomputed neighbours of the top match
+        if related_nodes:
+            blocks.append({
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": "*Related Nodes:*\n" + "\n".join(
+                        f"• {node['label']} (Score: {node['score']:.2f})" for node in related_nodes
+                    )
+                }
+            })
+
         # Add action buttons
         blocks.extend([
             {
@@ -136,15 +211,18 @@ def handle_slack_interaction(payload: dict):
 
         if action.get("action_id") == "approve":
             # Handle approval
-            add_node_to_graph(
+            duplicates = find_near_duplicates(action_value["query"], action_value["answer"])
+            node_id = add_node_to_graph(
                 query=action_value["query"],
                 answer=action_value["answer"],
-                parent_nodes=action_value["similar_nodes"]
+                parent_nodes=action_value["similar_nodes"],
+                duplicates=duplicates
             )
             update_slack_message(
                 channel=payload["channel"]["id"],
                 ts=payload["message_ts"],
-                text="✅ Approved and added to knowledge graph"
+                text=(f"♻️ Approved; near-duplicate of existing node {node_id}, not added"
+                      if duplicates else "✅ Approved and added to knowledge graph")
             )
         
         elif action.get("action_id") == "edit":
@@ -159,8 +237,36 @@ def handle_slack_interaction(payload: dict):
     except Exception as e:
         print(f"Error handling Slack interaction: {e}")
 
-def add_node_to_graph(query: str, answer: str, parent_nodes: list):
-    """Add a new node to the knowledge graph."""
+_dedup_index = None
+
+def _get_dedup_index():
+    # LSH index over the graph's content plus nodes approved in this process
+    global _dedup_index
+    if _dedup_index is None:
+        from dedup_utils import NearDuplicateIndex
+        from data import NODES
+        _dedup_index = NearDuplicateIndex()
+        _dedup_index.add_nodes(NODES)
+    return _dedup_index
+
+def find_near_duplicates(query: str, answer: str) -> list:
+    """Existing nodes that near-duplicate a candidate answer node, most similar first."""
+    from dedup_utils import node_text
+    return _get_dedup_index().query(node_text({"label": query, "content": answer}))
+
+def add_node_to_graph(query: str, answer: str, parent_nodes: list, duplicates: Optional[list] = None):
+    """
+    Add a new node to the knowledge graph. If it near-duplicates an existing
+    node, nothing is added and the existing node's ID is returned.
+    `duplicates` is a find_near_duplicates result the caller already has.
+    """
+    if duplicates is None:
+        duplicates = find_near_duplicates(query, answer)
+    if duplicates:
+        print(f"Not adding near-duplicate of {duplicates[0].node_id} "
+              f"(jaccard {duplicates[0].jaccard:.2f}): {query[:50]}")
+        return duplicates[0].node_id
+
     # Generate a new node ID
     new_node_id = f"node_{int(datetime.now().timestamp())}"
     
@@ -181,6 +287,7 @@ def add_node_to_graph(query: str, answer: str, parent_nodes: list):
     # graph_db.add_node(new_node)
     # for edge in edges:
     #     graph_db.add_edge(edge)
+    _get_dedup_index().add(new_node_id, f"{query} {answer}")
     
     return new_node_id
 
@@ -0,0 +1,62 @@
+# snapshot_utils.py
+# Build the search index offline and ship it as one mmap-able file
+# (bundle_utils layout); replicas start with GraphSearcher.load(path, ...).
+#   python snapshot_utils.py build index.kgidx [--with-knn]
+#   python snapshot_utils.py inspect index.kgidx
+#   python snapshot_utils.py check index.kgidx     # exit 1 if stale
+import argparse
+import os
+import time
+
+from bundle_utils import load_bundle
+
+def build(path: str, with_knn: bool = False):
+    from search_utils import GraphSearcher
+    from data import NODES, EDGES
+
+    t0 = time.perf_counter()
+    searcher = GraphSearcher(nodes=NODES, edges=EDGES)
+    knn = None
+    if with_knn:
+        from knn_utils import GraphKNN
+        knn = GraphKNN(NODES)
+    searcher.save(path, knn=knn)
+    print(f"Built {path} ({os.path.getsize(path) / 1e6:.1f} MB) in {time.perf_counter() - t0:.1f}s")
+
+def inspect(path: str):
+    t0 = time.perf_counter()
+    mm, meta, arrays = load_bundle(path)
+    print(f"{path}: {len(mm) / 1e6:.1f} MB, opened in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    print(f"  fingerprint: {meta.get('fingerprint')}")
+    print(f"  nodes: {len(meta['node_ids'])}  vocab: {len(meta['vocab'])}  bm25: {meta['bm25']}")
+    for name, arr in arrays.items():
+        print(f"  {name:<20} {str(arr.shape):<16} {arr.dtype}")
+
+def check(path: str):
+    """Load against the current data/model and report whether it is usable."""
+    from search_utils import GraphSearcher
+    from data import NODES, EDGES
+
+    t0 = time.perf_counter()
+    try:
+        GraphSearcher.load(path, NODES, EDGES)
+    except ValueError as e:
+        print(f"Stale: {e}")
+        raise SystemExit(1)
+    print(f"OK: loaded in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect a GraphSearcher index snapshot")
+    parser.add_argument("command", choices=["build", "inspect", "check"])
+    parser.add_argument("path")
+    parser.add_argument("--with-knn", action="store_true", help="include GraphKNN embeddings")
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        build(args.path, with_knn=args.with_knn)
+    elif args.command == "inspect":
+        inspect(args.path)
+    else:
+        check(args.path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# spell_utils.py
+# Symmetric-delete spelling correction (SymSpell). At index time every
+# vocabulary term's prefix is expanded into all strings reachable by deleting
+# up to `max_distance` characters; a query term does the same, and any shared
+# delete is a candidate. That is a constant number of dict lookups per term
+# instead of an edit-distance scan over the whole vocabulary.
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal-string-alignment distance (adjacent swaps count 1); limit + 1 once it exceeds limit."""
+    # Shared prefix/suffix never costs anything; most candidates differ in a few characters
+    lo = 0
+    while lo < len(a) and lo < len(b) and a[lo] == b[lo]:
+        lo += 1
+    a, b = a[lo:], b[lo:]
+    while a and b and a[-1] == b[-1]:
+        a, b = a[:-1], b[:-1]
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if not a or not b:
+        return len(a) + len(b)
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            d = prev[j - 1] + (a[i - 1] != b[j - 1])
+            if prev[j] + 1 < d:
+                d = prev[j] + 1
+            if cur[j - 1] + 1 < d:
+                d = cur[j - 1] + 1
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1] and prev2[j - 2] + 1 < d:
+                d = prev2[j - 2] + 1
+            cur[j] = d
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+class SymSpell:
+    def __init__(self, term_counts: Dict[str, int], max_distance: int = 2, prefix_length: int = 7):
+        self.counts = dict(term_counts)
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.deletes: Dict[str, List[str]] = defaultdict(list)
+        for term in self.counts:
+            for d in self._deletes(term[:prefix_length]):
+                self.deletes[d].append(term)
+
+    def updated(self, term_counts: Dict[str, int]) -> "SymSpell":
+        """
+        Dictionary for a new vocabulary: only the deletes of added / removed
+        terms are computed. Lists are copied on write, so this one is unchanged.
+        """
+        new = SymSpell.__new__(SymSpell)
+        new.counts = dict(term_counts)
+        new.max_distance = self.max_distance
+        new.prefix_length = self.prefix_length
+        new.deletes = defaultdict(list, self.deletes)
+        for term in self.counts.keys() - new.counts.keys():
+            for d in self._deletes(term[:self.prefix_length]):
+                rest = [t for t in new.deletes.get(d, ()) if t != term]
+                if rest:
+                    new.deletes[d] = rest
+                else:
+                    del new.deletes[d]
+        for term in new.counts.keys() - self.counts.keys():
+            for d in self._deletes(term[:self.prefix_length]):
+                new.deletes[d] = new.deletes.get(d, []) + [term]
+        return new
+
+    def _deletes(self, word: str, max_distance: Optional[int] = None) -> Set[str]:
+        out, level = {word}, {word}
+        for _ in range(self.max_distance if max_distance is None else max_distance):
+            level = {w[:i] + w[i + 1:] for w in level for i in range(len(w))}
+            out |= level
+        return out
+
+    def lookup(self, word: str, max_distance: int) -> List[Tuple[str, int, int]]:
+        """In-vocabulary (term, distance, count) within max_distance, closest then most frequent first."""
+        max_distance = min(max_distance, self.max_distance)
+        if word in self.counts:
+            return [(word, 0, self.counts[word])]
+        candidates = {t for d in self._deletes(word[:self.prefix_length], max_distance) for t in self.deletes.get(d, ())}
+        hits = []
+        for term in candidates:
+            dist = edit_distance(word, term, max_distance)
+            if dist <= max_distance:
+                hits.append((term, dist, self.counts[term]))
+        return sorted(hits, key=lambda h: (h[1], -h[2], h[0]))
+
+    def correct(self, tokens: Iterable[str], min_length: int = 5, max_expansions: int = 2) -> List[str]:
+        """
+        Replace out-of-vocabulary tokens by their closest terms (up to
+        `max_expansions` ties). Short tokens and tokens with digits (versions) are left alone;
+        distance 2 is only allowed from 8 characters up.
+        """
+        out: List[str] = []
+        for tok in tokens:
+            if tok in self.counts or len(tok) < min_length or any(c.isdigit() for c in tok):
+                out.append(tok)
+                continue
+            hits = self.lookup(tok, 1 if len(tok) < 8 else 2)
+            best = [t for t, dist, _ in hits if dist == hits[0][1]][:max_expansions] if hits else []
+            out.extend(best or [tok])
+        return out
@@ -0,0 +1,97 @@
+# suggest_utils.py
+# Type-ahead completions without the model: a sorted array of lower-cased
+# keys (every label, each label from every word onwards, and frequent label /
+# content words) searched with bisect. Each key's entries are pre-ranked by score, and
+# the top-k for every 1-3 character prefix is precomputed, so short prefixes
+# with huge ranges are O(1) too.
+import math
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+@dataclass
+class Suggestion:
+    text: str
+    score: float
+    node_id: Optional[str] = None  # set for node labels, None for label / content words
+
+_WORD_START = re.compile(r"(?:^|\s)(?=\w)")
+
+def _normalize(text: str) -> str:
+    """Lower-cased words (dots kept for versions like 1.8), single-spaced."""
+    return " ".join(re.findall(r"\w[\w.]*", text.lower()))
+
+def _words(text: str) -> List[str]:
+    """Lower-cased words split at any non-word character ("campaigns—through" -> 2 words)."""
+    return re.findall(r"[^\W_]+", text.lower())
+
+def term_frequencies(nodes: Sequence[Dict]) -> Dict[str, int]:
+    """Document frequency of the words in node labels and content."""
+    term_df: Dict[str, int] = defaultdict(int)
+    for node in nodes:
+        text = " ".join(str(node.get(field) or "") for field in ("label", "content"))
+        for term in set(_words(text)):
+            term_df[term] += 1
+    return dict(term_df)
+
+class PrefixIndex:
+    def __init__(self, entries: Sequence[Suggestion], k_cache: int = 10, cache_depth: int = 3):
+        by_key: Dict[str, List[int]] = defaultdict(list)
+        self.entries = list(entries)
+        for i, entry in enumerate(self.entries):
+            norm = _normalize(entry.text)
+            for m in _WORD_START.finditer(norm):  # "health campaign" is also found by "camp"
+                by_key[norm[m.end():]].append(i)
+        self.keys = sorted(by_key)
+        self._rows = [sorted(set(by_key[key]), key=lambda i: -self.entries[i].score) for key in self.keys]
+        self._cache: Dict[str, List[int]] = {}
+        self.k_cache = k_cache
+        prefixes = {key[:d] for key in self.keys for d in range(1, cache_depth + 1) if len(key) >= d}
+        for p in prefixes:
+            self._cache[p] = self._scan(p, k_cache)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _scan(self, prefix: str, k: int) -> List[int]:
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + "\uffff", lo)
+        seen = {}
+        for rows in self._rows[lo:hi]:
+            for i in rows:
+                if i not in seen:
+                    seen[i] = self.entries[i].score
+        return sorted(seen, key=lambda i: -seen[i])[:k]
+
+    def complete(self, prefix: str, k: int = 8) -> List[Suggestion]:
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+        rows = self._cache.get(prefix) if k <= self.k_cache else None
+        if rows is None:
+            rows = self._scan(prefix, k)
+        return [self.entries[i] for i in rows[:k]]
+
+def graph_suggestions(nodes: Sequence[Dict], depths: Sequence[int], subtree_sizes: Sequence[int],
+                      term_df: Dict[str, int], popularity: Optional[Dict[str, float]] = None,
+                      max_terms: int = 5000, min_term_len: int = 4) -> List[Suggestion]:
+    """
+    Node labels ranked by popularity (if given), then shallow / large
+    subtrees first; words by document frequency, always below labels.
+    """
+    popularity = popularity or {}
+    entries = []
+    for node, depth, size in zip(nodes, depths, subtree_sizes):
+        label = str(node.get("label", "")).strip()
+        if label:
+            score = 2.0 + popularity.get(node["id"], 0.0) + (1.0 + math.log1p(size) / 10.0) / (1 + depth)
+            entries.append(Suggestion(label, score, node["id"]))
+    labels = {_normalize(e.text) for e in entries}
+    terms = [(t, df) for t, df in term_df.items()
+             if len(t) >= min_term_len and not t.isdigit() and t not in labels]
+    terms.sort(key=lambda x: -x[1])
+    top = terms[0][1] if terms else 1
+    entries += [Suggestion(t, df / top, None) for t, df in terms[:max_terms]]
+    return entries
@@ -0,0 +1,56 @@
+# Shared fixtures: a deterministic bag-of-words encoder stands in for the
+# sentence-transformer so the tests run offline and fast.
+import os
+import re
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class HashEncoder:
+    """Hashed word counts, same encode() surface as SentenceTransformer."""
+    dim = 64
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def parameters(self):  # memory_utils.module_bytes
+        return []
+
+    def buffers(self):
+        return []
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        single = isinstance(texts, str)
+        out = np.zeros((1 if single else len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate([texts] if single else texts):
+            for word in re.findall(r"\w+", text.lower()):
+                out[i, zlib.crc32(word.encode()) % self.dim] += 1.0
+            out[i, -1] += 0.1  # no all-zero rows
+        if kwargs.get("normalize_embeddings"):
+            out /= np.linalg.norm(out, axis=1, keepdims=True)
+        return out[0] if single else out
+
+@pytest.fixture(autouse=True)
+def hash_encoder(monkeypatch):
+    import encoder_utils
+    import knn_utils
+    import search_utils
+
+    encoder = HashEncoder()
+    for module in (encoder_utils, knn_utils, search_utils):
+        monkeypatch.setattr(module, "load_encoder", lambda *a, **k: encoder)
+    return encoder
+
+@pytest.fixture(scope="session")
+def graph():
+    from bench.synthetic import generate_graph
+    return generate_graph(3000, seed=0)
+
+@pytest.fixture(scope="session")
+def queries(graph):
+    from bench.synthetic import sample_queries
+    return sample_queries(graph[0], 20, seed=1)
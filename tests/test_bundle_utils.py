@@ -0,0 +1,76 @@
+import uuid
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from bundle_utils import attach_shared, bundle_size, read_bundle, write_bundle
+from knn_utils import GraphKNN
+from search_utils import GraphSearcher
+
+# A segment closed while numpy views still point into it raises BufferError from __del__
+pytestmark = pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+
+@pytest.fixture
+def segment_name():
+    name = f"kgtest_{uuid.uuid4().hex[:12]}"
+    yield name
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+        shm.close()
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+def test_bundle_round_trip():
+    arrays = {"a": np.arange(10, dtype=np.float32), "b": np.ones((3, 4), dtype=np.int64)}
+    buf = bytearray(bundle_size(arrays, {"x": 1}))
+    write_bundle(buf, arrays, {"x": 1})
+    meta, out = read_bundle(buf)
+    assert meta == {"x": 1}
+    assert np.array_equal(out["a"], arrays["a"]) and np.array_equal(out["b"], arrays["b"])
+
+def test_attach_rejects_unfinished_segment(segment_name):
+    shm = shared_memory.SharedMemory(name=segment_name, create=True, size=4096)  # zero-filled, no magic yet
+    try:
+        with pytest.raises(ValueError, match="incomplete"):
+            attach_shared(segment_name, wait_s=0.1)
+    finally:
+        shm.close()
+
+def test_searcher_from_shared_matches_and_checks_fingerprint(graph, segment_name):
+    nodes, edges = graph
+    nodes = nodes[:300]
+    searcher = GraphSearcher(nodes, edges, cache_size=0)
+    shm = searcher.publish_shared(segment_name)
+    try:
+        attached = GraphSearcher.from_shared(segment_name, nodes, edges, cache_size=0)
+        query = "campaign dashboard"
+        assert [(r.node_id, r.score) for r in attached.search(query).results] == \
+               [(r.node_id, r.score) for r in searcher.search(query).results]
+        edited = [dict(n) for n in nodes]
+        edited[0]["label"] = "Renamed"
+        with pytest.raises(ValueError, match="fingerprint"):
+            GraphSearcher.from_shared(segment_name, edited, edges)
+        with pytest.raises(FileExistsError):
+            searcher.publish_shared(segment_name)
+    finally:
+        shm.close()
+
+def test_knn_from_shared_checks_fingerprint(graph, segment_name):
+    nodes, edges = graph
+    nodes = nodes[:200]
+    searcher = GraphSearcher(nodes, edges)
+    knn = GraphKNN(nodes)
+    shm = searcher.publish_shared(segment_name, knn=knn)
+    try:
+        attached = GraphKNN.from_shared(segment_name, nodes)
+        assert np.array_equal(attached.node_embeddings, knn.node_embeddings)
+        with pytest.raises(ValueError, match="fingerprint"):
+            GraphKNN.from_shared(segment_name, nodes, embedding_model_name="other-model")
+        edited = [dict(n) for n in nodes]
+        edited[1]["label"] = "Renamed"
+        with pytest.raises(ValueError, match="fingerprint"):
+            GraphKNN.from_shared(segment_name, edited)
+    finally:
+        shm.close()
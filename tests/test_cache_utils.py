@@ -0,0 +1,50 @@
+from cache_utils import ResultCache
+from search_utils import GraphSearcher
+
+def test_lru_evicts_oldest_and_keeps_pinned():
+    cache = ResultCache(maxsize=2)
+    cache.pin("p", "pinned")
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # a is now most recent
+    cache.put("c", 3)
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert cache.get("p") == "pinned"
+    assert cache.stats()["size"] == 2 and cache.stats()["pinned"] == 1
+
+def test_zero_size_cache_stores_nothing():
+    cache = ResultCache(maxsize=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None and len(cache) == 0
+
+def test_repeat_search_is_served_from_cache(graph):
+    nodes, edges = graph
+    searcher = GraphSearcher(nodes[:300], edges)
+    first = searcher.search("campaign dashboard")
+    second = searcher.search("Campaign  dashboard")  # same normalised query
+    assert second.stages == ["cache"]
+    assert [r.node_id for r in second.results] == [r.node_id for r in first.results]
+    assert searcher.is_cached("campaign dashboard")
+    assert not searcher.is_cached("campaign dashboard", within=nodes[0]["id"])
+
+def test_index_change_invalidates_cache(graph):
+    nodes, edges = graph
+    searcher = GraphSearcher(nodes[:300], edges)
+    searcher.search("stock inventory")
+    version = searcher.index_version
+    searcher._index_changed()
+    assert searcher.index_version != version
+    assert not searcher.is_cached("stock inventory")
+    assert searcher.search("stock inventory").stages != ["cache"]
+
+def test_updated_searcher_does_not_serve_old_results(graph):
+    nodes, edges = graph
+    searcher = GraphSearcher(nodes[:300], edges)
+    searcher.search("stock inventory")
+    edited = [dict(n) for n in nodes[:300]]
+    edited[0]["label"] = "Stock Inventory Ledger"
+    updated = searcher.updated(edited, edges)
+    assert updated.index_version != searcher.index_version
+    response = updated.search("stock inventory")
+    assert response.stages != ["cache"]
+    assert edited[0]["id"] in [r.node_id for r in response.results]
@@ -0,0 +1,33 @@
+from dedup_utils import NearDuplicateIndex, node_text
+
+NODES = [
+    {"id": "stock", "label": "Stock management",
+     "content": "Track vaccine stock levels at every warehouse and health facility, record receipts and "
+                "issues, and raise alerts when stock falls below the minimum level."},
+    {"id": "attendance", "label": "Attendance",
+     "content": "Campaign supervisors mark daily attendance for field workers and approve the muster roll "
+                "before payments are processed."},
+]
+
+def _index():
+    index = NearDuplicateIndex()
+    index.add_nodes(NODES)
+    return index
+
+def test_light_paraphrase_is_flagged():
+    paraphrase = {"label": "Stock management",
+                  "content": "Tracks vaccine stock levels at each warehouse and health facility, records receipts "
+                             "and issues, and raises alerts when stock falls below the minimum level."}
+    matches = _index().query(node_text(paraphrase))
+    assert [m.node_id for m in matches] == ["stock"]
+    assert matches[0].jaccard >= 0.7
+
+def test_unrelated_node_is_not_flagged():
+    unrelated = {"label": "Household registration",
+                 "content": "Enumerators register households and beneficiaries during the door to door campaign."}
+    assert _index().query(node_text(unrelated)) == []
+
+def test_banding_catches_pairs_at_the_threshold():
+    index = NearDuplicateIndex()
+    assert (index.bands, index.rows) == (32, 4)
+    assert 1 - (1 - 0.7 ** index.rows) ** index.bands > 0.99
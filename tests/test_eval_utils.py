@@ -0,0 +1,18 @@
+import numpy as np
+
+from eval_utils import compute_score_matrices
+from search_utils import GraphSearcher
+
+def test_score_matrices_match_search(graph):
+    nodes, edges = graph
+    searcher = GraphSearcher(nodes[:500], edges, cache_size=0)
+    labels = [{"query": q, "relevant": []} for q in
+              ("campaign dashbord", '"stock management" reports', "what is hcm", "beneficiary registration")]
+    m = compute_score_matrices(searcher, labels)
+    fused = searcher.alpha * m.bm25 + searcher.beta * m.dense
+    for i, row in enumerate(labels):
+        response = searcher.search(row["query"])
+        assert response.results
+        row_of = searcher.id_to_row
+        got = np.array([fused[i, row_of[r.node_id]] for r in response.results])
+        assert np.allclose(got, [r.score for r in response.results], atol=1e-5), row["query"]
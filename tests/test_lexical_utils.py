@@ -0,0 +1,30 @@
+import numpy as np
+
+from lexical_utils import BM25Index, PositionalIndex
+
+CORPUS = [
+    ["stock", "count", "report", "for", "district", "stores"],
+    ["count", "the", "stock", "report"],
+    ["daily", "report", "stock"],
+    ["stock", "count"],
+]
+
+def _positions(corpus=CORPUS) -> PositionalIndex:
+    return PositionalIndex.build(corpus, BM25Index.build(corpus).vocab)
+
+def test_phrase_matches_adjacent_tokens():
+    positions = _positions()
+    assert positions.phrase_docs(["stock", "count"]).tolist() == [0, 3]
+    assert positions.phrase_docs(["stock", "count", "report"]).tolist() == [0]
+    assert positions.phrase_docs(["report"]).tolist() == [0, 1, 2]
+
+def test_phrase_misses_non_adjacent_tokens():
+    positions = _positions()
+    assert positions.phrase_docs(["count", "report"]).tolist() == [0]  # doc 1 has "count the stock report"
+    assert positions.phrase_docs(["stock", "report"]).tolist() == [1]  # doc 0 has "stock count report"
+    assert positions.phrase_docs(["report", "daily"]).tolist() == []  # wrong order
+    assert positions.phrase_docs(["stores", "count"]).tolist() == []  # never across documents
+
+def test_phrase_with_unknown_token_is_empty():
+    result = _positions().phrase_docs(["stock", "ledger"])
+    assert result.dtype == np.int64 and len(result) == 0
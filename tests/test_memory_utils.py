@@ -0,0 +1,22 @@
+from memory_utils import MemoryReport, SessionSizeTracker, add_searcher_components
+from search_utils import GraphSearcher
+
+def test_session_tracker_forgets_ended_sessions():
+    tracker = SessionSizeTracker()
+    tracker.record("a", {"x": "a" * 1000})
+    tracker.record("b", {"x": "b"})
+    tracker.forget({"b"})
+    assert len(tracker) == 1
+    assert tracker.average() == tracker.record("b", {"x": "b"})
+
+def test_shared_model_is_counted_once(graph, hash_encoder):
+    nodes, edges = graph
+    first = GraphSearcher(nodes[:100], edges)
+    second = GraphSearcher(nodes[100:200], edges, model=first.model)
+    assert second.model is first.model is hash_encoder
+    report, seen = MemoryReport(), set()
+    add_searcher_components(report, first, seen, prefix="first")
+    add_searcher_components(report, second, seen, prefix="second")
+    names = [c.component for c in report.components]
+    assert "first.model" in names and "second.model" not in names
+    assert "first.positions" in names and "first._spell" in names
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from knn_utils import GraphKNN
+from pq_utils import ProductQuantizer, recall_at_k, subspaces_for
+
+def _unit(rng, n, dim, clusters=50, noise=1.0):
+    centres = rng.standard_normal((clusters, dim))
+    x = centres[rng.integers(clusters, size=n)] + noise * rng.standard_normal((n, dim))
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+def test_encode_decode_round_trip():
+    rng = np.random.default_rng(0)
+    x = _unit(rng, 2000, 32, noise=0.3)
+    pq = ProductQuantizer.fit(x, m=8, ksub=64)
+    codes = pq.encode(x)
+    assert codes.shape == (2000, 8) and codes.dtype == np.uint8
+    recon = pq.decode(codes)
+    # Much closer than the vectors are to each other, and centroids encode to themselves
+    assert np.mean(np.sum((recon - x) ** 2, axis=1)) < 0.2 * np.mean(np.sum((x - x[::-1]) ** 2, axis=1))
+    np.testing.assert_array_equal(pq.encode(recon), codes)
+
+def test_recall_against_exact_search():
+    rng = np.random.default_rng(1)
+    x = _unit(rng, 3000, 64)
+    queries = x[rng.choice(len(x), 50, replace=False)] + 0.05 * rng.standard_normal((50, 64)).astype(np.float32)
+    pq = ProductQuantizer.fit(x, m=16)
+    codes = pq.encode(x)
+    exact = np.argsort(-(queries @ x.T), axis=1)[:, :10]
+    approx = np.stack([pq.search(codes, q, 10)[0] for q in queries])
+    top_50 = np.stack([pq.search(codes, q, 50)[0] for q in queries])
+    assert recall_at_k(exact, approx) > 0.7
+    # Every exact neighbour is in the PQ top 50, so rescoring 50 candidates recovers the exact top 10
+    assert np.mean([len(set(e) & set(a)) / 10 for e, a in zip(exact, top_50)]) > 0.95
+
+def test_subspaces_must_divide_dim():
+    assert subspaces_for(384, 48) == 48
+    assert subspaces_for(64, 48) == 32
+    with pytest.raises(ValueError, match="not divisible"):
+        ProductQuantizer.fit(np.zeros((10, 64), dtype=np.float32), m=48)
+
+def test_graph_knn_pq_with_non_divisible_default(graph, hash_encoder):
+    nodes = graph[0][:1000]
+    exact = GraphKNN(nodes)
+    pq = GraphKNN(nodes, index="pq", rescore=50)  # dim 64: the default 48 sub-spaces become 32
+    assert pq.pq.m == 32 and pq.pq_codes.shape == (1000, 32)
+    hits = []
+    for node in nodes[:30]:
+        query = exact.get_embedding(node["label"])
+        want = {s.node_id for s in exact.find_similar_nodes(query, k=5)}
+        got = {s.node_id for s in pq.find_similar_nodes(query, k=5)}
+        hits.append(len(want & got) / 5)
+    assert np.mean(hits) > 0.8
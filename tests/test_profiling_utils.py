@@ -0,0 +1,14 @@
+import os
+
+from profiling_utils import profile_call
+
+def test_profile_call_keeps_newest_runs(tmp_path):
+    reports = []
+    for i in range(5):
+        result, report = profile_call(lambda: sum(range(1000)), label=f"run{i}", out_dir=str(tmp_path),
+                                      max_runs=2)
+        assert result == sum(range(1000))
+        reports.append(report)
+    stems = {os.path.splitext(name)[0] for name in os.listdir(tmp_path)}
+    assert len(stems) == 2
+    assert os.path.exists(reports[-1].path) and not os.path.exists(reports[0].path)
@@ -0,0 +1,51 @@
+import json
+
+from querylog_utils import QueryLog, load_precomputed, precompute, read_log, top_queries
+from search_utils import GraphSearcher
+from shard_utils import ShardedSearcher
+
+def _log(path, queries, **kwargs):
+    log = QueryLog(str(path), **kwargs)
+    for q in queries:
+        log.record(q, latency_ms=1.0, top_ids=["n1"])
+    log.close()
+
+def test_read_log_spans_rotated_files_oldest_first(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    _log(path, [f"query {i}" for i in range(40)], max_bytes=600, backups=10)
+    assert len(list(tmp_path.iterdir())) > 1
+    assert [e["query"] for e in read_log(str(path))] == [f"query {i}" for i in range(40)]
+
+def test_top_queries_group_normalised_spellings_but_not_phrases(graph):
+    nodes, edges = graph
+    searcher = GraphSearcher(nodes[:300], edges)
+    entries = [{"query": q} for q in
+               ["Stock Reports", "stock  reports", "stock reports", "stock reports", '"stock reports"', "beneficiary"]]
+    top = top_queries(searcher, iter(entries), n=10)
+    assert top[0] == {"query": "stock reports", "filters": None, "within": None, "count": 4}
+    assert {t["query"] for t in top[1:]} == {'"stock reports"', "beneficiary"}
+
+def test_precomputed_answers_are_served_locally_and_sharded(graph, tmp_path):
+    nodes, edges = graph
+    nodes = nodes[:300]
+    path = str(tmp_path / "precomputed.json")
+    queries = [{"query": "campaign dashboard", "filters": None, "within": None},
+               {"query": "stock reports", "filters": None, "within": None}]
+    precompute(GraphSearcher(nodes, edges), queries, path)
+
+    fresh = GraphSearcher(nodes, edges)
+    assert load_precomputed(fresh, path) == 2
+    assert fresh.search("campaign dashboard").stages == ["cache"]
+    sharded = ShardedSearcher(fresh, n_shards=2)
+    try:
+        assert sharded.search("stock reports").stages == ["cache"]
+    finally:
+        sharded.close()
+
+def test_stale_precomputed_answers_are_ignored(graph, tmp_path):
+    nodes, edges = graph
+    path = str(tmp_path / "precomputed.json")
+    precompute(GraphSearcher(nodes[:300], edges), [{"query": "stock", "filters": None, "within": None}], path)
+    assert load_precomputed(GraphSearcher(nodes[:200], edges), path) == 0
+    with open(path) as f:
+        assert json.load(f)["entries"]
@@ -0,0 +1,105 @@
+import dataclasses
+import json
+import os
+import threading
+
+import pytest
+
+from bundle_utils import load_bundle
+from registry_utils import GraphRegistry, GraphSpec, load_specs
+
+@pytest.fixture
+def specs(graph, tmp_path):
+    nodes, _ = graph
+    specs = {}
+    for i, name in enumerate(["kenya", "mozambique", "nigeria"]):
+        part = nodes[i * 300:(i + 1) * 300]
+        source = tmp_path / f"{name}.json"
+        source.write_text(json.dumps({"nodes": part, "edges": []}))
+        specs[name] = GraphSpec(name, str(source), str(tmp_path / f"{name}.kgidx"))
+    return specs
+
+def test_lru_eviction_stays_within_budget(specs):
+    specs = {name: dataclasses.replace(spec, snapshot=None) for name, spec in specs.items()}  # built in memory
+    sizes = {name: GraphRegistry(specs)._load(spec).nbytes for name, spec in specs.items()}
+    budget = sizes["kenya"] + sizes["mozambique"] + sizes["nigeria"] // 2  # room for two graphs
+    registry = GraphRegistry(specs, memory_budget_bytes=budget)
+    registry.get("kenya")
+    registry.get("mozambique")
+    registry.get("kenya")  # mozambique is now least recently used
+    registry.get("nigeria")
+    assert [s["graph"] for s in registry.stats()] == ["kenya", "nigeria"]
+    assert registry.evictions == 1
+    assert registry.total_bytes <= budget
+
+def test_graph_over_budget_still_loads(specs):
+    registry = GraphRegistry(specs, memory_budget_bytes=1)
+    registry.get("kenya")
+    assert registry.get("mozambique").searcher is not None
+    assert [s["graph"] for s in registry.stats()] == ["mozambique"]  # the requested graph is kept
+    assert registry.evictions == 1
+
+def test_graphs_share_one_encoder(specs, hash_encoder):
+    registry = GraphRegistry(specs)
+    searchers = [registry.get(name).searcher for name in specs]
+    assert all(s.model is registry.model for s in searchers)
+    assert registry.model is hash_encoder
+
+def test_snapshot_is_written_then_loaded(specs):
+    GraphRegistry(specs).get("kenya")
+    assert os.path.exists(specs["kenya"].snapshot)
+    loaded = GraphRegistry(specs)
+    searcher = loaded.get("kenya").searcher
+    mm, _, arrays = load_bundle(specs["kenya"].snapshot)
+    mapped = sum(a.nbytes for a in arrays.values())
+    del arrays
+    mm.close()
+    assert loaded.total_bytes >= mapped  # memory-mapped arrays count towards the budget
+    assert searcher.search("campaign dashboard").results
+
+def test_load_does_not_block_other_graphs(specs):
+    registry = GraphRegistry(specs)
+    registry.get("kenya")
+    started, release = threading.Event(), threading.Event()
+    load, calls = registry._load, []
+
+    def slow_load(spec):
+        calls.append(spec.name)
+        started.set()
+        assert release.wait(10)
+        return load(spec)
+
+    registry._load = slow_load
+    results = []
+    loaders = [threading.Thread(target=lambda: results.append(registry.get("nigeria"))) for _ in range(2)]
+    for t in loaders:
+        t.start()
+    assert started.wait(10)
+    assert registry.get("kenya").searcher is not None  # a hit while nigeria is loading
+    release.set()
+    for t in loaders:
+        t.join(10)
+    assert calls == ["nigeria"]  # concurrent requests share one load
+    assert results[0] is results[1]
+
+def test_stale_snapshot_is_rebuilt(specs, capsys):
+    GraphRegistry(specs).get("kenya")
+    with open(specs["kenya"].source) as f:
+        payload = json.load(f)
+    payload["nodes"][0]["label"] = "Renamed node"
+    with open(specs["kenya"].source, "w") as f:
+        json.dump(payload, f)
+    capsys.readouterr()
+    searcher = GraphRegistry(specs).get("kenya").searcher
+    assert "Ignoring stale index snapshot" in capsys.readouterr().out
+    assert searcher.nodes[0]["label"] == "Renamed node"
+    GraphRegistry(specs).get("kenya")  # the rebuilt index replaced the snapshot
+    assert "Ignoring stale" not in capsys.readouterr().out
+
+def test_load_specs_resolves_relative_paths(tmp_path):
+    (tmp_path / "graphs.json").write_text(json.dumps(
+        {"kenya": {"source": "kenya.json", "snapshot": "idx/kenya.kgidx", "label": "Kenya"}}))
+    spec = load_specs(str(tmp_path / "graphs.json"))["kenya"]
+    assert spec.source == str(tmp_path / "kenya.json")
+    assert spec.snapshot == str(tmp_path / "idx" / "kenya.kgidx")
+    assert spec.label == "Kenya"
@@ -0,0 +1,50 @@
+import numpy as np
+
+from related_utils import RelatedIndex, blocked_topk, load_related
+from search_utils import GraphSearcher
+
+def _brute_force_topk(x, k):
+    sims = x @ x.T
+    np.fill_diagonal(sims, -np.inf)
+    ids = np.argsort(-sims, axis=1, kind="stable")[:, :k]
+    return ids, np.take_along_axis(sims, ids, axis=1)
+
+def test_blocked_topk_matches_brute_force():
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((203, 16)).astype(np.float32)
+    expected_ids, expected_scores = _brute_force_topk(x, 7)
+    # Blocks that don't divide n, so the diagonal straddles tile edges
+    ids, scores = blocked_topk(x, k=7, row_block=37, col_block=50)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+    assert (ids == expected_ids).mean() > 0.99  # only exact ties may swap
+    assert not (ids == np.arange(len(x))[:, None]).any()
+
+def test_blocked_topk_k_larger_than_n():
+    ids, scores = blocked_topk(np.eye(3, dtype=np.float32), k=10)
+    assert ids.shape == (3, 2)
+
+def test_save_load_round_trip(graph, tmp_path):
+    nodes, edges = graph
+    searcher = GraphSearcher(nodes[:200], edges)
+    built = RelatedIndex.from_searcher(searcher, k=5)
+    path = str(tmp_path / "related.kgrel")
+    built.save(path)
+    loaded = RelatedIndex.load(path, expected_fingerprint=searcher.fingerprint())
+    assert loaded.node_ids == built.node_ids and loaded.fingerprint == built.fingerprint
+    np.testing.assert_array_equal(loaded.ids, built.ids)
+    np.testing.assert_array_equal(loaded.scores, built.scores)
+    nid = nodes[0]["id"]
+    assert loaded.related(nid, k=3) == built.related(nid, k=3) and len(loaded.related(nid, k=3)) == 3
+    assert loaded.related("no-such-node") == []
+
+def test_stale_file_is_rebuilt(graph, tmp_path):
+    nodes, edges = graph
+    path = str(tmp_path / "related.kgrel")
+    load_related(path, GraphSearcher(nodes[:200], edges), k=5)
+    edited = [dict(n) for n in nodes[:200]]
+    edited[0]["label"] = "Renamed node"
+    searcher = GraphSearcher(edited, edges)
+    related = load_related(path, searcher, k=5)
+    assert related.fingerprint == searcher.fingerprint()
+    # The rebuilt index replaced the file
+    assert RelatedIndex.load(path, expected_fingerprint=searcher.fingerprint()).node_ids == related.node_ids
@@ -0,0 +1,56 @@
+import json
+
+from graph_utils import build_index
+from reload_utils import GraphVersion, HotReloader
+from search_utils import GraphSearcher
+from shard_utils import ShardedSearcher
+
+def _write(path, nodes, edges):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"nodes": nodes, "edges": edges}, f)
+
+def test_reload_swaps_and_retires_old_sharded_searcher(graph, tmp_path):
+    nodes, edges = graph
+    nodes = [dict(n) for n in nodes[:300]]
+    ids = {n["id"] for n in nodes}
+    edges = [e for e in edges if e["source"] in ids and e["target"] in ids]
+    source = tmp_path / "graph.json"
+    _write(source, nodes, edges)
+
+    rebuild = lambda prev, n, e: ShardedSearcher(prev._searcher.updated(n, e), n_shards=2)
+    retired = []
+    def retire(old):
+        retired.append(old)
+        old.close()
+
+    first = ShardedSearcher(GraphSearcher(nodes, edges), n_shards=2)
+    reloader = HotReloader(str(source), GraphVersion(0, nodes, edges, first, build_index(nodes, edges)),
+                           rebuild, retire=retire)
+    try:
+        assert not reloader.check_now()  # unchanged file
+        edited = [dict(n) for n in nodes]
+        edited[0]["label"] = "Stock Ledger Reconciliation"
+        _write(source, edited, edges)
+        reloader._stamp = None  # same-second writes can keep the mtime
+        workers = list(first._procs)
+        assert reloader.check_now()
+        assert reloader.current.version == 1 and retired == [first]
+        assert not first._procs and not any(p.is_alive() for p in workers)
+        # A search still holding the old version falls back to its local searcher
+        assert first.search("campaign dashboard").results
+        hits = reloader.current.searcher.search("stock ledger reconciliation").results
+        assert hits and hits[0].node_id == nodes[0]["id"]
+    finally:
+        reloader.current.searcher.close()
+
+def test_failed_reload_keeps_current_version(graph, tmp_path):
+    nodes, edges = graph
+    source = tmp_path / "graph.json"
+    _write(source, nodes[:50], [])
+    searcher = GraphSearcher(nodes[:50], [])
+    reloader = HotReloader(str(source), GraphVersion(0, nodes[:50], [], searcher, build_index(nodes[:50], [])),
+                           lambda prev, n, e: prev.updated(n, e), retire=lambda old: None)
+    source.write_text("{not json")
+    reloader._stamp = None
+    assert not reloader.check_now()
+    assert reloader.current.searcher is searcher and reloader.last_error
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+import pytest
+
+from search_service import SearchService
+from search_utils import GraphSearcher
+
+@pytest.fixture
+def service(graph):
+    nodes, edges = graph
+    searcher = GraphSearcher(nodes[:300], edges)
+    svc = SearchService(lambda: searcher, max_batch=8, max_wait_ms=20.0)
+    yield svc
+    svc._executor.shutdown()
+
+def _post(service, *bodies):
+    async def run():
+        return await asyncio.gather(*(service._dispatch("POST", path, json.dumps(body).encode())
+                                      for path, body in bodies))
+    return asyncio.run(run())
+
+def test_bad_request_does_not_fail_its_batch(service):
+    good, bad = _post(service, ("/search", {"query": "campaign dashboard"}),
+                      ("/search", {"query": "campaign dashboard", "within": "nope"}))
+    assert good[0] == 200 and good[1]["results"]
+    assert bad[0] == 400 and "Unknown node id" in bad[1]["error"]
+
+def test_bad_similar_embedding_does_not_fail_its_batch(service):
+    good, bad = _post(service, ("/similar", {"query": "stock inventory", "k": 2}),
+                      ("/similar", {"embedding": [0.1, 0.2], "k": 2}))
+    assert good[0] == 200 and len(good[1]["results"]) == 2
+    assert bad[0] == 400
+
+def test_identical_requests_are_coalesced(service):
+    first, second = _post(service, ("/search", {"query": "beneficiary registration"}),
+                          ("/search", {"query": "beneficiary registration"}))
+    assert first == second
+
+def test_health_fingerprints_each_index_once(graph):
+    nodes, edges = graph
+    searchers = [GraphSearcher(nodes[:100], edges), GraphSearcher(nodes[:120], edges)]
+    calls = []
+    for s in searchers:
+        original = s.fingerprint
+        s.fingerprint = lambda original=original: calls.append(1) or original()
+    current = [searchers[0]]
+    svc = SearchService(lambda: current[0])
+    try:
+        health = lambda: asyncio.run(svc._dispatch("GET", "/health", b""))
+        first, second = health(), health()
+        assert first == second and first[1]["nodes"] == 100 and len(calls) == 1
+        current[0] = searchers[1]  # a reload swaps the index
+        assert health()[1]["nodes"] == 120 and len(calls) == 2
+    finally:
+        svc._executor.shutdown()
+
+def test_facets_and_suggest_run_on_the_executor(service):
+    import threading
+
+    seen = []
+    searcher = service.get_searcher()
+    for name in ("facet_counts", "suggest"):
+        original = getattr(searcher, name)
+        setattr(searcher, name, lambda *a, original=original, **k: seen.append(threading.current_thread().name)
+                or original(*a, **k))
+    facets, suggest = _post(service, ("/facets", {"field": "end_user"}), ("/suggest", {"prefix": "camp"}))
+    assert facets[0] == 200 and suggest[0] == 200 and suggest[1]["suggestions"]
+    assert len(seen) == 2 and all(name.startswith("kg-search") for name in seen)
@@ -0,0 +1,196 @@
+import numpy as np
+import pytest
+
+from search_utils import GraphSearcher
+
+class OverlapReranker:
+    """Cross-encoder stand-in: logit = shared words with the label - 2."""
+    def predict(self, pairs, **kwargs):
+        return np.array([len(set(q.lower().split()) & set(d.split(".")[0].lower().split())) - 2.0
+                         for q, d in pairs])
+
+def _searcher(graph, **options):
+    nodes, edges = graph
+    searcher = GraphSearcher(nodes[:500], edges, cache_size=0, **options)
+    if options.get("rerank_model"):
+        searcher._reranker = OverlapReranker()
+    return searcher
+
+def test_pool_without_rerank_is_top_m_of_thresholded_results(graph, queries):
+    plain, pooled = _searcher(graph), _searcher(graph, candidate_pool=5)
+    for query in queries:
+        expected = plain.search(query).results[:5]
+        got = pooled.search(query).results
+        assert [r.score for r in got] == [r.score for r in expected]  # ids may differ within ties
+        assert all(r.score >= plain.t_low for r in got)
+
+def test_rerank_sees_pool_before_threshold(graph):
+    searcher = _searcher(graph, candidate_pool=8, rerank_model="overlap", t_low=0.99)
+    response = searcher.search("campaign dashboard")
+    assert response.stages[-1] == "rerank"
+    assert len(response.results) == 8  # nothing reaches t_low, the pool is still reranked
+    scores = [r.rerank_score for r in response.results]
+    assert scores == sorted(scores, reverse=True)
+
+def test_rerank_best_match_uses_rerank_threshold(graph):
+    query = "campaign management dashboard"
+    strict = _searcher(graph, candidate_pool=8, rerank_model="overlap", t_high=0.0, rerank_t_high=0.999)
+    assert strict.search(query).best_match is None  # fused t_high is not consulted after a rerank
+    lenient = _searcher(graph, candidate_pool=8, rerank_model="overlap", t_high=1.0, rerank_t_high=0.5)
+    response = lenient.search(query)
+    assert response.best_match is response.results[0]
+    assert response.best_match.rerank_score >= 0.5
+    assert lenient.search(query, rerank=False).best_match is None  # fused t_high again
+
+def test_skipped_dense_stage_never_gives_best_match(graph):
+    searcher = _searcher(graph, t_high=0.0)
+    searcher._encode_ms = 1e9  # encode never fits the budget
+    response = searcher.search("campaign dashboard", deadline_ms=1000)
+    assert response.degraded and response.results and response.best_match is None
+    assert "dense" not in response.stages
+
+def test_deadline_skipped_rerank_is_degraded_and_not_cached(graph):
+    nodes, edges = graph
+    searcher = GraphSearcher(nodes[:500], edges, candidate_pool=8, rerank_model="overlap")
+    searcher._reranker = OverlapReranker()
+    searcher._encode_ms, searcher._rerank_ms = 0.0, 1e9  # the rerank never fits the budget
+    partial = searcher.search("campaign dashboard", deadline_ms=1000)
+    assert partial.degraded and "rerank" not in partial.stages
+    full = searcher.search("campaign dashboard")
+    assert "rerank" in full.stages  # not served from the cache
+
+def test_deadline_skipped_smoothing_is_degraded_and_not_cached(graph):
+    nodes, edges = graph
+    searcher = GraphSearcher(nodes[:500], edges, smoothing_steps=2)
+    searcher.dense_chunk_size = 10**9
+    budget = iter([1.0, 1.0])  # the encode and the one dense chunk fit, then the deadline passes
+    searcher._deadline_left_ms = lambda deadline: next(budget, 0.0)
+    searcher._encode_ms = 0.0
+    partial = searcher.search("campaign dashboard", deadline_ms=1000)
+    assert "dense" in partial.stages
+    assert partial.degraded and "smoothing" not in partial.stages
+    del searcher._deadline_left_ms
+    full = searcher.search("campaign dashboard")
+    assert "smoothing" in full.stages  # not served from the cache
+
+def test_updated_matches_fresh_build_and_tokenizes_only_edits(graph, queries, monkeypatch):
+    nodes, edges = graph
+    nodes = [dict(n) for n in nodes[:500]]
+    old = GraphSearcher(nodes, edges)
+    edited = [dict(n) for n in nodes[:450]]  # the last 50 nodes are removed
+    edited[10]["label"] = "Zebrafish telemetry"  # new terms (and the children's indexed text)
+    edited.append({"id": "new", "label": "Vaccine cold chain", "content": "Cold chain monitoring for vaccines."})
+    fresh = GraphSearcher(edited, edges)
+    calls = []
+    tokenize = GraphSearcher._tokenize
+    monkeypatch.setattr(GraphSearcher, "_tokenize", lambda self, text: calls.append(text) or tokenize(self, text))
+    new = old.updated(edited, edges)
+    previous_texts = set(old.node_texts)
+    assert len(calls) == sum(text not in previous_texts for text in new.node_texts) < 20
+
+    assert set(new.bm25.vocab) == set(fresh.bm25.vocab)
+    for query in queries + ["zebrafish telemetry", "vaccine cold chain"]:
+        tokens = fresh._tokenize(query)
+        np.testing.assert_allclose(new.bm25.get_scores(tokens), fresh.bm25.get_scores(tokens), rtol=1e-12)
+        assert new.positions.phrase_docs(tokens).tolist() == fresh.positions.phrase_docs(tokens).tolist()
+    assert new.spell.counts == fresh.spell.counts
+    assert {d: sorted(t) for d, t in new.spell.deletes.items()} == {d: sorted(t) for d, t in fresh.spell.deletes.items()}
+    assert "zebrafish" not in old.bm25.vocab and "zebrafish" not in old.spell.counts  # old index untouched
+
+def test_snapshot_load_builds_spell_index(graph, tmp_path):
+    nodes, edges = graph
+    built = GraphSearcher(nodes, edges, cache_size=0)
+    built.save(str(tmp_path / "index.kgidx"))
+    loaded = GraphSearcher.load(str(tmp_path / "index.kgidx"), nodes, edges, cache_size=0)
+    assert loaded._spell is not None  # not left for the first query
+    assert loaded._spell.counts == built.spell.counts
+    no_spell = GraphSearcher.load(str(tmp_path / "index.kgidx"), nodes, edges, spell_correct=False)
+    assert no_spell._spell is None
+
+FACET_NODES = [
+    {"id": "a", "label": "Stock", "end_user": "All", "tags": "stock", "level": 1, "mobile": True},
+    {"id": "b", "label": "Stock levels", "end_user": "Supervisor", "tags": ["stock", "reports"], "level": 2,
+     "mobile": False},
+    {"id": "c", "label": "Attendance", "end_user": "Supervisor", "tags": ["reports"], "level": 2},
+    {"id": "d", "label": "Payments", "end_user": "", "level": 3},
+]
+
+def _facet_searcher():
+    return GraphSearcher(FACET_NODES, [], facet_fields=("end_user", "tags", "level", "mobile"), cache_size=0)
+
+def test_facet_masks_and_filters():
+    searcher = _facet_searcher()
+    assert searcher.facet_node_ids({"end_user": "Supervisor"}) == ["b", "c"]
+    assert searcher.facet_node_ids({"end_user": ["All", "Supervisor"]}) == ["a", "b", "c"]  # OR within a field
+    assert searcher.facet_node_ids({"tags": "reports"}) == ["b", "c"]  # list-valued nodes are in each mask
+    assert searcher.facet_node_ids({"tags": "stock", "level": 2}) == ["b"]  # AND across fields
+    assert searcher.facet_node_ids({"level": (2, 3)}) == ["b", "c", "d"]
+    assert searcher.facet_node_ids({"mobile": True}) == ["a"]  # non-string scalars are single values
+    assert searcher.facet_node_ids({"end_user": "Nobody"}) == []
+    assert searcher.facet_node_ids({"end_user": []}) == []  # no filter: nothing to highlight
+    assert {r.node_id for r in searcher.search("stock", filters={"level": 1}).results} <= {"a"}
+    with pytest.raises(ValueError, match="Unknown facet field"):
+        searcher.facet_node_ids({"color": "red"})
+
+def test_facet_counts():
+    searcher = _facet_searcher()
+    assert searcher.facet_counts("end_user") == {"All": 1, "Supervisor": 2}  # "" is not a value
+    assert searcher.facet_counts("tags") == {"reports": 2, "stock": 2}
+    assert searcher.facet_counts("level") == {"1": 1, "2": 2, "3": 1}
+    assert searcher.facet_counts("tags", filters={"level": 2}) == {"reports": 2, "stock": 1}
+    assert searcher.facet_counts("level", filters={"mobile": False}) == {"1": 0, "2": 1, "3": 0}
+
+TREE_NODES = [
+    {"id": "root", "label": "Health campaign platform", "content": "Campaign tools."},
+    {"id": "a", "label": "Stock management", "content": "Vaccine stock at warehouses."},
+    {"id": "a1", "label": "Stock receipts", "content": "Record vaccine stock received."},
+    {"id": "a1x", "label": "Stock receipt reports", "content": "Reports on vaccine stock received."},
+    {"id": "a2", "label": "Stock issues", "content": "Record vaccine stock issued."},
+    {"id": "b", "label": "Registration", "content": "Register households."},
+    {"id": "b1", "label": "Vaccine stock at households", "content": "Stock left with households."},
+]
+TREE_EDGES = [
+    {"source": "root", "target": "a", "type": "child"},
+    {"source": "root", "target": "b", "type": "child"},
+    {"source": "a", "target": "a1", "type": "child"},
+    {"source": "a", "target": "a2", "type": "child"},
+    {"source": "a1", "target": "a1x", "type": "child"},
+    {"source": "b", "target": "b1", "type": "child"},
+    {"source": "b", "target": "a2", "type": "child"},  # second parent: a2 stays under a
+]
+
+def test_within_returns_only_descendants():
+    searcher = GraphSearcher(TREE_NODES, TREE_EDGES, t_low=0.0, cache_size=0)
+    everywhere = {r.node_id: r.score for r in searcher.search("vaccine stock").results}
+    scoped = searcher.search("vaccine stock", within="a").results
+    assert {r.node_id for r in scoped} == {"a1", "a1x", "a2"}  # not "a" itself, not b1
+    assert {r.node_id for r in searcher.search("vaccine stock", within="b").results} == {"b1"}
+    assert {r.node_id for r in searcher.search("vaccine stock", within="root").results} == set(everywhere) - {"root"}
+    assert searcher.search("vaccine stock", within="a1x").results == []  # a leaf has no descendants
+    assert all(r.score >= 0 for r in scoped)
+
+def test_within_unknown_node_raises():
+    searcher = GraphSearcher(TREE_NODES, TREE_EDGES, cache_size=0)
+    with pytest.raises(ValueError, match="Unknown node id"):
+        searcher.search("vaccine stock", within="missing")
+
+def test_smoothing_moves_score_towards_hit_neighbours():
+    searcher = GraphSearcher(TREE_NODES, TREE_EDGES, smoothing_steps=2, cache_size=0)
+    row = searcher.id_to_row
+    scores = np.zeros(len(TREE_NODES), dtype=np.float32)
+    scores[row["a1"]] = 1.0
+    smoothed = searcher._smooth_scores(scores, None)
+    assert smoothed[row["a1"]] < 1.0
+    assert smoothed[row["a"]] > 0 and smoothed[row["a1x"]] > 0  # both child-edge neighbours
+    assert smoothed[row["b1"]] == 0  # four hops away, out of reach in two steps
+    scoped = searcher._smooth_scores(scores[[row["a1"], row["a1x"]]], np.array([row["a1"], row["a1x"]]))
+    assert scoped[1] > 0  # the induced sub-graph still carries the edge
+
+def test_zero_smoothing_steps_changes_nothing():
+    plain = GraphSearcher(TREE_NODES, TREE_EDGES, t_low=0.0, cache_size=0)
+    off = GraphSearcher(TREE_NODES, TREE_EDGES, t_low=0.0, smoothing_steps=0, cache_size=0)
+    scores = np.random.default_rng(0).random(len(TREE_NODES)).astype(np.float32)
+    assert off._smooth_scores(scores, None) is scores
+    got = [(r.node_id, r.score) for r in off.search("vaccine stock").results]
+    assert got == [(r.node_id, r.score) for r in plain.search("vaccine stock").results]
+    assert "smoothing" not in off.search("vaccine stock").stages
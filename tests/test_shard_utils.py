@@ -0,0 +1,66 @@
+import pytest
+
+from search_utils import GraphSearcher
+from shard_utils import ShardedSearcher
+
+def _ids_scores(response):
+    return [(r.node_id, round(r.score, 5)) for r in response.results]
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"smoothing_steps": 3},
+    {"candidate_pool": 5},
+    {"smoothing_steps": 3, "candidate_pool": 5},
+])
+def test_sharded_matches_local(graph, queries, options):
+    nodes, edges = graph
+    local = GraphSearcher(nodes, edges, cache_size=0, **options)
+    sharded = ShardedSearcher(GraphSearcher(nodes, edges, cache_size=0, **options), n_shards=3)
+    try:
+        for query in queries:
+            expected, got = local.search(query), sharded.search(query)
+            assert _ids_scores(got) == _ids_scores(expected), query
+            assert (got.best_match is None) == (expected.best_match is None)
+            if options.get("candidate_pool"):
+                assert len(got.results) <= options["candidate_pool"]
+    finally:
+        sharded.close()
+
+def test_sharded_k_and_query_embedding(graph, queries):
+    nodes, edges = graph
+    local = GraphSearcher(nodes, edges, cache_size=0)
+    sharded = ShardedSearcher(local, n_shards=2)
+    try:
+        query = queries[5]
+        full = sharded.search(query)
+        assert _ids_scores(sharded.search(query, k=3)) == _ids_scores(full)[:3]
+        embedding = local.encode_queries([query])[0]
+        assert _ids_scores(sharded.search(query, query_embedding=embedding)) == _ids_scores(full)
+        # Scoped and deadline searches are served by the local searcher
+        root = nodes[0]["id"]
+        assert _ids_scores(sharded.search(query, within=root)) == _ids_scores(local.search(query, within=root))
+    finally:
+        sharded.close()
+
+def test_concurrent_searches_and_close(graph, queries):
+    from concurrent.futures import ThreadPoolExecutor
+
+    nodes, edges = graph
+    local = GraphSearcher(nodes, edges, cache_size=0)
+    expected = {q: _ids_scores(local.search(q)) for q in queries}
+    sharded = ShardedSearcher(GraphSearcher(nodes, edges, cache_size=0), n_shards=2, concurrency=3)
+    embeddings = dict(zip(queries, local.encode_queries(queries)))
+    search = lambda q: (q, _ids_scores(sharded.search(q, query_embedding=embeddings[q])))
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            for query, got in pool.map(search, queries * 3):
+                assert got == expected[query], query
+            # Searches racing close() finish on the workers or fall back to the local searcher
+            futures = [pool.submit(search, q) for q in queries]
+            sharded.close()
+            for future in futures:
+                query, got = future.result()
+                assert got == expected[query], query
+        assert sharded.search(queries[0]).results  # closed: served locally
+    finally:
+        sharded.close()
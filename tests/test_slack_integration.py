@@ -0,0 +1,36 @@
+import json
+
+import numpy as np
+
+import slack_integration
+from data import NODES
+from related_utils import RelatedIndex
+
+def test_related_nodes_have_labels_and_match_the_graph(monkeypatch, tmp_path):
+    path = str(tmp_path / "related.kgrel")
+    stale = RelatedIndex(["x", "y"], np.array([[1], [0]], dtype="int32"),
+                         np.ones((2, 1), dtype="float16"), {"model": "old", "data": "old"})
+    stale.save(path)
+    monkeypatch.setenv("KG_RELATED_PATH", path)
+    monkeypatch.delenv("KG_INDEX_PATH", raising=False)
+    monkeypatch.setattr(slack_integration, "_related_index", None)
+    labels = {n["id"]: n.get("label", n["id"]) for n in NODES}
+    related = slack_integration.find_related_nodes(NODES[0]["id"], k=3)
+    assert len(related) == 3  # the stale file was rebuilt for this graph
+    assert all(r["label"] == labels[r["node_id"]] for r in related)
+    assert any(r["label"] != r["node_id"] for r in related)
+
+def test_approval_looks_up_duplicates_once(monkeypatch):
+    index = slack_integration._get_dedup_index()
+    queries = []
+    original = index.query
+    monkeypatch.setattr(index, "query", lambda *a, **k: queries.append(a) or original(*a, **k))
+    updates = []
+    monkeypatch.setattr(slack_integration, "update_slack_message", lambda **kwargs: updates.append(kwargs))
+    node = NODES[0]
+    payload = {"actions": [{"action_id": "approve", "value": json.dumps(
+                   {"query": node["label"], "answer": node.get("content", ""), "similar_nodes": []})}],
+               "channel": {"id": "C1"}, "message_ts": "1"}
+    slack_integration.handle_slack_interaction(payload)
+    assert len(queries) == 1
+    assert f"near-duplicate of existing node {node['id']}" in updates[0]["text"]
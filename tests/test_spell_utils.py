@@ -0,0 +1,21 @@
+from spell_utils import SymSpell, edit_distance
+
+COUNTS = {"stock": 10, "stocks": 100, "register": 5, "vaccine": 7, "warehouse": 3}
+
+def test_transposition_is_one_edit():
+    assert edit_distance("stokc", "stock", 2) == 1
+    spell = SymSpell(COUNTS)
+    assert spell.lookup("stokc", 1)[0] == ("stock", 1, 10)
+    assert spell.correct(["stokc", "regsiter"]) == ["stock", "register"]
+
+def test_distance_is_capped():
+    spell = SymSpell(COUNTS)
+    assert spell.correct(["vacne"]) == ["vacne"]  # two edits, but shorter than 8 characters
+    assert spell.correct(["wraehose"]) == ["warehouse"]  # two edits at 8 characters
+    assert SymSpell(COUNTS, max_distance=1).lookup("wraehose", 2) == []  # never past the index's distance
+    assert spell.correct(["dhis2"]) == ["dhis2"]  # tokens with digits are left alone
+
+def test_vocabulary_words_are_unchanged():
+    spell = SymSpell(COUNTS)
+    assert spell.lookup("stock", 2) == [("stock", 0, 10)]  # not the more frequent "stocks"
+    assert spell.correct(["stock", "stocks", "vaccine"]) == ["stock", "stocks", "vaccine"]
@@ -0,0 +1,20 @@
+from search_utils import GraphSearcher
+from suggest_utils import term_frequencies
+
+NODES = [
+    {"id": "a", "label": "Health Campaign Management", "content": "Plan campaigns—through micro-plans and stock-outs."},
+    {"id": "b", "label": "Registration", "content": "Households (beneficiaries/recipients) are registered."},
+]
+
+def test_vocabulary_is_split_at_punctuation():
+    vocab = term_frequencies(NODES)
+    assert {"campaigns", "through", "micro", "plans", "stock", "outs", "beneficiaries", "recipients"} <= set(vocab)
+    assert not {"campaignsthrough", "microplans", "stockouts", "beneficiariesrecipients"} & set(vocab)
+    assert vocab["registration"] == 1  # label words are part of the vocabulary
+
+def test_suggest_has_no_glued_words():
+    searcher = GraphSearcher(NODES, [], cache_size=0)
+    texts = [s.text for s in searcher.suggest("campaign", k=10)]
+    assert texts[0] == "Health Campaign Management"  # labels rank above words
+    assert "campaigns" in texts and "campaignsthrough" not in texts
+    assert [s.text for s in searcher.suggest("benef")] == ["beneficiaries"]